@@ -0,0 +1,219 @@
+# pyright: reportMissingImports=false
+"""
+章节正文存储基准测试
+
+在临时目录中生成相同的语料，对比三种正文存储的磁盘占用、写入耗时和读取延迟：
+- inline：正文以 TEXT 保存在章节表中（原实现）
+- table：chapter_body 表中保存 zlib 压缩的正文
+- segment：每本书一个 zlib 压缩的段文件，章节表中保存偏移
+
+读取延迟分别统计随机读取一章正文和读取一本书的章节目录（只查询元数据）。
+语料由按 Zipf 分布抽取的词组成，压缩率接近真实小说；也可以用 --source 指定一个 UTF-8 TXT 文件作为语料。
+
+用法:
+    uv run python benchmarks/bench_body_store.py --books 50 --chapters 500
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from sqlalchemy import Engine, column, table, text
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from core.config import settings
+from core.models import Book, Chapter
+from services.body_store import read_chapter_body
+from services.book_service import insert_chapters
+from services.parser import ChapterDict
+
+CHAPTER_CHARS = 4000
+
+
+def make_corpus(rng: random.Random, chars: int, source: Path | None) -> str:
+    """生成指定字符数的语料"""
+    if source is not None:
+        text_ = source.read_text(encoding='utf-8')
+        return (text_ * (chars // len(text_) + 1))[:chars]
+    charset = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+    words = [''.join(rng.choices(charset, k=rng.choice((1, 2, 2, 3)))) for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    parts = []
+    size = 0
+    while size < chars:
+        sentence = ''.join(rng.choices(words, weights, k=rng.randint(5, 20))) + rng.choice('，。！？')
+        parts.append(sentence)
+        size += len(sentence)
+    return ''.join(parts)[:chars]
+
+
+def make_books(rng: random.Random, books: int, chapters: int, source: Path | None) -> list[list[ChapterDict]]:
+    corpus = make_corpus(rng, CHAPTER_CHARS * chapters * 2, source)
+    result = []
+    for _ in range(books):
+        start = rng.randrange(len(corpus) - CHAPTER_CHARS * chapters)
+        result.append(
+            [
+                ChapterDict(
+                    title=f'第{i + 1}章',
+                    order_index=i,
+                    content=[
+                        corpus[pos : pos + 100]
+                        for pos in range(start + i * CHAPTER_CHARS, start + (i + 1) * CHAPTER_CHARS, 100)
+                    ],
+                )
+                for i in range(chapters)
+            ]
+        )
+    return result
+
+
+def write_inline(engine: Engine, books: list[list[ChapterDict]]) -> None:
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                'CREATE TABLE inline_chapter (id INTEGER PRIMARY KEY, book_id INTEGER NOT NULL, '
+                'title VARCHAR NOT NULL, order_index INTEGER NOT NULL, content VARCHAR NOT NULL)'
+            )
+        )
+        connection.execute(text('CREATE UNIQUE INDEX ix_inline ON inline_chapter (book_id, order_index)'))
+        for book_id, chapters in enumerate(books, 1):
+            connection.execute(
+                text(
+                    'INSERT INTO inline_chapter (book_id, title, order_index, content) '
+                    'VALUES (:book_id, :title, :order_index, :content)'
+                ),
+                [
+                    {
+                        'book_id': book_id,
+                        'title': chapter['title'],
+                        'order_index': chapter['order_index'],
+                        'content': '\n\n'.join(chapter['content']),
+                    }
+                    for chapter in chapters
+                ],
+            )
+
+
+def write_store(engine: Engine, books: list[list[ChapterDict]]) -> None:
+    with Session(engine) as session:
+        for i, chapters in enumerate(books, 1):
+            book = Book(
+                hash_id=f'bench-{i}', title=f'测试书籍{i}', path=f'{i}.txt', file_size=0, file_mtime=0
+            )
+            session.add(book)
+            session.flush()
+            insert_chapters(session, book, chapters)
+            session.commit()
+
+
+# 原实现的章节表（只用于构造与 ORM 查询同样方式编译的语句）
+inline_chapter = table(
+    'inline_chapter',
+    column('id'),
+    column('book_id'),
+    column('title'),
+    column('order_index'),
+    column('content'),
+)
+
+
+def read_inline(session: Session, book_id: int, order_index: int) -> str | None:
+    c = inline_chapter.c
+    return session.exec(select(c.content).where(c.book_id == book_id, c.order_index == order_index)).first()
+
+
+def toc_inline(session: Session, book_id: int) -> list:
+    c = inline_chapter.c
+    return list(
+        session.exec(select(c.id, c.title, c.order_index).where(c.book_id == book_id).order_by(c.order_index))
+    )
+
+
+def toc_store(session: Session, book_id: int) -> list:
+    return list(
+        session.exec(
+            select(Chapter.id, Chapter.title, Chapter.order_index)
+            .where(Chapter.book_id == book_id)
+            .order_by(Chapter.order_index)
+        )
+    )
+
+
+def percentiles(func: Callable[[], object], rounds: int) -> tuple[float, float]:
+    """返回 (p50, p99) 毫秒"""
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    quantiles = statistics.quantiles(latencies, n=100)
+    return quantiles[49], quantiles[98]
+
+
+def dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--books', type=int, default=50, help='书籍数量')
+    parser.add_argument('--chapters', type=int, default=500, help='每本书的章节数')
+    parser.add_argument('--reads', type=int, default=5000, help='随机读取的次数')
+    parser.add_argument('--source', type=Path, default=None, help='用作语料的 UTF-8 TXT 文件')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    books = make_books(rng, args.books, args.chapters, args.source)
+    corpus_mb = args.books * args.chapters * CHAPTER_CHARS * 3 / 1024 / 1024
+    print(f'corpus {args.books} books x {args.chapters} chapters, ~{corpus_mb:.0f} MB UTF-8')
+    header = ('store', 'disk MB', 'write s', 'read p50', 'read p99', 'toc p50', 'toc p99')
+    print(f'{header[0]:<8} {header[1]:>9} {header[2]:>8} ' + ' '.join(f'{name:>9}' for name in header[3:]))
+
+    for store in ('inline', 'table', 'segment'):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.data_dir = Path(tmp)
+            settings.chapter_body_store = 'table' if store == 'inline' else store
+            settings.fulltext_index = False
+            engine = create_engine(f'sqlite:///{Path(tmp) / "bench.db"}')
+            SQLModel.metadata.create_all(engine)
+
+            start = time.perf_counter()
+            if store == 'inline':
+                write_inline(engine, books)
+            else:
+                write_store(engine, books)
+            write_seconds = time.perf_counter() - start
+            with engine.connect() as connection:
+                connection.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+
+            read = read_inline if store == 'inline' else read_chapter_body
+            toc = toc_inline if store == 'inline' else toc_store
+            with Session(engine) as session:
+                read_p50, read_p99 = percentiles(
+                    lambda: read(session, rng.randint(1, args.books), rng.randrange(args.chapters)),
+                    args.reads,
+                )
+                toc_p50, toc_p99 = percentiles(
+                    lambda: toc(session, rng.randint(1, args.books)), max(args.reads // 10, 2)
+                )
+            engine.dispose()
+
+            disk_mb = dir_size(Path(tmp)) / 1024 / 1024
+            print(
+                f'{store:<8} {disk_mb:>9.1f} {write_seconds:>8.2f} {read_p50:>8.3f}ms {read_p99:>8.3f}ms '
+                f'{toc_p50:>7.3f}ms {toc_p99:>7.3f}ms'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# pyright: reportMissingImports=false
+"""
+书架列表基准测试
+
+在临时数据库中生成指定数量的书籍，通过 TestClient 请求 GET /api/books，
+对比一次返回全部书籍与精简字段、键集分页（首页和深翻页）的耗时和响应大小。
+
+用法:
+    uv run python benchmarks/bench_book_list.py --books 10000 100000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Generator
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, create_engine, insert
+
+from api import books
+from core.database import get_db_session
+from core.models import Book
+
+
+def seed_books(engine: Engine, count: int) -> None:
+    """生成测试书籍（约一半读过）"""
+    rng = random.Random(0)
+    rows = [
+        {
+            'hash_id': f'bench-{i}',
+            'title': f'测试书籍{i}',
+            'path': f'bench/{i}.txt',
+            'file_size': rng.randint(100_000, 10_000_000),
+            'file_mtime': 1_700_000_000.0,
+            'is_starred': rng.random() < 0.1,
+            'last_read_time': 1_700_000_000.0 + rng.randint(0, 10_000_000) if rng.random() < 0.5 else None,
+            'chapter_index': rng.randint(0, 1000),
+            'chapter_offset': rng.randint(0, 5000),
+        }
+        for i in range(count)
+    ]
+    with Session(engine) as session:
+        session.exec(insert(Book), params=rows)
+        session.commit()
+
+
+def make_client(engine: Engine) -> TestClient:
+    app = FastAPI()
+    app.include_router(books.router, prefix='/api/books')
+
+    def get_bench_session() -> Generator[Session, None, None]:
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = get_bench_session
+    return TestClient(app)
+
+
+def measure(client: TestClient, params: dict[str, str | int], rounds: int) -> tuple[float, int]:
+    """返回 (平均耗时毫秒, 响应字节数)"""
+    size = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        response = client.get('/api/books', params=params)
+        response.raise_for_status()
+        size = len(response.content)
+    return (time.perf_counter() - start) / rounds * 1000, size
+
+
+def deep_page_params(client: TestClient, page_size: int, pages: int) -> dict[str, str | int]:
+    """按最近阅读排序向后翻 pages 页，返回下一页的请求参数"""
+    params: dict[str, str | int] = {
+        'sort': 'last_read_time',
+        'order': 'desc',
+        'limit': page_size,
+        'fields': 'lite',
+    }
+    for _ in range(pages):
+        response = client.get('/api/books', params=params)
+        params['cursor'] = response.headers['X-Next-Cursor']
+    return params
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--books', type=int, nargs='+', default=[10_000, 100_000], help='书籍数量')
+    parser.add_argument('--page-size', type=int, default=50, help='分页大小')
+    parser.add_argument('--rounds', type=int, default=5, help='每个场景的请求次数')
+    args = parser.parse_args()
+
+    for count in args.books:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f'sqlite:///{Path(tmp) / "bench.db"}')
+            SQLModel.metadata.create_all(engine)
+            seed_books(engine, count)
+            client = make_client(engine)
+
+            page = {'sort': 'last_read_time', 'order': 'desc', 'limit': args.page_size, 'fields': 'lite'}
+            scenarios: dict[str, dict[str, str | int]] = {
+                'full (all rows)': {},
+                'lite (all rows)': {'fields': 'lite'},
+                'lite first page': page,
+                'lite page 100': deep_page_params(client, args.page_size, 100),
+            }
+            print(f'== {count:,} books ==')
+            for name, params in scenarios.items():
+                elapsed_ms, size = measure(client, params, args.rounds)
+                print(f'{name:<18} {elapsed_ms:>10.1f} ms {size / 1024:>10.1f} KiB')
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
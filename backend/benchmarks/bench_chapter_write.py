@@ -0,0 +1,120 @@
+# pyright: reportMissingImports=false
+"""
+章节写入基准测试
+
+对比逐行 ORM 写入（session.add / session.delete）与批量写入（insert_chapters / delete_book_chapters）
+的吞吐量（行/秒）。
+
+用法:
+    uv run python benchmarks/bench_chapter_write.py --chapters 3000 --rounds 5
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, col, create_engine, select
+
+from core.config import settings
+from core.database import create_fts_tables
+from core.models import Book, Chapter, ChapterBody
+from services.body_store import compress_body
+from services.book_service import delete_book_chapters, insert_chapters
+from services.parser import ChapterDict
+
+
+def make_chapters(count: int, paragraphs: int) -> list[ChapterDict]:
+    """生成测试章节（每段约 100 字）"""
+    paragraph = '这是一段用于基准测试的正文内容，长度大约在一百个字左右。' * 4
+    return [
+        ChapterDict(title=f'第{i + 1}章 测试', order_index=i, content=[paragraph] * paragraphs)
+        for i in range(count)
+    ]
+
+
+def orm_write(session: Session, book: Book, chapters_data: list[ChapterDict]) -> None:
+    """原实现：逐行删除旧章节，再逐个 session.add 新章节（正文写入 chapter_body 表）"""
+    chapters = session.exec(select(Chapter).where(Chapter.book_id == book.id)).all()
+    for body in session.exec(
+        select(ChapterBody).where(col(ChapterBody.chapter_id).in_([chapter.id for chapter in chapters]))
+    ).all():
+        session.delete(body)
+    for chapter in chapters:
+        session.delete(chapter)
+    # 先执行 DELETE，避免与新章节的 (book_id, order_index) 唯一索引冲突
+    session.flush()
+    new_chapters = [
+        Chapter(book_id=book.id, title=chapter_data['title'], order_index=chapter_data['order_index'])
+        for chapter_data in chapters_data
+    ]
+    session.add_all(new_chapters)
+    session.flush()
+    for chapter, chapter_data in zip(new_chapters, chapters_data, strict=True):
+        content = '\n\n'.join(chapter_data['content'])
+        session.add(ChapterBody(chapter_id=chapter.id, data=compress_body(content)))
+
+
+def bulk_write(session: Session, book: Book, chapters_data: list[ChapterDict]) -> None:
+    """批量实现：单条 DELETE + 分批 executemany"""
+    delete_book_chapters(session, book)
+    insert_chapters(session, book, chapters_data)
+
+
+def run(
+    engine: Engine,
+    write: Callable[[Session, Book, list[ChapterDict]], None],
+    chapters_data: list[ChapterDict],
+    rounds: int,
+) -> float:
+    """模拟“首次导入 + 多次重新解析”，返回每秒写入的章节行数"""
+    with Session(engine) as session:
+        book = Book(
+            hash_id=f'bench-{write.__name__}', title='bench', path='bench.txt', file_size=0, file_mtime=0
+        )
+        session.add(book)
+        session.commit()
+        book_id = book.id
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            book = session.get_one(Book, book_id)
+            write(session, book, chapters_data)
+            session.commit()
+            # 与线上行为一致：提交后释放会话中的对象
+            session.expunge_all()
+        elapsed = time.perf_counter() - start
+
+    return len(chapters_data) * rounds / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--chapters', type=int, default=3000, help='每本书的章节数')
+    parser.add_argument('--paragraphs', type=int, default=20, help='每章的段落数')
+    parser.add_argument('--rounds', type=int, default=5, help='重复写入（重新解析）的次数')
+    args = parser.parse_args()
+
+    chapters_data = make_chapters(args.chapters, args.paragraphs)
+    # 只比较章节和正文的写入，不建立全文索引
+    settings.fulltext_index = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for write in (orm_write, bulk_write):
+            engine = create_engine(f'sqlite:///{Path(tmp) / f"{write.__name__}.db"}')
+            SQLModel.metadata.create_all(engine)
+            create_fts_tables(engine)
+            rows_per_second = run(engine, write, chapters_data, args.rounds)
+            engine.dispose()
+            print(f'{write.__name__:<12} {rows_per_second:>12,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# pyright: reportMissingImports=false
+"""
+数据库性能配置基准测试
+
+对比“无 PRAGMA、无章节索引”（原实现）与 DB_PROFILE=performance + 索引在扫描写入期间的章节读取延迟：
+后台线程模拟扫描，不断重新写入书籍的全部章节并提交；主线程随机读取章节正文，统计延迟分位数。
+
+用法:
+    uv run python benchmarks/bench_db_profile.py --books 100 --chapters 300 --seconds 10
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from sqlalchemy import Engine, text
+from sqlmodel import Session, SQLModel
+
+from core.database import create_db_engine, create_fts_tables
+from core.models import Book
+from services.body_store import read_chapter_body
+from services.book_service import delete_book_chapters, insert_chapters
+from services.parser import ChapterDict
+
+
+def make_chapters(count: int, paragraphs: int) -> list[ChapterDict]:
+    paragraph = '这是一段用于基准测试的正文内容，长度大约在一百个字左右。' * 4
+    return [
+        ChapterDict(title=f'第{i + 1}章 测试', order_index=i, content=[paragraph] * paragraphs)
+        for i in range(count)
+    ]
+
+
+def seed(engine: Engine, books: int, chapters_data: list[ChapterDict]) -> list[int]:
+    with Session(engine) as session:
+        book_ids = []
+        for i in range(books):
+            book = Book(
+                hash_id=f'bench-{i}', title=f'测试书籍{i}', path=f'{i}.txt', file_size=0, file_mtime=0
+            )
+            session.add(book)
+            session.flush()
+            assert book.id is not None
+            insert_chapters(session, book, chapters_data)
+            book_ids.append(book.id)
+        session.commit()
+    return book_ids
+
+
+def simulate_scan(
+    engine: Engine, book_ids: list[int], chapters_data: list[ChapterDict], stop: threading.Event
+) -> int:
+    """模拟全量扫描：逐本书删除并重新写入章节，每本书提交一次"""
+    rng = random.Random(1)
+    written = 0
+    with Session(engine) as session:
+        while not stop.is_set():
+            book = session.get_one(Book, rng.choice(book_ids))
+            delete_book_chapters(session, book)
+            insert_chapters(session, book, chapters_data)
+            session.commit()
+            written += 1
+    return written
+
+
+def read_chapters(engine: Engine, book_ids: list[int], chapters: int, seconds: float) -> list[float]:
+    """随机读取章节正文，返回每次读取的耗时（毫秒）"""
+    rng = random.Random(2)
+    latencies: list[float] = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        book_id, order_index = rng.choice(book_ids), rng.randrange(chapters)
+        start = time.perf_counter()
+        with Session(engine) as session:
+            read_chapter_body(session, book_id, order_index)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def run(profile: str, with_indexes: bool, args: argparse.Namespace) -> None:
+    chapters_data = make_chapters(args.chapters, args.paragraphs)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f'sqlite:///{Path(tmp) / "bench.db"}', profile)
+        SQLModel.metadata.create_all(engine)
+        create_fts_tables(engine)
+        if not with_indexes:
+            with engine.begin() as connection:
+                connection.execute(text('DROP INDEX ix_chapter_book_id_order_index'))
+        book_ids = seed(engine, args.books, chapters_data)
+
+        stop = threading.Event()
+        written: list[int] = []
+        writer = threading.Thread(
+            target=lambda: written.append(simulate_scan(engine, book_ids, chapters_data, stop))
+        )
+        writer.start()
+        try:
+            latencies = read_chapters(engine, book_ids, args.chapters, args.seconds)
+        finally:
+            stop.set()
+            writer.join()
+        engine.dispose()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    name = f'{profile}{" + indexes" if with_indexes else ""}'
+    print(
+        f'{name:<24} reads {len(latencies):>7}  p50 {quantiles[49]:>8.2f} ms  p95 {quantiles[94]:>8.2f} ms  '
+        f'p99 {quantiles[98]:>8.2f} ms  max {max(latencies):>8.1f} ms  books written {written[0]}'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--books', type=int, default=100, help='书籍数量')
+    parser.add_argument('--chapters', type=int, default=300, help='每本书的章节数')
+    parser.add_argument('--paragraphs', type=int, default=10, help='每章的段落数')
+    parser.add_argument('--seconds', type=float, default=10, help='每个场景的读取时长（秒）')
+    args = parser.parse_args()
+
+    run('off', with_indexes=False, args=args)
+    run('performance', with_indexes=True, args=args)
+
+
+if __name__ == '__main__':
+    main()
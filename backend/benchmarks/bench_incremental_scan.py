@@ -0,0 +1,117 @@
+# pyright: reportMissingImports=false
+"""
+增量扫描基准测试
+
+在临时目录中生成大量小 TXT 文件，并直接按文件的 stat 写入对应的书籍记录（相当于已经扫描过一次），然后：
+1. 无变化的增量扫描：统计耗时和提交解析的文件数（应为 0，即不读取任何文件内容）
+2. 删除一部分文件后的增量扫描：统计清理书籍记录的耗时
+
+用法:
+    uv run python benchmarks/bench_incremental_scan.py --files 50000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from loguru import logger
+from sqlmodel import Session, SQLModel, create_engine, insert
+
+from core.config import settings
+from core.database import create_fts_tables
+from core.models import Book, Chapter
+from services import scanner
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """记录提交的解析任务数"""
+
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        CountingExecutor.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+def seed(books_dir: Path, files: int, chapters: int) -> list[dict]:
+    rows = []
+    for i in range(files):
+        path = books_dir / f'{i // 1000:03d}' / f'{i}.txt'
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f'第一章 测试\n第{i}本书的正文。', encoding='utf-8')
+        stat = path.stat()
+        rows.append(
+            {
+                'hash_id': f'hash-{i}',
+                'title': str(i),
+                'path': str(path.relative_to(books_dir)),
+                'file_size': stat.st_size,
+                'file_mtime': stat.st_mtime,
+                'chapter_count': chapters,
+            }
+        )
+    return rows
+
+
+def run_scan(engine) -> tuple[float, int]:
+    CountingExecutor.submitted = 0
+    start = time.perf_counter()
+    scanner.scan_directory(db_engine=engine)
+    seconds = time.perf_counter() - start
+    status = scanner.get_scan_status()
+    assert status.error is None, status.error
+    return seconds, CountingExecutor.submitted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--files', type=int, default=50000, help='TXT 文件数量')
+    parser.add_argument('--chapters', type=int, default=20, help='每本书的章节记录数')
+    parser.add_argument('--delete', type=float, default=0.1, help='第二次扫描前删除的文件比例')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    scanner._create_parse_executor = lambda: CountingExecutor(max_workers=1)  # noqa: SLF001
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.data_dir = Path(tmp)
+        settings.books_dir.mkdir()
+        engine = create_engine(f'sqlite:///{Path(tmp) / "bench.db"}')
+        SQLModel.metadata.create_all(engine)
+        create_fts_tables(engine)
+
+        rows = seed(settings.books_dir, args.files, args.chapters)
+        with Session(engine) as session:
+            book_ids = session.exec(insert(Book).returning(Book.id), params=rows).scalars().all()
+            session.exec(
+                insert(Chapter),
+                params=[
+                    {'book_id': book_id, 'title': f'第{j + 1}章', 'order_index': j}
+                    for book_id in book_ids
+                    for j in range(args.chapters)
+                ],
+            )
+            session.commit()
+
+        seconds, submitted = run_scan(engine)
+        print(f'no-change rescan of {args.files} files: {seconds:.2f} s, files parsed {submitted}')
+
+        deleted = int(args.files * args.delete)
+        for row in rows[:deleted]:
+            os.remove(settings.books_dir / row['path'])
+        seconds, submitted = run_scan(engine)
+        print(f'rescan after deleting {deleted} files: {seconds:.2f} s, files parsed {submitted}')
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
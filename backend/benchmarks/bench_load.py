@@ -0,0 +1,335 @@
+# pyright: reportMissingImports=false
+"""
+API 负载测试
+
+在临时数据目录中生成 N 本书（每本 M 章，正文由 corpus.py 生成），启动 uvicorn 服务并通过扫描接口导入，
+然后按目标请求速率（开环：按固定间隔发出请求，不等待上一个请求完成）混合请求以下接口：
+
+- list_books：GET /api/books?limit=50&fields=lite
+- list_chapters：GET /api/books/{id}/chapters
+- get_chapter_content：GET /api/books/{id}/chapters/{index}
+- update_progress：PATCH /api/books/{id}/progress
+
+分两个阶段统计各接口的吞吐量、延迟分位数和延迟分布：空闲时（--duration 秒），以及扫描新增的
+--scan-files 个文件期间（直到扫描结束）。延迟从请求的计划发出时间开始计算，负载生成跟不上时也能反映排队时间。
+
+--server process 在子进程中启动 uvicorn（负载生成不与服务争用 GIL），inprocess 在本进程的线程中启动。
+
+用法:
+    uv run python benchmarks/bench_load.py --books 200 --chapters 50 --rps 200 --duration 30
+    uv run python benchmarks/bench_load.py --rps 500 --mix list_books=1,get_chapter_content=9 --output a.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import httpx
+import uvicorn
+from corpus import NovelGenerator
+from loguru import logger
+
+SRC_DIR = Path(__file__).parent.parent / 'src'
+sys.path.append(str(SRC_DIR))
+
+ENDPOINTS = ('list_books', 'list_chapters', 'get_chapter_content', 'update_progress')
+DEFAULT_MIX = 'list_books=1,list_chapters=1,get_chapter_content=6,update_progress=2'
+# 延迟分布的桶上限（毫秒）
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, float('inf'))
+
+
+class PhaseStats:
+    """一个阶段中各接口的延迟（毫秒）和错误数"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latencies: dict[str, list[float]] = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors: dict[str, int] = dict.fromkeys(ENDPOINTS, 0)
+        self.seconds = 0.0
+        self.dropped = 0
+
+    def summary(self) -> dict:
+        result = {'phase': self.name, 'seconds': self.seconds, 'endpoints': {}}
+        for endpoint, latencies in self.latencies.items():
+            if not latencies:
+                continue
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            histogram = [0] * len(BUCKETS)
+            for latency in latencies:
+                histogram[next(i for i, bound in enumerate(BUCKETS) if latency <= bound)] += 1
+            result['endpoints'][endpoint] = {
+                'requests': len(latencies),
+                'errors': self.errors[endpoint],
+                'rps': len(latencies) / self.seconds,
+                'p50': quantiles[49],
+                'p90': quantiles[89],
+                'p99': quantiles[98],
+                'max': max(latencies),
+                'histogram': histogram,
+            }
+        return result
+
+
+def make_books(directory: Path, count: int, chapters: int, chapter_chars: int, seed: int) -> None:
+    """生成 count 本书，每本 chapters 章（按千本分目录）"""
+    generator = NovelGenerator(seed=seed, chapter_chars=chapter_chars)
+    for i in range(count):
+        lines = []
+        for j in range(chapters):
+            lines.append(generator.title(j + 1))
+            length = 0
+            while length < chapter_chars:
+                paragraph = generator.paragraph()
+                lines += paragraph
+                length += sum(len(line) for line in paragraph)
+        path = directory / f'{i // 1000:03d}' / f'测试书籍{seed}-{i}.txt'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('\n'.join(lines), encoding='utf-8')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for item in mix.split(','):
+        endpoint, _, weight = item.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'unknown endpoint: {endpoint}')
+        weights[endpoint] = float(weight or 1)
+    return weights
+
+
+def start_server(mode: str, data_dir: str, port: int, log_path: Path | None) -> Callable[[], None]:
+    """启动服务，返回停止服务的函数"""
+    if mode == 'process':
+        env = {**os.environ, 'DATA_DIR': data_dir}
+        env.pop('APP_PASSWORD', None)
+        log_file = log_path.open('w') if log_path else subprocess.DEVNULL
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', str(SRC_DIR), '--port', str(port)]
+            + ['--log-level', 'warning', '--no-access-log'],
+            env=env,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+        )
+
+        def stop_process() -> None:
+            process.terminate()
+            process.wait()
+            if log_path:
+                log_file.close()
+
+        return stop_process
+
+    # 配置在导入应用时读取
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.pop('APP_PASSWORD', None)
+    from main import app  # noqa: PLC0415
+
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level='warning', access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    def stop() -> None:
+        server.should_exit = True
+        thread.join()
+
+    return stop
+
+
+def wait_for_server(client: httpx.Client, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client.get('/api/system/health').raise_for_status()
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def wait_for_scan(client: httpx.Client) -> dict:
+    while (status := client.get('/api/scan/status').json())['is_running']:
+        time.sleep(0.2)
+    return status
+
+
+async def run_phase(
+    client: httpx.AsyncClient,
+    stats: PhaseStats,
+    books: list[tuple[int, int]],
+    mix: dict[str, float],
+    rps: float,
+    until: Callable[[float], bool],
+    max_in_flight: int,
+) -> None:
+    """按 rps 的固定间隔发出请求，直到 until(已用时间) 为真"""
+    rng = random.Random(0)
+    endpoints, weights = list(mix), list(mix.values())
+    loop = asyncio.get_running_loop()
+    in_flight: set[asyncio.Task] = set()
+
+    async def request(endpoint: str, scheduled: float) -> None:
+        book_id, chapter_count = rng.choice(books)
+        chapter_index = rng.randrange(chapter_count)
+        try:
+            if endpoint == 'list_books':
+                response = await client.get('/api/books', params={'limit': 50, 'fields': 'lite'})
+            elif endpoint == 'list_chapters':
+                response = await client.get(f'/api/books/{book_id}/chapters')
+            elif endpoint == 'get_chapter_content':
+                response = await client.get(f'/api/books/{book_id}/chapters/{chapter_index}')
+            else:
+                response = await client.patch(
+                    f'/api/books/{book_id}/progress',
+                    json={'chapter_index': chapter_index, 'chapter_offset': rng.randrange(1000)},
+                )
+            if response.status_code >= 400:
+                stats.errors[endpoint] += 1
+        except httpx.HTTPError:
+            stats.errors[endpoint] += 1
+        stats.latencies[endpoint].append((loop.time() - scheduled) * 1000)
+
+    start = loop.time()
+    sent = 0
+    while not until(loop.time() - start):
+        scheduled = start + sent / rps
+        await asyncio.sleep(scheduled - loop.time())
+        sent += 1
+        # 积压过多时丢弃本次请求（记录数量），避免无限制地创建任务
+        if len(in_flight) >= max_in_flight:
+            stats.dropped += 1
+            continue
+        task = asyncio.create_task(request(rng.choices(endpoints, weights)[0], scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    await asyncio.gather(*in_flight)
+    stats.seconds = loop.time() - start
+
+
+def print_summary(summary: dict, rps: float, dropped: int) -> None:
+    endpoints = summary['endpoints']
+    total = sum(endpoint['requests'] for endpoint in endpoints.values())
+    print(
+        f'\n[{summary["phase"]}] {summary["seconds"]:.1f} s, target {rps:.0f} req/s, '
+        f'achieved {total / summary["seconds"]:.1f} req/s, dropped {dropped}'
+    )
+    print(
+        f'{"endpoint":<20} {"requests":>8} {"errors":>6} {"req/s":>7} '
+        f'{"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} {"max ms":>8}'
+    )
+    for name, endpoint in endpoints.items():
+        print(
+            f'{name:<20} {endpoint["requests"]:>8} {endpoint["errors"]:>6} {endpoint["rps"]:>7.1f} '
+            f'{endpoint["p50"]:>8.2f} {endpoint["p90"]:>8.2f} {endpoint["p99"]:>8.2f} {endpoint["max"]:>8.1f}'
+        )
+    labels = [f'<={bound:g}' if bound != float('inf') else '>2000' for bound in BUCKETS]
+    print(f'\n{"latency (ms)":<20} ' + ' '.join(f'{label:>6}' for label in labels))
+    for name, endpoint in endpoints.items():
+        print(f'{name:<20} ' + ' '.join(f'{count:>6}' for count in endpoint['histogram']))
+
+
+async def run_load(base_url: str, books: list[tuple[int, int]], args: argparse.Namespace) -> list[dict]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    summaries = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        idle = PhaseStats('idle')
+        await run_phase(
+            client,
+            idle,
+            books,
+            args.mix,
+            args.rps,
+            lambda elapsed: elapsed >= args.duration,
+            args.max_in_flight,
+        )
+        summaries.append((idle.summary(), idle.dropped))
+
+        if args.scan_files:
+            make_books(Path(args.data_dir) / 'books' / 'scan', args.scan_files, args.scan_chapters, 500, 1)
+            (await client.post('/api/scan')).raise_for_status()
+            scan_done = threading.Event()
+
+            def poll_scan() -> None:
+                with httpx.Client(base_url=base_url, timeout=60) as status_client:
+                    wait_for_scan(status_client)
+                scan_done.set()
+
+            threading.Thread(target=poll_scan, daemon=True).start()
+            scanning = PhaseStats('scanning')
+            await run_phase(
+                client, scanning, books, args.mix, args.rps, lambda _: scan_done.is_set(), args.max_in_flight
+            )
+            summaries.append((scanning.summary(), scanning.dropped))
+
+    for summary, dropped in summaries:
+        print_summary(summary, args.rps, dropped)
+    return [summary | {'dropped': dropped} for summary, dropped in summaries]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--books', type=int, default=200, help='书籍数量')
+    parser.add_argument('--chapters', type=int, default=50, help='每本书的章节数')
+    parser.add_argument('--chapter-chars', type=int, default=2000, help='每章的字符数')
+    parser.add_argument('--rps', type=float, default=200, help='目标请求速率（请求/秒）')
+    parser.add_argument('--duration', type=float, default=30, help='空闲阶段的时长（秒）')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help='各接口的请求权重')
+    parser.add_argument('--concurrency', type=int, default=32, help='最大连接数')
+    parser.add_argument('--max-in-flight', type=int, default=1000, help='未完成请求数上限，超出时丢弃请求')
+    parser.add_argument('--scan-files', type=int, default=2000, help='扫描阶段新增的文件数量（0 表示跳过）')
+    parser.add_argument('--scan-chapters', type=int, default=10, help='扫描阶段每个文件的章节数')
+    parser.add_argument('--server', choices=('process', 'inprocess'), default='process', help='服务运行方式')
+    parser.add_argument('--server-log', type=Path, help='子进程服务的日志文件（默认丢弃）')
+    parser.add_argument('--output', type=Path, help='保存结果的 JSON 文件')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.data_dir = tmp
+        books_dir = Path(tmp) / 'books'
+        print(f'generating {args.books} books x {args.chapters} chapters ...')
+        make_books(books_dir, args.books, args.chapters, args.chapter_chars, 0)
+
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        stop_server = start_server(args.server, tmp, port, args.server_log)
+        try:
+            with httpx.Client(base_url=base_url, timeout=60) as client:
+                wait_for_server(client)
+                start = time.perf_counter()
+                client.post('/api/scan').raise_for_status()
+                status = wait_for_scan(client)
+                print(f'imported {status["files_added"]} books in {time.perf_counter() - start:.1f} s')
+                books = [(book['id'], book['chapter_count']) for book in client.get('/api/books').json()]
+            results = asyncio.run(run_load(base_url, books, args))
+        finally:
+            stop_server()
+
+    if args.output:
+        options = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items() if k != 'data_dir'}
+        args.output.write_text(json.dumps({'args': options, 'phases': results}, indent=2))
+        print(f'\nresults saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# pyright: reportMissingImports=false
+"""
+解析热路径基准测试
+
+用 corpus.py 为每种编码生成一本合成小说（可调大小、章节密度和噪声），分别测量解析流程各阶段的吞吐量（MB/s，
+按原文件字节数计算）和峰值内存（tracemalloc，单独运行一次，不计入耗时）：
+
+- detect_encoding：编码检测（文件）
+- clean_html / translate（全角转半角）/ t2s_fast / t2s_opencc / clean_line_breaks / clean_content：
+  清洗各步骤（文本）
+- is_line_chapter_title（逐行）/ classify_chapter_titles（分批）：章节标题判断（文本按行拆分）
+- parse_chapters / read_chapters：端到端解析（文件，整体读取 / 流式读取）
+
+结果可保存为 JSON（--output），并与之前保存的结果比较（--compare），用于发现不同提交之间的性能回退。
+
+用法:
+    uv run python benchmarks/bench_parser.py --size-mb 5 --output before.json
+    uv run python benchmarks/bench_parser.py --size-mb 5 --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from corpus import ENCODINGS, write_novel
+from loguru import logger
+
+from services.parser import (
+    classify_chapter_titles,
+    clean_content,
+    clean_html,
+    clean_line_breaks,
+    detect_encoding,
+    is_line_chapter_title,
+    parse_chapters,
+    read_chapters,
+)
+from services.parser.cleaner import FullWidthStage
+from services.parser.converter import get_fast_converter, get_opencc
+
+
+class Case:
+    """一种编码的语料：文件和解码后的文本"""
+
+    def __init__(self, path: Path, encoding: str) -> None:
+        self.path = path
+        self.encoding = encoding
+        self.size = path.stat().st_size
+        self.text = path.read_bytes().decode(encoding).replace('\r\n', '\n')
+        self.lines = [line.strip() for line in self.text.split('\n') if line.strip()]
+
+
+def _is_line_chapter_title(lines: list[str]) -> None:
+    for line in lines:
+        is_line_chapter_title(line)
+
+
+STAGES: dict[str, Callable[[Case], Any]] = {
+    'detect_encoding': lambda case: detect_encoding(case.path),
+    'clean_html': lambda case: clean_html(case.text),
+    'translate': lambda case: FullWidthStage().clean(case.text),
+    't2s_fast': lambda case: get_fast_converter().convert(case.text),
+    't2s_opencc': lambda case: get_opencc().convert(case.text),
+    'clean_line_breaks': lambda case: clean_line_breaks(case.text),
+    'clean_content': lambda case: clean_content(case.text),
+    'is_line_chapter_title': lambda case: _is_line_chapter_title(case.lines),
+    'classify_chapter_titles': lambda case: classify_chapter_titles(case.lines),
+    'parse_chapters': lambda case: parse_chapters(case.path),
+    'read_chapters': lambda case: read_chapters(case.path),
+}
+
+
+def measure(stage: Callable[[Case], Any], case: Case, repeat: int) -> tuple[float, int]:
+    """返回 (最短耗时, 峰值内存字节数)"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage(case)
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        stage(case)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(seconds), peak
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(results: list[dict], baseline_path: Path) -> None:
+    baseline = {(r['corpus'], r['stage']): r for r in json.loads(baseline_path.read_text())['results']}
+    print(f'\ncompared with {baseline_path}:')
+    print(f'{"corpus":<8} {"stage":<24} {"MB/s":>9} {"base":>9} {"speedup":>8} {"peak MB":>8} {"base":>8}')
+    for result in results:
+        base = baseline.get((result['corpus'], result['stage']))
+        if base is None:
+            continue
+        speed, base_speed = result['mb_per_s'], base['mb_per_s']
+        print(
+            f'{result["corpus"]:<8} {result["stage"]:<24} {speed:>9.2f} {base_speed:>9.2f} '
+            f'{speed / base_speed:>7.2f}x {result["peak_mb"]:>8.1f} {base["peak_mb"]:>8.1f}'
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--size-mb', type=float, default=5, help='每种编码的语料大小（MB）')
+    parser.add_argument('--encodings', nargs='+', choices=ENCODINGS, default=list(ENCODINGS))
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--chapter-chars', type=int, default=3000, help='每章的字符数（章节密度）')
+    parser.add_argument('--html', type=float, default=0.05, help='带 HTML 标签的段落比例')
+    parser.add_argument('--full-width', type=float, default=0.05, help='带全角字母数字的句子比例')
+    parser.add_argument('--hard-wrap', type=float, default=0.05, help='硬换行的段落比例')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段重复次数（取最短耗时）')
+    parser.add_argument('--output', type=Path, help='保存结果的 JSON 文件')
+    parser.add_argument('--compare', type=Path, help='与之前保存的 JSON 结果比较')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    # 预热：加载 OpenCC 词典和转换表，不计入耗时
+    get_opencc().convert('預熱')
+    get_fast_converter().convert('預熱')
+    results = []
+    print(f'{"corpus":<8} {"stage":<24} {"seconds":>9} {"MB/s":>9} {"peak MB":>8}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for encoding in args.encodings:
+            path = Path(tmp) / f'{encoding}.txt'
+            write_novel(
+                path,
+                int(args.size_mb * 1024 * 1024),
+                encoding,
+                chapter_chars=args.chapter_chars,
+                html=args.html,
+                full_width=args.full_width,
+                hard_wrap=args.hard_wrap,
+            )
+            case = Case(path, encoding)
+            for name in args.stages:
+                stage = STAGES[name]
+                seconds, peak = measure(stage, case, args.repeat)
+                result = {
+                    'corpus': encoding,
+                    'stage': name,
+                    'bytes': case.size,
+                    'seconds': seconds,
+                    'mb_per_s': case.size / 1024 / 1024 / seconds,
+                    'peak_mb': peak / 1024 / 1024,
+                }
+                results.append(result)
+                print(
+                    f'{encoding:<8} {name:<24} {seconds:>9.3f} {result["mb_per_s"]:>9.2f} '
+                    f'{result["peak_mb"]:>8.1f}'
+                )
+
+    if args.output:
+        args.output.write_text(
+            json.dumps(
+                {
+                    'commit': git_commit(),
+                    'time': datetime.now(UTC).isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'args': {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+                    'results': results,
+                },
+                indent=2,
+                ensure_ascii=False,
+            )
+        )
+        print(f'\nresults saved to {args.output}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# pyright: reportMissingImports=false
+"""
+扫描期间的 API 延迟基准测试
+
+在临时数据目录中生成大量小 TXT 文件，启动真实的 uvicorn 服务，触发扫描后不断请求书架列表
+（GET /api/books?limit=50&fields=lite），统计扫描期间与扫描结束后（空闲）的延迟分位数。
+
+用法:
+    uv run python benchmarks/bench_scan_latency.py --files 10000
+"""
+
+import argparse
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from loguru import logger
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+BOOKS_URL = '/api/books?limit=50&fields=lite'
+
+
+def make_files(books_dir: Path, count: int, chapters: int) -> None:
+    rng = random.Random(0)
+    charset = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+    for i in range(count):
+        lines = []
+        for j in range(chapters):
+            lines.append(f'第{j + 1}章 测试')
+            lines += [''.join(rng.choices(charset, k=60)) + '。' for _ in range(6)]
+        path = books_dir / f'{i // 1000:03d}' / f'测试书籍{i}.txt'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('\n'.join(lines), encoding='utf-8')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def summarize(name: str, latencies: list[float]) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f'{name:<10} requests {len(latencies):>6}  p50 {quantiles[49]:>8.2f} ms  '
+        f'p99 {quantiles[98]:>8.2f} ms  max {max(latencies):>8.1f} ms'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--files', type=int, default=10000, help='TXT 文件数量')
+    parser.add_argument('--chapters', type=int, default=10, help='每个文件的章节数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 配置在导入应用时读取
+        os.environ['DATA_DIR'] = tmp
+        from core.config import settings  # noqa: PLC0415
+
+        settings.ensure_directories()
+        make_files(settings.books_dir, args.files, args.chapters)
+        from main import app  # noqa: PLC0415
+
+        logger.remove()
+        logger.add(sys.stderr, level='WARNING')
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, port=port, log_level='warning', access_log=False))
+        server_thread = threading.Thread(target=server.run, daemon=True)
+        server_thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=60) as client:
+            start = time.perf_counter()
+            client.post('/api/scan').raise_for_status()
+            during: list[float] = []
+            while client.get('/api/scan/status').json()['is_running']:
+                request_start = time.perf_counter()
+                client.get(BOOKS_URL).raise_for_status()
+                during.append((time.perf_counter() - request_start) * 1000)
+            scan_seconds = time.perf_counter() - start
+            status = client.get('/api/scan/status').json()
+
+            idle: list[float] = []
+            for _ in range(max(len(during), 200)):
+                request_start = time.perf_counter()
+                client.get(BOOKS_URL).raise_for_status()
+                idle.append((time.perf_counter() - request_start) * 1000)
+
+        server.should_exit = True
+        server_thread.join()
+
+    print(f'scanned {status["files_scanned"]} files in {scan_seconds:.1f} s (error: {status["error"]})')
+    summarize('scanning', during)
+    summarize('idle', idle)
+
+
+if __name__ == '__main__':
+    main()
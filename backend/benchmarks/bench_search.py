@@ -0,0 +1,153 @@
+# pyright: reportMissingImports=false
+"""
+全文搜索基准测试
+
+在临时数据库中生成指定大小的中文语料（随机常用字 + 少量固定短语），分别统计：
+- 章节写入耗时（元数据和压缩正文，不含索引）与全文索引耗时、数据库体积
+- 不同查询的延迟：高频三字词、低频短语、短查询（只搜索章节标题；书内搜索时逐章读取正文）、书内搜索
+
+用法:
+    uv run python benchmarks/bench_search.py --size-mb 2048 --rounds 5
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from core.config import settings
+from core.database import create_fts_tables
+from core.models import Book, Chapter
+from services.book_service import insert_chapters
+from services.parser import ChapterDict
+from services.search import index_book, index_book_chapters, search_books, search_chapters
+
+# 语料中插入的固定短语：高频词和低频词
+COMMON_PHRASE = '修仙者'
+RARE_PHRASE = '鹊山招摇之山'
+CHAPTER_CHARS = 5000
+CHAPTERS_PER_BOOK = 500
+
+
+def make_chapter(rng: random.Random, charset: str) -> str:
+    chars = rng.choices(charset, k=CHAPTER_CHARS)
+    for _ in range(5):
+        chars.insert(rng.randrange(len(chars)), COMMON_PHRASE)
+    if rng.random() < 0.001:
+        chars.insert(rng.randrange(len(chars)), RARE_PHRASE)
+    text = ''.join(chars)
+    # 每 100 字左右分段
+    return '\n\n'.join(text[i : i + 100] for i in range(0, len(text), 100))
+
+
+def seed(session: Session, size_mb: int) -> tuple[float, float]:
+    """生成语料并写入，返回 (章节写入耗时, 全文索引耗时)"""
+    rng = random.Random(0)
+    # 常用汉字区间中取 3000 个字，加上标点
+    charset = ''.join(chr(c) for c in range(0x4E00, 0x4E00 + 3000)) + '，。！？' * 100
+    chapters_total = size_mb * 1024 * 1024 // (CHAPTER_CHARS * 3)
+    write_seconds = index_seconds = 0.0
+    book_no = 0
+    while chapters_total > 0:
+        count = min(CHAPTERS_PER_BOOK, chapters_total)
+        chapters_total -= count
+        book = Book(
+            hash_id=f'bench-{book_no}',
+            title=f'测试书籍{book_no}',
+            path=f'{book_no}.txt',
+            file_size=0,
+            file_mtime=0,
+        )
+        session.add(book)
+        session.flush()
+        assert book.id is not None
+        chapters_data = [
+            ChapterDict(title=f'第{i + 1}章', order_index=i, content=[make_chapter(rng, charset)])
+            for i in range(count)
+        ]
+
+        # 章节元数据和正文（不含全文索引）
+        start = time.perf_counter()
+        settings.fulltext_index = False
+        insert_chapters(session, book, chapters_data)
+        settings.fulltext_index = True
+        session.commit()
+        write_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        chapter_ids = session.exec(
+            select(Chapter.id).where(Chapter.book_id == book.id).order_by(Chapter.order_index)
+        ).all()
+        index_book(session, book.id, book.title)
+        index_book_chapters(
+            session,
+            book.id,
+            (
+                (chapter_id, chapter['title'], chapter['order_index'], chapter['content'][0])
+                for chapter_id, chapter in zip(chapter_ids, chapters_data, strict=True)
+            ),
+        )
+        session.commit()
+        index_seconds += time.perf_counter() - start
+        book_no += 1
+        session.expunge_all()
+    return write_seconds, index_seconds
+
+
+def timed(func, rounds: int) -> tuple[float, int]:
+    """返回 (平均耗时毫秒, 结果数)"""
+    result = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return (time.perf_counter() - start) / rounds * 1000, len(result)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--size-mb', type=int, default=200, help='语料大小（MB，按 UTF-8 计）')
+    parser.add_argument('--rounds', type=int, default=5, help='每个查询的重复次数')
+    parser.add_argument('--limit', type=int, default=20, help='每次查询返回的结果数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'bench.db'
+        engine = create_engine(f'sqlite:///{db_path}')
+        SQLModel.metadata.create_all(engine)
+        create_fts_tables(engine)
+
+        with Session(engine) as session:
+            write_seconds, index_seconds = seed(session, args.size_mb)
+            print(f'corpus            {args.size_mb:>10} MB')
+            print(f'chapter write     {write_seconds:>10.1f} s  ({args.size_mb / write_seconds:.1f} MB/s)')
+            print(f'fts index         {index_seconds:>10.1f} s  ({args.size_mb / index_seconds:.1f} MB/s)')
+            print(f'database size     {db_path.stat().st_size / 1024 / 1024:>10.1f} MB')
+
+            queries = {
+                'books "测试书籍1"': lambda: search_books(session, '测试书籍1', args.limit),
+                f'common "{COMMON_PHRASE}"': lambda: search_chapters(session, COMMON_PHRASE, args.limit),
+                f'rare "{RARE_PHRASE}"': lambda: search_chapters(session, RARE_PHRASE, args.limit),
+                f'in-book "{COMMON_PHRASE}"': lambda: search_chapters(session, COMMON_PHRASE, args.limit, 1),
+                f'short "{COMMON_PHRASE[:2]}" (titles)': lambda: search_chapters(
+                    session, COMMON_PHRASE[:2], args.limit
+                ),
+                f'in-book short "{COMMON_PHRASE[:2]}"': lambda: search_chapters(
+                    session, COMMON_PHRASE[:2], args.limit, 1
+                ),
+            }
+            for name, query in queries.items():
+                elapsed_ms, hits = timed(query, args.rounds)
+                print(f'{name:<24} {elapsed_ms:>10.1f} ms  {hits:>4} hits')
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# pyright: reportMissingImports=false
+"""
+index-only 导入基准测试
+
+在临时目录中生成 TXT 书籍（UTF-8 与 GB18030 各半），分别以 table / segment / source 三种正文存储导入，
+对比导入耗时、数据目录占用（不含书籍文件本身）和读取一章正文的延迟（不经过响应缓存）。
+
+用法:
+    uv run python benchmarks/bench_source_store.py --books 20 --chapters 500
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from core.config import settings
+from core.database import create_fts_tables
+from services.body_store import read_chapter_body
+from services.book_service import create_or_update_book
+
+PARAGRAPH_CHARS = 100
+PARAGRAPHS = 30
+
+
+def make_book(rng: random.Random, chapters: int) -> str:
+    charset = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+    words = [''.join(rng.choices(charset, k=rng.choice((1, 2, 2, 3)))) for _ in range(3000)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    lines = []
+    for i in range(chapters):
+        lines.append(f'第{i + 1}章 测试')
+        for _ in range(PARAGRAPHS):
+            paragraph = ''.join(rng.choices(words, weights, k=PARAGRAPH_CHARS // 2))[:PARAGRAPH_CHARS]
+            lines.append(f'　　{paragraph}。')
+    return '\r\n'.join(lines)
+
+
+def dir_size(path: Path, exclude: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file() and not p.is_relative_to(exclude))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--books', type=int, default=20, help='书籍数量')
+    parser.add_argument('--chapters', type=int, default=500, help='每本书的章节数')
+    parser.add_argument('--reads', type=int, default=2000, help='随机读取的次数')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = [make_book(rng, args.chapters) for _ in range(args.books)]
+    print(f'{args.books} books x {args.chapters} chapters')
+    print(f'{"store":<8} {"import s":>9} {"data MB":>8} {"read p50":>10} {"read p99":>10}')
+
+    for store in ('table', 'segment', 'source'):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.data_dir = Path(tmp)
+            settings.chapter_body_store = store
+            settings.fulltext_index = False
+            settings.books_dir.mkdir()
+            files = []
+            for i, text_ in enumerate(texts):
+                file_path = settings.books_dir / f'{i}.txt'
+                file_path.write_bytes(text_.encode('utf-8' if i % 2 == 0 else 'gb18030'))
+                files.append(file_path)
+
+            engine = create_engine(f'sqlite:///{settings.database_path}')
+            SQLModel.metadata.create_all(engine)
+            create_fts_tables(engine)
+            start = time.perf_counter()
+            with Session(engine) as session:
+                book_ids = [create_or_update_book(session, f, settings.books_dir)[0].id for f in files]
+            import_seconds = time.perf_counter() - start
+
+            latencies = []
+            for _ in range(args.reads):
+                book_id, order_index = rng.choice(book_ids), rng.randrange(args.chapters)
+                start = time.perf_counter()
+                with Session(engine) as session:
+                    read_chapter_body(session, book_id, order_index)
+                latencies.append((time.perf_counter() - start) * 1000)
+            engine.dispose()
+
+            quantiles = statistics.quantiles(latencies, n=100)
+            data_mb = dir_size(Path(tmp), settings.books_dir) / 1024 / 1024
+            print(
+                f'{store:<8} {import_seconds:>9.2f} {data_mb:>8.1f} '
+                f'{quantiles[49]:>8.3f}ms {quantiles[98]:>8.3f}ms'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# pyright: reportMissingImports=false
+"""
+合成小说语料生成器（供基准测试使用，也可单独运行生成 TXT 文件）
+
+- 正文由常用字组成的词按 Zipf 分布随机拼接，段落以句末标点结尾，段首带全角缩进
+- 简体使用 GB2312 一级汉字，繁体使用 Big5 常用字（big5 编码时自动使用繁体）
+- 章节标题混用阿拉伯数字和中文数字（“第12章 ……” / “第一百二十章 ……”）
+- 噪声：HTML 标签和实体、全角数字和字母、按固定宽度硬换行的段落
+
+用法:
+    uv run python benchmarks/corpus.py /tmp/corpus --books 10 --size-mb 5 --encoding gb18030 --html 0.1
+"""
+
+import argparse
+import random
+from itertools import accumulate
+from pathlib import Path
+
+ENCODINGS = ('utf-8', 'gb18030', 'big5')
+_DIGITS = '零一二三四五六七八九'
+_FULL_WIDTH = str.maketrans(
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    '０１２３４５６７８９ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ',
+)
+_HTML_TEMPLATES = ('<p>{}</p>', '{}<br/>', '<div class="content">{}</div>', '{}&nbsp;&nbsp;', '&lt;{}&gt;')
+_LATIN_WORDS = ('VIP', 'Level', 'HP', 'MP', 'NPC', '100', '2024', '3', 'A', 'B')
+
+
+def _charset(traditional: bool) -> list[str]:
+    """常用字：GB2312 一级汉字（3755 个）或 Big5 常用字（5401 个）"""
+    if traditional:
+        rows, cells, codec = range(0xA4, 0xC7), [*range(0x40, 0x7F), *range(0xA1, 0xFF)], 'big5'
+    else:
+        rows, cells, codec = range(0xB0, 0xD8), range(0xA1, 0xFF), 'gb2312'
+    chars = []
+    for row in rows:
+        for cell in cells:
+            try:
+                char = bytes((row, cell)).decode(codec)
+            except UnicodeDecodeError:
+                continue
+            if '一' <= char <= '鿿':
+                chars.append(char)
+    return chars
+
+
+def _chinese_number(n: int) -> str:
+    """1 - 9999 的中文数字"""
+    parts = []
+    for unit, value in (('千', 1000), ('百', 100), ('十', 10)):
+        digit, n = divmod(n, value)
+        if digit:
+            parts.append(('' if unit == '十' and digit == 1 and not parts else _DIGITS[digit]) + unit)
+        elif parts and n:
+            parts.append('零')
+    if n:
+        parts.append(_DIGITS[n])
+    return ''.join(parts).replace('零零', '零')
+
+
+class NovelGenerator:
+    """按给定的噪声比例生成合成小说"""
+
+    def __init__(
+        self,
+        seed: int = 0,
+        traditional: bool = False,
+        chapter_chars: int = 3000,
+        html: float = 0.0,
+        full_width: float = 0.0,
+        hard_wrap: float = 0.0,
+    ) -> None:
+        self.rng = random.Random(seed)
+        chars = _charset(traditional)
+        self.words = [''.join(self.rng.choices(chars, k=self.rng.choice((1, 2, 2, 3)))) for _ in range(5000)]
+        self.cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(self.words))))
+        self.chapter_chars = chapter_chars
+        self.html = html
+        self.full_width = full_width
+        self.hard_wrap = hard_wrap
+        self.intro = '簡介：' if traditional else '简介：'
+
+    def paragraph(self) -> list[str]:
+        """一个段落（硬换行时为多行）"""
+        rng = self.rng
+        sentences = []
+        for _ in range(rng.randint(1, 4)):
+            words = rng.choices(self.words, cum_weights=self.cum_weights, k=rng.randint(4, 20))
+            if rng.random() < self.full_width:
+                words.insert(rng.randrange(len(words)), rng.choice(_LATIN_WORDS).translate(_FULL_WIDTH))
+            sentence = ''.join(words)
+            if rng.random() < 0.2:
+                sentence = f'“{sentence}”'
+            sentences.append(sentence + rng.choice('。。。，！？…'))
+        text = ''.join(sentences)
+        if text[-1] == '，':
+            text = text[:-1] + '。'
+        if rng.random() < self.html:
+            text = rng.choice(_HTML_TEMPLATES).format(text)
+        if rng.random() < self.hard_wrap:
+            width = rng.choice((20, 30, 40))
+            return [text[i : i + width] for i in range(0, len(text), width)]
+        return ['　　' + text]
+
+    def title(self, index: int) -> str:
+        number = str(index) if self.rng.random() < 0.5 else _chinese_number(index)
+        name = ''.join(self.rng.choices(self.words, cum_weights=self.cum_weights, k=self.rng.randint(1, 4)))
+        return f'第{number}章 {name}'
+
+    def novel(self, size_chars: int) -> str:
+        """生成约 size_chars 个字符的小说（开头带简介作为前言）"""
+        lines = [self.intro, *self.paragraph()]
+        length = 0
+        chapter = 0
+        while length < size_chars:
+            chapter += 1
+            lines.append(self.title(chapter))
+            chapter_length = 0
+            while chapter_length < self.chapter_chars:
+                paragraph = self.paragraph()
+                lines += paragraph
+                chapter_length += sum(len(line) for line in paragraph)
+            length += chapter_length
+        return '\r\n'.join(lines)
+
+
+def generate_novel(size_chars: int, encoding: str = 'utf-8', **options) -> str:
+    """生成约 size_chars 个字符、可以按 encoding 编码的小说（big5 使用繁体）"""
+    options.setdefault('traditional', encoding == 'big5')
+    return NovelGenerator(**options).novel(size_chars)
+
+
+def write_novel(path: Path, size_bytes: int, encoding: str = 'utf-8', **options) -> int:
+    """写入约 size_bytes 字节的小说文件，返回实际字节数"""
+    # 中文字符在 UTF-8 中约 3 字节，在 GB18030 / Big5 中约 2 字节
+    bytes_per_char = 3 if encoding == 'utf-8' else 2
+    data = generate_novel(size_bytes // bytes_per_char, encoding, **options).encode(encoding)
+    path.write_bytes(data)
+    return len(data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('directory', type=Path, help='输出目录')
+    parser.add_argument('--books', type=int, default=10, help='书籍数量')
+    parser.add_argument('--size-mb', type=float, default=2, help='每本书的大小（MB）')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='utf-8', help='文件编码')
+    parser.add_argument('--traditional', action='store_true', help='使用繁体（big5 编码时总是使用繁体）')
+    parser.add_argument('--chapter-chars', type=int, default=3000, help='每章的字符数（章节密度）')
+    parser.add_argument('--html', type=float, default=0.0, help='带 HTML 标签的段落比例')
+    parser.add_argument('--full-width', type=float, default=0.0, help='带全角字母数字的句子比例')
+    parser.add_argument('--hard-wrap', type=float, default=0.0, help='硬换行的段落比例')
+    args = parser.parse_args()
+
+    args.directory.mkdir(parents=True, exist_ok=True)
+    total = 0
+    for i in range(args.books):
+        total += write_novel(
+            args.directory / f'合成小说{i}.txt',
+            int(args.size_mb * 1024 * 1024),
+            args.encoding,
+            seed=i,
+            traditional=args.traditional or args.encoding == 'big5',
+            chapter_chars=args.chapter_chars,
+            html=args.html,
+            full_width=args.full_width,
+            hard_wrap=args.hard_wrap,
+        )
+    print(f'wrote {args.books} books ({total / 1024 / 1024:.1f} MB) to {args.directory}')
+
+
+if __name__ == '__main__':
+    main()
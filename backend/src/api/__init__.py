@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 
 from api.deps import check_auth
 
-from . import books, chapters, scan, system
+from . import books, chapters, scan, search, system
 
 api_router = APIRouter(prefix='/api')
 
@@ -14,4 +14,7 @@ api_router.include_router(books.router, prefix='/books', tags=['books'], depende
 api_router.include_router(
     chapters.router, prefix='/books', tags=['chapters'], dependencies=[Depends(check_auth)]
 )
+api_router.include_router(
+    search.router, prefix='/search', tags=['search'], dependencies=[Depends(check_auth)]
+)
 api_router.include_router(scan.router, prefix='/scan', tags=['scan'], dependencies=[Depends(check_auth)])
@@ -1,20 +1,33 @@
+import base64
+import json
 import time
 from pathlib import Path
+from typing import Any, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
+from sqlmodel import Session, and_, func, or_, select
 from sqlmodel.sql.expression import col
 
 from core.config import settings
 from core.database import get_db_session
-from core.models import Book, Chapter
-from core.schemas import MarkFinishedRequest, MessageResponse, ToggleStarRequest, UpdateProgressRequest
+from core.models import Book
+from core.schemas import (
+    BookSummary,
+    MarkFinishedRequest,
+    MessageResponse,
+    ToggleStarRequest,
+    UpdateProgressRequest,
+)
+from services.book_service import calculate_progress_percent
+from services.book_service import delete_book as delete_book_service
 from services.book_service import reparse_book as reparse_book_service
+from services.cache import chapter_cache
 
 router = APIRouter()
 
 
-def check_book_finished(book: Book, chapters: list[Chapter]) -> bool:
+def check_book_finished(book: Book) -> bool:
     """
     检查并更新书籍的完成状态
 
@@ -23,15 +36,16 @@ def check_book_finished(book: Book, chapters: list[Chapter]) -> bool:
     2. 当前章节必须是最后一章
     3. 当前章节的偏移量接近章节末尾（剩余 < 5% 或 < 200字符，取较大值）
 
+    只使用解析时记录的章节统计（chapter_count、last_chapter_length），不读取章节内容
+
     返回：是否已读完
     """
-    if book.chapter_index is None or not chapters:
+    if book.chapter_index is None or book.chapter_count <= 0:
         book.is_finished = False
         return False
 
-    # 找到最后一章
-    last_chapter = max(chapters, key=lambda c: c.order_index)
-    last_chapter_index = last_chapter.order_index
+    # 最后一章的序号
+    last_chapter_index = book.chapter_count - 1
 
     # 如果当前章节不是最后一章，肯定没读完
     if book.chapter_index < last_chapter_index:
@@ -40,7 +54,7 @@ def check_book_finished(book: Book, chapters: list[Chapter]) -> bool:
 
     # 如果当前章节是最后一章，检查偏移量
     if book.chapter_index == last_chapter_index:
-        chapter_size = len(last_chapter.content)  # 使用字符长度
+        chapter_size = book.last_chapter_length  # 使用字符长度
         if book.chapter_offset is not None and chapter_size > 0:
             remaining = chapter_size - book.chapter_offset
             # 判断标准：剩余 < 5% 或 < 200字符（取较大值，适应不同屏幕）
@@ -53,14 +67,66 @@ def check_book_finished(book: Book, chapters: list[Chapter]) -> bool:
     return False
 
 
-@router.get('')
+BookSort = Literal['id', 'title', 'last_read_time']
+SortOrder = Literal['asc', 'desc']
+
+_book_list_adapter = TypeAdapter(list[Book])
+_book_summary_list_adapter = TypeAdapter(list[BookSummary])
+
+_SORT_COLUMNS = {
+    'id': col(Book.id),
+    'title': col(Book.title),
+    'last_read_time': col(Book.last_read_time),
+}
+
+
+def _encode_cursor(sort: BookSort, order: SortOrder, value: Any, book_id: int) -> str:
+    """游标：排序方式 + 上一页最后一本书的 (排序值, id)，base64url 编码"""
+    raw = json.dumps([sort, order, value, book_id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str, sort: BookSort, order: SortOrder) -> tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, book_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail='Invalid cursor') from e
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(book_id, int):
+        raise HTTPException(status_code=400, detail='Cursor does not match sort order')
+    return value, book_id
+
+
+def _keyset_condition(sort: BookSort, order: SortOrder, value: Any, book_id: int) -> Any:
+    """
+    键集分页条件：排在 (value, book_id) 之后的记录
+
+    SQLite 中 NULL 最小：升序时排在最前，降序时排在最后
+    """
+    column = _SORT_COLUMNS[sort]
+    id_column = col(Book.id)
+    if order == 'asc':
+        if value is None:
+            return or_(and_(column.is_(None), id_column > book_id), column.is_not(None))
+        return or_(column > value, and_(column == value, id_column > book_id))
+    if value is None:
+        return and_(column.is_(None), id_column < book_id)
+    return or_(column < value, and_(column == value, id_column < book_id), column.is_(None))
+
+
+@router.get('', response_model=list[Book] | list[BookSummary])
 async def list_books(
     starred: bool | None = Query(None, description='筛选标星书籍'),
     search: str | None = Query(None, description='搜索书名'),
     finished: bool | None = Query(None, description='筛选已读完/未读完的书籍'),
     started: bool | None = Query(None, description='筛选是否已开始阅读'),
+    sort: BookSort = Query('id', description='排序字段'),
+    order: SortOrder = Query('asc', description='排序方向'),
+    limit: int | None = Query(None, ge=1, le=1000, description='每页数量，不传则返回全部'),
+    cursor: str | None = Query(None, description='分页游标（上一页响应头 X-Next-Cursor）'),
+    fields: Literal['full', 'lite'] = Query('full', description='返回字段：full 为完整字段，lite 为精简字段'),
     session: Session = Depends(get_db_session),
-) -> list[Book]:
+) -> Response:
     """
     获取书架列表
 
@@ -68,22 +134,63 @@ async def list_books(
     - 支持按书名搜索
     - 支持按是否读完筛选
     - 支持按是否开始阅读筛选
+    - 支持服务端排序和键集分页：响应头 X-Total-Count 为筛选后的总数，
+      还有下一页时响应头 X-Next-Cursor 为下一页的游标
     - 返回书籍列表（前端可根据 chapter_index、chapter_offset、chapters 计算进度）
     """
-    statement = select(Book)
+    filters = []
     if starred is not None:
-        statement = statement.where(Book.is_starred == starred)
+        filters.append(Book.is_starred == starred)
     if search:
-        statement = statement.where(col(Book.title).contains(search))
+        filters.append(col(Book.title).contains(search))
     if finished is not None:
-        statement = statement.where(Book.is_finished == finished)
+        filters.append(Book.is_finished == finished)
     if started is not None:
         if started:
-            statement = statement.where(Book.chapter_index != None)  # noqa: E711
+            filters.append(Book.chapter_index != None)  # noqa: E711
         else:
-            statement = statement.where(Book.chapter_index == None)  # noqa: E711
-    books = session.exec(statement).all()
-    return list(books)
+            filters.append(Book.chapter_index == None)  # noqa: E711
+
+    columns = [col(getattr(Book, name)) for name in BookSummary.model_fields] if fields == 'lite' else [Book]
+    statement = select(*columns).where(*filters)
+    if cursor:
+        statement = statement.where(_keyset_condition(sort, order, *_decode_cursor(cursor, sort, order)))
+
+    sort_column = _SORT_COLUMNS[sort]
+    id_column = col(Book.id)
+    if order == 'asc':
+        statement = statement.order_by(sort_column.asc(), id_column.asc())
+    else:
+        statement = statement.order_by(sort_column.desc(), id_column.desc())
+    if limit is not None:
+        # 多取一条用于判断是否还有下一页
+        statement = statement.limit(limit + 1)
+
+    rows = session.exec(statement).all()
+    headers: dict[str, str] = {}
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if fields == 'lite':
+            last = last._mapping
+            headers['X-Next-Cursor'] = _encode_cursor(sort, order, last[sort], last['id'])
+        else:
+            headers['X-Next-Cursor'] = _encode_cursor(sort, order, getattr(last, sort), last.id)
+
+    if limit is None and cursor is None:
+        total = len(rows)
+    else:
+        total = session.exec(select(func.count()).select_from(Book).where(*filters)).one()
+    headers['X-Total-Count'] = str(total)
+
+    # 直接序列化为 JSON，避免 FastAPI 对大列表逐项校验返回值
+    if fields == 'lite':
+        body = _book_summary_list_adapter.dump_json(
+            _book_summary_list_adapter.validate_python([row._mapping for row in rows])
+        )
+    else:
+        body = _book_list_adapter.dump_json(list(rows))
+    return Response(body, media_type='application/json', headers=headers)
 
 
 @router.get('/random')
@@ -139,10 +246,9 @@ async def update_progress(
     book.chapter_offset = request.chapter_offset
     book.last_read_time = time.time()
 
-    # 加载章节数据并检查完成状态
-    chapters_stmt = select(Chapter).where(Chapter.book_id == book.id).order_by(Chapter.order_index)
-    chapters = list(session.exec(chapters_stmt).all())
-    book.is_finished = check_book_finished(book, chapters)
+    # 根据章节统计检查完成状态、计算阅读百分比（不读取章节内容）
+    book.is_finished = check_book_finished(book)
+    book.progress_percent = calculate_progress_percent(session, book)
 
     session.add(book)
     session.commit()
@@ -196,6 +302,7 @@ async def toggle_star(
 @router.post('/{book_id}/reparse')
 async def reparse_book_endpoint(
     book_id: int,
+    profile: bool = Query(False, description='剖析解析和写入过程（保存到 /api/system/profiles）'),
     session: Session = Depends(get_db_session),
 ) -> Book:
     """
@@ -207,7 +314,7 @@ async def reparse_book_endpoint(
     - 编码检测失败需要重新检测
     """
     try:
-        book = reparse_book_service(session, book_id, settings.books_dir)
+        book = reparse_book_service(session, book_id, settings.books_dir, profile)
         return book
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -228,7 +335,7 @@ async def delete_book(
 
     - physical=True: 物理删除书籍文件和所有数据库记录（书籍及章节）。
     - physical=False: 逻辑删除，仅重置书籍的阅读进度（chapter_index, chapter_offset,
-      is_finished, last_read_time），使其从“已开始阅读”状态中移除，但保留书籍记录和文件。
+      is_finished, progress_percent, last_read_time），使其从“已开始阅读”状态中移除，但保留书籍记录和文件。
     """
     book = session.get(Book, book_id)
     if not book:
@@ -239,6 +346,7 @@ async def delete_book(
         book.chapter_index = None
         book.chapter_offset = None
         book.is_finished = False
+        book.progress_percent = None
         book.last_read_time = None
         session.add(book)
         session.commit()
@@ -259,12 +367,8 @@ async def delete_book(
             # 文件删除失败（如被占用），此时不删除数据库记录
             raise HTTPException(status_code=500, detail=f'Error deleting file {file_path}: {e}')
 
-    # 2. 删除关联章节 (避免 IntegrityError)
-    chapters = session.exec(select(Chapter).where(Chapter.book_id == book.id)).all()
-    for chapter in chapters:
-        session.delete(chapter)
-
-    # 3. 删除书籍记录
-    session.delete(book)
+    # 2. 删除书籍记录、关联章节（避免 IntegrityError）和全文索引
+    delete_book_service(session, book)
     session.commit()
+    chapter_cache.invalidate_book(book_id)
     return MessageResponse(message='书籍已彻底删除')
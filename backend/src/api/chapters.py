@@ -1,68 +1,131 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import TypeAdapter
 from sqlmodel import Session, select
 
+from api.conditional import RANGE_UNITS, etag_matches, parse_range, range_unit
 from core.database import get_db_session
 from core.models import Book, Chapter
 from core.schemas import ChapterMetadata
+from services.body_store import SourceChangedError, read_chapter_body
+from services.cache import chapter_cache
 
 router = APIRouter()
 
+_chapter_list_adapter = TypeAdapter(list[ChapterMetadata])
+
+
+def _get_book_etag(session: Session, book_id: int) -> str:
+    """
+    获取书籍章节 ETag 的前缀（优先使用缓存，命中时不访问数据库）
+
+    由 hash_id 和解析时间组成：文件不变时重新解析（清洗配置或解析器变化）也可能改变章节内容
+    """
+    etag = chapter_cache.get_etag(book_id)
+    if etag is not None:
+        return etag
+
+    generation = chapter_cache.generation(book_id)
+    row = session.exec(select(Book.hash_id, Book.parsed_at).where(Book.id == book_id)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail='Book not found')
+    hash_id, parsed_at = row
+    etag = f'{hash_id}-{round(parsed_at * 1_000_000):x}'
+    chapter_cache.set_etag(book_id, etag, generation)
+    return etag
+
+
+def _cache_headers(etag: str) -> dict[str, str]:
+    return {
+        'ETag': etag,
+        # 允许客户端缓存，但每次使用前需要用 ETag 重新验证
+        'Cache-Control': 'private, no-cache',
+    }
+
 
 @router.get('/{book_id}/chapters', response_model=list[ChapterMetadata])
 async def list_chapters(
     book_id: int,
+    request: Request,
     session: Session = Depends(get_db_session),
-) -> list[ChapterMetadata]:
+) -> Response:
     """
     获取书籍的章节目录
 
 
     返回章节列表，包含标题和索引信息
+    序列化结果按书籍缓存，ETag 由书籍 hash_id 和解析时间生成，If-None-Match 命中时返回 304
     """
-    book = session.get(Book, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail='Book not found')
+    etag = _get_book_etag(session, book_id)
+    headers = _cache_headers(f'"{etag}-toc"')
+    if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=304, headers=headers)
 
-    statement = select(Chapter).where(Chapter.book_id == book_id).order_by(Chapter.order_index)
-    chapters = session.exec(statement).all()
-    return [
-        ChapterMetadata(
-            id=c.id,
-            book_id=c.book_id,
-            title=c.title,
-            order_index=c.order_index,
+    body = chapter_cache.get(book_id, 'toc')
+    if body is None:
+        generation = chapter_cache.generation(book_id)
+        statement = (
+            select(Chapter.id, Chapter.title, Chapter.order_index)
+            .where(Chapter.book_id == book_id)
+            .order_by(Chapter.order_index)
         )
-        for c in chapters
-    ]
+        chapters = [
+            ChapterMetadata(id=chapter_id, book_id=book_id, title=title, order_index=order_index)
+            for chapter_id, title, order_index in session.exec(statement)
+        ]
+        body = _chapter_list_adapter.dump_json(chapters)
+        chapter_cache.put(book_id, 'toc', body, generation)
+
+    return Response(body, media_type='application/json', headers=headers)
 
 
 @router.get('/{book_id}/chapters/{chapter_index}')
 async def get_chapter_content(
     book_id: int,
     chapter_index: int,
+    request: Request,
     session: Session = Depends(get_db_session),
-) -> PlainTextResponse:
+) -> Response:
     """
     获取特定章节的纯文本内容
 
-    直接从数据库读取章节内容
     返回纯文本格式，前端负责渲染
+    - ETag 由书籍 hash_id、解析时间和章节索引组成，If-None-Match 命中时返回 304（不读取正文）
+    - 支持单段 Range 请求：bytes（UTF-8 字节偏移）或 chars（字符偏移，可直接使用 chapter_offset 续读）
+    - 正文按书籍缓存，书籍被重新解析或删除时失效
     """
-    book = session.get(Book, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail='Book not found')
+    etag = _get_book_etag(session, book_id)
+    headers = _cache_headers(f'"{etag}-{chapter_index}"')
+    headers['Accept-Ranges'] = ', '.join(RANGE_UNITS)
+    if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=304, headers=headers)
 
-    # 查找章节
-    statement = select(Chapter).where(
-        Chapter.book_id == book_id,
-        Chapter.order_index == chapter_index,
-    )
-    chapter = session.exec(statement).first()
-    if not chapter:
-        raise HTTPException(
-            status_code=404, detail=f'Chapter not found: book_id={book_id}, chapter_index={chapter_index}'
-        )
+    body = chapter_cache.get(book_id, chapter_index)
+    if body is None:
+        generation = chapter_cache.generation(book_id)
+        try:
+            content = read_chapter_body(session, book_id, chapter_index)
+        except SourceChangedError as e:
+            # source 存储的原文件已变化，需要重新扫描
+            raise HTTPException(status_code=409, detail=str(e)) from None
+        if content is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f'Chapter not found: book_id={book_id}, chapter_index={chapter_index}',
+            )
+        body = content.encode()
+        chapter_cache.put(book_id, chapter_index, body, generation)
 
-    # 直接从数据库读取内容
-    return PlainTextResponse(chapter.content)
+    # chars 范围按字符切片，bytes 范围对 UTF-8 编码结果切片（Response 负责编码并设置 Content-Length）
+    range_header = request.headers.get('range')
+    data: str | bytes = body.decode() if range_unit(range_header) == 'chars' else body
+    content_range = parse_range(range_header, request.headers.get('if-range'), headers['ETag'], len(data))
+    if content_range is None:
+        return Response(body, media_type='text/plain', headers=headers)
+
+    headers['Content-Range'] = content_range.header(len(data))
+    return Response(
+        data[content_range.start : content_range.end],
+        status_code=206,
+        media_type='text/plain',
+        headers=headers,
+    )
@@ -0,0 +1,90 @@
+"""
+条件请求与范围请求（ETag / If-None-Match / Range / If-Range）的解析工具
+"""
+
+from typing import NamedTuple
+
+from fastapi import HTTPException, status
+
+# 支持的范围单位：bytes 为 UTF-8 编码后的字节偏移，chars 为字符偏移（与阅读进度 chapter_offset 一致）
+RANGE_UNITS = ('bytes', 'chars')
+
+
+class ContentRange(NamedTuple):
+    """请求的内容范围 [start, end)"""
+
+    unit: str
+    start: int
+    end: int
+
+    def header(self, total: int) -> str:
+        """Content-Range 响应头（结束位置为闭区间）"""
+        return f'{self.unit} {self.start}-{self.end - 1}/{total}'
+
+
+def _parse_etags(header: str) -> list[str]:
+    """解析 If-None-Match 中的 ETag 列表（弱 ETag 去掉 W/ 前缀）"""
+    etags = [item.strip() for item in header.split(',')]
+    return [etag.removeprefix('W/') for etag in etags if etag]
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match 是否命中当前 ETag（弱比较）"""
+    if not if_none_match:
+        return False
+    etags = _parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+
+def range_unit(range_header: str | None) -> str | None:
+    """返回 Range 请求头的单位，不支持的单位返回 None"""
+    if not range_header or '=' not in range_header:
+        return None
+    unit = range_header.split('=', 1)[0].strip().lower()
+    return unit if unit in RANGE_UNITS else None
+
+
+def parse_range(range_header: str | None, if_range: str | None, etag: str, total: int) -> ContentRange | None:
+    """
+    解析单段 Range 请求头
+
+    支持 `unit=start-end`、`unit=start-`、`unit=-suffix` 三种形式。
+    格式错误、多段范围、不支持的单位或 If-Range 与当前 ETag 不一致时返回 None（按完整内容响应），
+    范围无法满足时抛出 416。
+    """
+    unit = range_unit(range_header)
+    if unit is None or range_header is None:
+        return None
+    # If-Range 只接受强 ETag；不一致说明客户端缓存的是旧内容，返回完整内容
+    if if_range is not None and if_range.strip() != etag:
+        return None
+
+    spec = range_header.split('=', 1)[1].strip()
+    if ',' in spec or '-' not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split('-', 1))
+    if not (first.isdigit() or first == '') or not (last.isdigit() or last == '') or first == last == '':
+        return None
+
+    if first == '':
+        # 后缀范围：最后 N 个单位
+        suffix = int(last)
+        if suffix == 0 or total == 0:
+            raise _range_not_satisfiable(unit, total)
+        return ContentRange(unit, max(total - suffix, 0), total)
+
+    start = int(first)
+    end = total if last == '' else min(int(last) + 1, total)
+    if last != '' and int(last) < start:
+        return None
+    if start >= total:
+        raise _range_not_satisfiable(unit, total)
+    return ContentRange(unit, start, end)
+
+
+def _range_not_satisfiable(unit: str, total: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+        detail='Range not satisfiable',
+        headers={'Content-Range': f'{unit} */{total}'},
+    )
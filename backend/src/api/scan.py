@@ -1,30 +1,25 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi import APIRouter, HTTPException
 from loguru import logger
 from sqlmodel import delete
 
 from core.database import get_session
 from core.models import Book, Chapter
 from core.schemas import MessageResponse, ScanResponse
-from services.scanner import ScanStatus, get_scan_status, scan_directory, stop_scan
+from services.body_store import clear_chapter_bodies
+from services.cache import chapter_cache
+from services.scanner import ScanStatus, get_scan_status, start_scan, stop_scan
+from services.search import clear_index
 
 router = APIRouter()
 
 
-async def scan_task(full_scan: bool) -> None:
-    """后台扫描任务"""
-    with get_session() as session:
-        await scan_directory(session, full_scan=full_scan)
-
-
 @router.post('')
-async def trigger_scan(
-    background_tasks: BackgroundTasks,
-    full_scan: bool = False,
-) -> ScanResponse:
+async def trigger_scan(full_scan: bool = False, profile: bool = False) -> ScanResponse:
     """
     手动触发目录扫描
 
     - full_scan: 是否执行全量扫描（默认增量扫描）
+    - profile: 是否剖析每本书的解析和写入（耗时不少于 PROFILE_MIN_SECONDS 的书籍保存到 /api/system/profiles）
 
     扫描逻辑：
     1. 遍历指定目录下的所有 TXT 文件
@@ -32,14 +27,11 @@ async def trigger_scan(
     3. 对于已存在文件：检查 file_size 和 file_mtime，如果变更则重新解析
     4. 对于已删除文件：从数据库中移除
 
-    注意：扫描在后台异步执行，可通过 GET /api/scan/status 查询进度
+    注意：扫描在独立的工作线程中执行（不阻塞其他请求），可通过 GET /api/scan/status 查询进度
     """
-    status = get_scan_status()
-    if status.is_running:
-        raise HTTPException(status_code=409, detail='扫描任务已在运行中')
     logger.info('Starting scan...')
-    # 启动后台任务
-    background_tasks.add_task(scan_task, full_scan)
+    if not start_scan(full_scan, profile):
+        raise HTTPException(status_code=409, detail='扫描任务已在运行中')
 
     return ScanResponse(
         message='扫描任务已启动',
@@ -81,8 +73,11 @@ async def clear_database() -> MessageResponse:
         raise HTTPException(status_code=409, detail='扫描正在运行中，无法清空数据库')
 
     with get_session() as session:
+        clear_chapter_bodies(session)
         session.exec(delete(Chapter))
         session.exec(delete(Book))
+        clear_index(session)
         session.commit()
+    chapter_cache.clear()
 
     return MessageResponse(message='数据库已清空')
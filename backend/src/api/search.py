@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+
+from core.database import get_db_session
+from core.schemas import SearchResponse
+from services.search import search_books, search_chapters
+
+router = APIRouter()
+
+
+# 普通函数：FastAPI 在线程池中执行，读取正文（解压或读取原文件）时不阻塞事件循环
+@router.get('')
+def search(
+    q: str = Query(..., min_length=1, description='搜索内容'),
+    book_id: int | None = Query(None, description='只在指定书籍内搜索章节'),
+    limit: int = Query(20, ge=1, le=100, description='书名和章节各自返回的最大数量'),
+    session: Session = Depends(get_db_session),
+) -> SearchResponse:
+    """
+    全文搜索书名、章节标题和章节正文
+
+    - 不少于 3 个字符的查询使用 FTS5 trigram 索引，按相关度排序
+    - 更短的查询只搜索章节标题；指定书籍时逐章读取该书的正文，按章节顺序返回
+    - 未建立正文索引（FULLTEXT_INDEX=false）时只搜索章节标题
+    - 章节结果包含摘要和 (book_id, order_index, offset)，可直接跳转到命中位置
+    """
+    query = q.strip()
+    if not query:
+        return SearchResponse(books=[], chapters=[])
+    books = search_books(session, query, limit) if book_id is None else []
+    chapters = search_chapters(session, query, limit, book_id)
+    return SearchResponse(books=books, chapters=chapters)
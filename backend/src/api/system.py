@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
 from pydantic import BaseModel
 
+from api.deps import check_auth
 from core.config import settings
+from core.metrics import metrics
 from core.security import create_access_token
+from services.profiler import ProfileInfo, format_profile, get_profile_path, list_profiles
 
 router = APIRouter()
 
@@ -43,3 +49,46 @@ async def health() -> dict[str, str]:
 @router.get('/version')
 async def version() -> dict[str, str]:
     return {'app_version': settings.app_version, 'database_version': settings.database_version}
+
+
+@router.get('/metrics', dependencies=[Depends(check_auth)], response_model=None)
+async def get_metrics(
+    output: Literal['json', 'prometheus'] = Query(
+        'json', alias='format', description='返回格式：json / prometheus（文本格式）'
+    ),
+) -> dict[str, Any] | PlainTextResponse:
+    """
+    性能指标（需要登录）
+
+    - stages：解析各阶段的耗时
+    - routes：每个路由的请求延迟、错误数，以及请求期间的数据库查询次数和耗时
+    - db_queries：各类数据库查询的耗时
+    - scan：扫描吞吐量（文件数/秒、MB/秒）
+    """
+    if output == 'prometheus':
+        return PlainTextResponse(metrics.prometheus(), media_type='text/plain; version=0.0.4')
+    return metrics.snapshot()
+
+
+@router.get('/profiles', dependencies=[Depends(check_auth)])
+async def get_profiles() -> list[ProfileInfo]:
+    """已保存的剖析文件（需要登录），最新的在前"""
+    return list_profiles()
+
+
+@router.get('/profiles/{name}', dependencies=[Depends(check_auth)], response_model=None)
+async def download_profile(
+    name: str,
+    output: Literal['prof', 'text'] = Query(
+        'prof', alias='format', description='返回格式：prof（pstats 文件）/ text（文本摘要）'
+    ),
+    sort: Literal['cumulative', 'tottime', 'calls'] = Query('cumulative', description='文本摘要的排序方式'),
+    limit: int = Query(50, ge=1, le=500, description='文本摘要的函数数量'),
+) -> FileResponse | PlainTextResponse:
+    """下载剖析文件（需要登录），可用 pstats / snakeviz 查看"""
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail='Profile not found')
+    if output == 'text':
+        return PlainTextResponse(format_profile(path, sort, limit))
+    return FileResponse(path, media_type='application/octet-stream', filename=name)
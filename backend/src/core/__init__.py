@@ -1,10 +1,11 @@
 from .config import Settings, settings
 from .database import engine, get_db_session, get_session, init_db
-from .models import Book, Chapter
+from .models import Book, Chapter, ChapterBody
 
 __all__ = [
     'Book',
     'Chapter',
+    'ChapterBody',
     'Settings',
     'settings',
     'engine',
@@ -1,7 +1,8 @@
+import os
 import secrets
 import tomllib
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -97,6 +98,138 @@ class Settings(BaseSettings):
         description='JWT 签名密钥。如果未设置，则每次启动随机生成密钥，重启后所有旧 Token 失效（强制下线）。',
     )
 
+    # 数据库配置
+    db_profile: Literal['performance', 'safe', 'off'] = Field(
+        default='performance',
+        description=(
+            'SQLite 性能配置：performance（WAL + synchronous=NORMAL + 大缓存 + mmap）/ '
+            'safe（WAL + synchronous=FULL）/ off（不设置 PRAGMA，SQLite 默认行为）'
+        ),
+    )
+
+    db_busy_timeout_ms: int = Field(
+        default=5000,
+        description='数据库被其他连接锁定时的等待时间（毫秒）',
+    )
+
+    db_pool_size: int = Field(
+        default=8,
+        description='数据库连接池大小（WAL 模式下多个读连接可以与一个写连接并发）',
+    )
+
+    # 扫描配置
+    scan_workers: int = Field(
+        default=0,
+        description='扫描时用于解析书籍的进程数。0 表示使用全部可用 CPU 核心。',
+    )
+
+    scan_commit_batch_size: int = Field(
+        default=50,
+        description='扫描时每写入多少本书提交一次（批量提交减少事务和 fsync 次数）',
+    )
+
+    scan_commit_interval: float = Field(
+        default=1.0,
+        description='扫描时写事务最长保持的秒数，超过后立即提交（限制扫描占用写锁的时间）',
+    )
+
+    watch_books_dir: bool = Field(
+        default=False,
+        description='是否监视书籍目录，自动导入新增、修改、移动（保留阅读进度）和删除的 TXT 文件',
+    )
+
+    watch_force_polling: bool = Field(
+        default=False,
+        description='监视书籍目录时强制使用轮询（NAS 等不支持 inotify 的挂载目录）',
+    )
+
+    watch_poll_interval: float = Field(
+        default=10.0,
+        description='轮询书籍目录的间隔（秒），每次只比较文件的大小和修改时间',
+    )
+
+    watch_debounce: float = Field(
+        default=2.0,
+        description='文件最后一次变化后等待的秒数，之后才导入（避免导入复制到一半的文件）',
+    )
+
+    streaming_parser: bool = Field(
+        default=True,
+        description='是否使用流式解析（分块读取和清洗，内存占用与最长章节成正比，而不是整个文件）',
+    )
+
+    # 解析配置
+    t2s_engine: Literal['fast', 'opencc', 'none'] = Field(
+        default='fast',
+        description='繁体转简体引擎：fast（预编译最长匹配，结果与 opencc 一致）/ opencc / none（不转换）',
+    )
+
+    clean_html: bool = Field(
+        default=True,
+        description='解析时是否去除 HTML 标签和解码字符引用（书库中没有网页抓取的文本时可以关闭）',
+    )
+
+    clean_full_width: bool = Field(
+        default=True,
+        description='解析时是否将全角数字、字母和引号转为半角',
+    )
+
+    clean_line_breaks: bool = Field(
+        default=True,
+        description='解析时是否合并多余换行并恢复被拆分的句子。关闭后每个非空行为一段',
+    )
+
+    encoding_detect_budget: int = Field(
+        default=32 * 1024,
+        description='编码检测最多读取的字节数（BOM 和严格 UTF-8 检测失败后才使用 chardet）',
+    )
+
+    # 搜索配置
+    fulltext_index: bool = Field(
+        default=True,
+        description=(
+            '是否为章节正文建立 FTS5 全文索引。索引不保存正文副本，'
+            '但 trigram 索引本身的体积仍约为正文的数倍，并会拖慢扫描；'
+            '关闭后只能搜索书名和章节标题（重新开启后启动时自动回填索引）。'
+        ),
+    )
+
+    # 章节正文存储
+    chapter_body_store: Literal['table', 'segment', 'source'] = Field(
+        default='table',
+        description=(
+            '新写入的章节正文的存储方式：table（数据库中的 chapter_body 表，zlib 压缩）/ '
+            'segment（数据目录下每本书一个 zlib 压缩的段文件，数据库只保存偏移）/ '
+            'source（index-only 导入：不保存正文，只记录每章在原文件中的字节范围，阅读时从原文件解析）。'
+            '已有书籍在重新解析前保持原来的存储。'
+        ),
+    )
+
+    # 缓存配置
+    chapter_cache_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        description='章节目录和章节内容响应缓存的最大字节数。0 表示不缓存。',
+    )
+
+    # 性能指标和剖析
+    metrics_enabled: bool = Field(
+        default=True,
+        description=(
+            '是否记录性能指标（解析各阶段耗时、路由延迟、数据库查询和扫描吞吐量），'
+            '通过 /api/system/metrics 查看'
+        ),
+    )
+
+    profile_min_seconds: float = Field(
+        default=0.5,
+        description='剖析扫描（POST /api/scan?profile=true）时只保存解析和写入总耗时不少于该秒数的书籍',
+    )
+
+    profile_max_files: int = Field(
+        default=100,
+        description='最多保留的剖析文件数，超出时删除最旧的文件',
+    )
+
     def __init__(self, **kwargs: dict[str, Any]):
         super().__init__(**kwargs)
         # 确保路径是绝对路径
@@ -119,11 +252,28 @@ class Settings(BaseSettings):
         """数据库文件路径（自动基于 data_dir 计算）"""
         return self.data_dir / 'database.db'
 
+    @property
+    def chapter_bodies_dir(self) -> Path:
+        """segment 存储的段文件目录（自动基于 data_dir 计算）"""
+        return self.data_dir / 'chapter_bodies'
+
+    @property
+    def profiles_dir(self) -> Path:
+        """剖析文件目录（自动基于 data_dir 计算）"""
+        return self.data_dir / 'profiles'
+
     @property
     def database_url(self) -> str:
         """返回 SQLite 数据库连接 URL"""
         return f'sqlite:///{self.database_path}'
 
+    @property
+    def scan_worker_count(self) -> int:
+        """实际使用的扫描进程数"""
+        if self.scan_workers > 0:
+            return self.scan_workers
+        return os.process_cpu_count() or 1
+
     @property
     def is_production(self) -> bool:
         """是否为生产环境"""
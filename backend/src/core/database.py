@@ -1,24 +1,239 @@
 from contextlib import contextmanager
 from typing import Generator
 
+from loguru import logger
+from sqlalchemy import Column, Engine, event, inspect, text
 from sqlmodel import Session, SQLModel
 from sqlmodel import create_engine as create_sqlmodel_engine
 
 from .config import settings
+from .metrics import instrument_engine
+
+# SQLite 性能配置（每个连接建立时执行的 PRAGMA）
+# - journal_mode=WAL：读写互不阻塞，扫描写入期间仍可读取章节
+# - synchronous=NORMAL：WAL 模式下只在检查点时 fsync，断电可能丢失最近的事务，但不会损坏数据库
+# - cache_size 为负数时单位为 KiB；mmap_size 单位为字节
+DB_PROFILES: dict[str, dict[str, str | int]] = {
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64 * 1024,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+    },
+    'off': {},
+}
+
+
+def create_db_engine(database_url: str, profile: str = 'off') -> Engine:
+    """
+    创建数据库引擎
+
+    SQLite 连接会在建立时执行 profile 对应的 PRAGMA 和 busy_timeout
+    """
+    if not database_url.startswith('sqlite'):
+        return create_sqlmodel_engine(database_url, echo=False)
+
+    db_engine = create_sqlmodel_engine(
+        database_url,
+        # SQLite 需要 check_same_thread=False 以支持多线程
+        connect_args={'check_same_thread': False},
+        # 读请求各自占用一个连接，写入由 SQLite 的写锁串行化（busy_timeout 内等待）
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_pool_size,
+        echo=False,  # 设置为 True 可以打印 SQL 语句（调试用）
+    )
+    pragmas = {**DB_PROFILES[profile]}
+    if profile != 'off':
+        pragmas['busy_timeout'] = settings.db_busy_timeout_ms
+
+    @event.listens_for(db_engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return db_engine
+
 
 # 创建数据库引擎
-# SQLite 需要 check_same_thread=False 以支持多线程
-# 使用 connect_args 配置 SQLite 连接参数
-engine = create_sqlmodel_engine(
-    settings.database_url,
-    connect_args={'check_same_thread': False} if 'sqlite' in settings.database_url else {},
-    echo=False,  # 设置为 True 可以打印 SQL 语句（调试用）
-)
+engine = create_db_engine(settings.database_url, settings.db_profile)
+if settings.metrics_enabled:
+    instrument_engine(engine)
+
+
+# FTS5 全文索引（trigram 分词，支持中文任意子串匹配）
+# rowid 分别与 book.id / chapter.id 一致，由 services.search 维护
+# chapter_fts 是无内容表（content=''）：只保存索引，不保存一份未压缩的正文，
+# 章节信息从 chapter 表读取，摘要从正文存储读取；contentless_delete 需要 SQLite 3.43 以上
+FTS_TABLES = {
+    'book_fts': "CREATE VIRTUAL TABLE book_fts USING fts5(title, tokenize='trigram')",
+    'chapter_fts': (
+        "CREATE VIRTUAL TABLE chapter_fts USING fts5(title, content, content='', contentless_delete=1, "
+        "tokenize='trigram')"
+    ),
+}
+
+# 新建全文索引时，从已有数据回填
+# 章节正文不在 chapter 表中，chapter_fts 由 services.search.ensure_chapter_index 从正文存储回填
+FTS_BACKFILL = {
+    'book_fts': 'INSERT INTO book_fts (rowid, title) SELECT id, title FROM book',
+}
+
+
+def create_fts_tables(db_engine: Engine) -> None:
+    """
+    创建缺失的全文索引表，并回填书名索引
+
+    定义已变化的表（如旧版本保存正文的 chapter_fts）删除后重建，并 VACUUM 回收空间
+    """
+    rebuilt = False
+    with db_engine.begin() as connection:
+        existing = dict(
+            connection.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'table'")).all()
+        )
+        for name, ddl in FTS_TABLES.items():
+            if existing.get(name) == ddl:
+                continue
+            if name in existing:
+                logger.info(f'Rebuilding full-text index: {name}')
+                connection.execute(text(f'DROP TABLE {name}'))
+                rebuilt = True
+            else:
+                logger.info(f'Creating full-text index: {name}')
+            connection.execute(text(ddl))
+            if name in FTS_BACKFILL:
+                connection.execute(text(FTS_BACKFILL[name]))
+
+    if rebuilt:
+        # VACUUM 不能在事务中执行
+        with db_engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+
+
+# 新增统计列后，从已有章节内容回填（按顺序执行）
+# 添加统计列的旧版数据库中，章节内容仍在 chapter.content 列（之后才移入正文存储）
+CHAPTER_STATS_COLUMNS = {
+    'chapter.char_count',
+    'chapter.char_offset',
+    'book.chapter_count',
+    'book.total_chars',
+    'book.last_chapter_length',
+    'book.progress_percent',
+}
+CHAPTER_STATS_BACKFILL = [
+    'UPDATE chapter SET char_count = length(content)',
+    (
+        'UPDATE chapter SET char_offset = s.char_offset FROM ('
+        '  SELECT id, SUM(char_count) OVER (PARTITION BY book_id ORDER BY order_index) - char_count'
+        '  AS char_offset FROM chapter'
+        ') AS s WHERE chapter.id = s.id'
+    ),
+    (
+        'UPDATE book SET chapter_count = s.chapter_count, total_chars = s.total_chars FROM ('
+        '  SELECT book_id, COUNT(*) AS chapter_count, SUM(char_count) AS total_chars'
+        '  FROM chapter GROUP BY book_id'
+        ') AS s WHERE book.id = s.book_id'
+    ),
+    (
+        'UPDATE book SET last_chapter_length = c.char_count FROM chapter AS c '
+        'WHERE c.book_id = book.id AND c.order_index = book.chapter_count - 1'
+    ),
+    (
+        'UPDATE book SET progress_percent = '
+        'round(min(100.0, (c.char_offset + coalesce(book.chapter_offset, 0)) * 100.0 / book.total_chars), 2) '
+        'FROM chapter AS c '
+        'WHERE c.book_id = book.id AND c.order_index = book.chapter_index AND book.total_chars > 0'
+    ),
+]
+
+
+def _column_default_sql(column: Column) -> str:
+    """新增列的 DEFAULT 子句（仅支持标量默认值）"""
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is None:
+        return ''
+    if isinstance(default, bool):
+        default = int(default)
+    if isinstance(default, str):
+        default = "'" + default.replace("'", "''") + "'"
+    return f' NOT NULL DEFAULT {default}'
+
+
+def migrate_columns(db_engine: Engine) -> set[str]:
+    """
+    轻量级迁移：为已有的表补充模型中新增的列（ALTER TABLE ADD COLUMN）
+
+    返回新增的列（table.column）
+    """
+    inspector = inspect(db_engine)
+    added: set[str] = set()
+    with db_engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db_engine.dialect)
+                logger.info(f'Adding column: {table.name}.{column.name}')
+                connection.execute(
+                    text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                        f'{_column_default_sql(column)}'
+                    )
+                )
+                added.add(f'{table.name}.{column.name}')
+
+        if added & CHAPTER_STATS_COLUMNS:
+            logger.info('Backfilling chapter statistics')
+            for statement in CHAPTER_STATS_BACKFILL:
+                connection.execute(text(statement))
+    return added
+
+
+def _delete_orphan_chapters(db_engine: Engine) -> None:
+    """删除所属书籍已不存在的章节（旧版本删除书籍时不删除章节），以便创建唯一索引"""
+    orphans = 'SELECT id FROM chapter WHERE book_id NOT IN (SELECT id FROM book)'
+    existing = set(inspect(db_engine).get_table_names())
+    with db_engine.begin() as connection:
+        if 'chapter_fts' in existing:
+            connection.execute(text(f'DELETE FROM chapter_fts WHERE rowid IN ({orphans})'))
+        if 'chapter_body' in existing:
+            connection.execute(text(f'DELETE FROM chapter_body WHERE chapter_id IN ({orphans})'))
+        deleted = connection.execute(text(f'DELETE FROM chapter WHERE id IN ({orphans})')).rowcount
+    if deleted:
+        logger.info(f'Deleted {deleted} orphan chapters')
+
+
+def create_indexes(db_engine: Engine) -> None:
+    """为已有的表创建模型中新增的索引"""
+    inspector = inspect(db_engine)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if table.name == 'chapter' and index.unique:
+                _delete_orphan_chapters(db_engine)
+            logger.info(f'Creating index: {index.name}')
+            index.create(db_engine, checkfirst=True)
 
 
 def init_db() -> None:
-    """初始化数据库，创建所有表"""
+    """初始化数据库，创建所有表，并迁移已有的表"""
     SQLModel.metadata.create_all(engine)
+    migrate_columns(engine)
+    create_indexes(engine)
+    create_fts_tables(engine)
 
 
 @contextmanager
@@ -0,0 +1,407 @@
+"""
+进程内的性能指标（METRICS_ENABLED 控制，默认开启）
+
+- 解析各阶段的耗时：detect_encoding / decode / clean_html / translate / t2s / line_breaks /
+  classify_titles / db_write（按块或按书记录，不按行记录）
+- 每个路由的请求延迟，以及请求期间的数据库查询次数和耗时（SQLAlchemy 事件）
+- 各类数据库查询（SELECT / INSERT / UPDATE / DELETE / OTHER）的耗时
+- 扫描吞吐量：文件数、解析的字节数和耗时
+
+耗时按固定的桶累计（不保存样本），每次记录只有一次二分查找和几次加法，可以在生产环境中一直开启。
+解析在进程池中执行时，子进程记录的阶段耗时随解析结果传回主进程合并（pop_stages / merge_stages）。
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any
+
+from sqlalchemy import Engine, event
+
+from .config import settings
+
+# 耗时直方图的桶上限（秒），最后一个桶为 +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_KINDS = frozenset({'SELECT', 'INSERT', 'UPDATE', 'DELETE'})
+
+# (桶计数, 总耗时, 最大耗时)，可跨进程传递
+HistogramData = tuple[list[int], float, float]
+
+
+class Histogram:
+    """耗时直方图（调用方持有锁）"""
+
+    __slots__ = ('counts', 'sum', 'max')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.max = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, data: HistogramData) -> None:
+        counts, total, maximum = data
+        self.counts = [a + b for a, b in zip(self.counts, counts, strict=True)]
+        self.sum += total
+        self.max = max(self.max, maximum)
+
+    def data(self) -> HistogramData:
+        return list(self.counts), self.sum, self.max
+
+    def quantile(self, q: float) -> float:
+        """按桶估计分位数（所在桶的上限，+Inf 桶为最大值）"""
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts, strict=False):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        count = self.count
+        return {
+            'count': count,
+            'sum': self.sum,
+            'mean': self.sum / count if count else 0.0,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+class RouteStats:
+    """单个路由的请求延迟和请求期间的数据库查询"""
+
+    __slots__ = ('latency', 'db_queries', 'db_seconds', 'errors')
+
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.errors = 0  # 状态码 >= 500 或未处理的异常
+
+
+class ScanStats:
+    """扫描吞吐量（累计值和最近一次扫描）"""
+
+    __slots__ = ('scans', 'files', 'parsed_files', 'parsed_bytes', 'seconds', 'last')
+
+    def __init__(self) -> None:
+        self.scans = 0
+        self.files = 0
+        self.parsed_files = 0
+        self.parsed_bytes = 0
+        self.seconds = 0.0
+        self.last: dict[str, float] | None = None
+
+
+class _RequestQueries:
+    """当前请求中的数据库查询次数和耗时"""
+
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+
+
+_request_queries: ContextVar[_RequestQueries | None] = ContextVar('request_queries', default=None)
+
+
+class Metrics:
+    """指标注册表（线程安全）"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.stages: dict[str, Histogram] = {}
+        self.routes: dict[tuple[str, str], RouteStats] = {}
+        self.queries: dict[str, Histogram] = {}
+        self.scan = ScanStats()
+        # 当前进程是否为解析进程池的子进程（见 mark_worker_process）
+        self.worker_process = False
+
+    @property
+    def enabled(self) -> bool:
+        return settings.metrics_enabled
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def pop_stages(self) -> dict[str, HistogramData]:
+        """取出并清空阶段耗时（在解析子进程中调用，结果传回主进程）"""
+        with self._lock:
+            stages = {stage: histogram.data() for stage, histogram in self.stages.items()}
+            self.stages.clear()
+        return stages
+
+    def merge_stages(self, stages: dict[str, HistogramData]) -> None:
+        with self._lock:
+            for stage, data in stages.items():
+                histogram = self.stages.get(stage)
+                if histogram is None:
+                    histogram = self.stages[stage] = Histogram()
+                histogram.merge(data)
+
+    def observe_query(self, statement: str, seconds: float) -> None:
+        kind = statement.lstrip()[:6].upper()
+        if kind not in QUERY_KINDS:
+            kind = 'OTHER'
+        with self._lock:
+            histogram = self.queries.get(kind)
+            if histogram is None:
+                histogram = self.queries[kind] = Histogram()
+            histogram.observe(seconds)
+        request = _request_queries.get()
+        if request is not None:
+            request.count += 1
+            request.seconds += seconds
+
+    def observe_request(
+        self, method: str, route: str, seconds: float, queries: _RequestQueries, error: bool
+    ) -> None:
+        with self._lock:
+            stats = self.routes.get((method, route))
+            if stats is None:
+                stats = self.routes[(method, route)] = RouteStats()
+            stats.latency.observe(seconds)
+            stats.db_queries += queries.count
+            stats.db_seconds += queries.seconds
+            if error:
+                stats.errors += 1
+
+    def record_scan(self, files: int, parsed_files: int, parsed_bytes: int, seconds: float) -> None:
+        if not self.enabled:
+            return
+        last = {
+            'files': files,
+            'parsed_files': parsed_files,
+            'parsed_bytes': parsed_bytes,
+            'seconds': seconds,
+            'files_per_second': files / seconds if seconds else 0.0,
+            'mb_per_second': parsed_bytes / 1024 / 1024 / seconds if seconds else 0.0,
+        }
+        with self._lock:
+            scan = self.scan
+            scan.scans += 1
+            scan.files += files
+            scan.parsed_files += parsed_files
+            scan.parsed_bytes += parsed_bytes
+            scan.seconds += seconds
+            scan.last = last
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.stages.clear()
+            self.routes.clear()
+            self.queries.clear()
+            self.scan = ScanStats()
+
+    def snapshot(self) -> dict[str, Any]:
+        """JSON 格式的指标（耗时单位为秒）"""
+        with self._lock:
+            scan = self.scan
+            return {
+                'enabled': self.enabled,
+                'uptime_seconds': time.time() - self.started,
+                'stages': {stage: histogram.summary() for stage, histogram in sorted(self.stages.items())},
+                'routes': {
+                    f'{method} {route}': {
+                        **stats.latency.summary(),
+                        'errors': stats.errors,
+                        'db_queries': stats.db_queries,
+                        'db_seconds': stats.db_seconds,
+                    }
+                    for (method, route), stats in sorted(self.routes.items())
+                },
+                'db_queries': {kind: histogram.summary() for kind, histogram in sorted(self.queries.items())},
+                'scan': {
+                    'scans': scan.scans,
+                    'files': scan.files,
+                    'parsed_files': scan.parsed_files,
+                    'parsed_bytes': scan.parsed_bytes,
+                    'seconds': scan.seconds,
+                    'files_per_second': scan.files / scan.seconds if scan.seconds else 0.0,
+                    'mb_per_second': scan.parsed_bytes / 1024 / 1024 / scan.seconds if scan.seconds else 0.0,
+                    'last': scan.last,
+                },
+            }
+
+    def prometheus(self) -> str:
+        """Prometheus 文本格式的指标"""
+        lines: list[str] = []
+
+        def histogram_family(name: str, help_text: str, items: list[tuple[str, Histogram]]) -> None:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram in items:
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, '+Inf'), histogram.counts, strict=True):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'{name}_count{{{labels}}} {cumulative}')
+
+        def counter(name: str, help_text: str, items: list[tuple[str, float]]) -> None:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in items:
+                lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+
+        with self._lock:
+            route_labels = [
+                (f'method="{method}",route="{route}"', stats)
+                for (method, route), stats in sorted(self.routes.items())
+            ]
+            histogram_family(
+                'glean_parser_stage_seconds',
+                'Time spent in each parser stage.',
+                [(f'stage="{stage}"', histogram) for stage, histogram in sorted(self.stages.items())],
+            )
+            histogram_family(
+                'glean_http_request_seconds',
+                'HTTP request latency by route.',
+                [(labels, stats.latency) for labels, stats in route_labels],
+            )
+            counter(
+                'glean_http_request_errors_total',
+                'HTTP requests that failed with a server error.',
+                [(labels, stats.errors) for labels, stats in route_labels],
+            )
+            counter(
+                'glean_http_request_db_queries_total',
+                'Database queries executed while handling requests.',
+                [(labels, stats.db_queries) for labels, stats in route_labels],
+            )
+            counter(
+                'glean_http_request_db_seconds_total',
+                'Time spent in database queries while handling requests.',
+                [(labels, stats.db_seconds) for labels, stats in route_labels],
+            )
+            histogram_family(
+                'glean_db_query_seconds',
+                'Database query latency by statement kind.',
+                [(f'kind="{kind}"', histogram) for kind, histogram in sorted(self.queries.items())],
+            )
+            scan = self.scan
+            counter('glean_scan_total', 'Completed scans.', [('', scan.scans)])
+            counter('glean_scan_files_total', 'Files visited by scans.', [('', scan.files)])
+            counter('glean_scan_parsed_files_total', 'Files parsed by scans.', [('', scan.parsed_files)])
+            counter('glean_scan_parsed_bytes_total', 'Bytes parsed by scans.', [('', scan.parsed_bytes)])
+            counter('glean_scan_seconds_total', 'Time spent scanning.', [('', scan.seconds)])
+        return '\n'.join(lines) + '\n'
+
+
+# 全局指标实例
+metrics = Metrics()
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """记录代码块的耗时到解析阶段 stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe_stage(stage, time.perf_counter() - start)
+
+
+def timed_stage[**P, R](stage: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """记录函数的耗时到解析阶段 stage"""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe_stage(stage, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def mark_worker_process() -> None:
+    """
+    标记当前进程为解析进程池的子进程（作为进程池的 initializer）
+
+    不能用 multiprocessing.parent_process() 判断：uvicorn 的 --workers / --reload 子进程也有父进程
+    """
+    metrics.worker_process = True
+
+
+def in_worker_process() -> bool:
+    """是否在解析进程池的子进程中（记录的指标需要传回主进程）"""
+    return metrics.worker_process
+
+
+def instrument_engine(db_engine: Engine) -> None:
+    """通过 SQLAlchemy 事件记录每条查询的耗时"""
+
+    @event.listens_for(db_engine, 'before_cursor_execute')
+    def _before_cursor_execute(_conn, _cursor, _statement, _parameters, context, _executemany) -> None:
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(db_engine, 'after_cursor_execute')
+    def _after_cursor_execute(_conn, _cursor, statement, _parameters, context, _executemany) -> None:
+        start = getattr(context, '_metrics_start', None)
+        if start is not None:
+            metrics.observe_query(statement, time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """记录每个请求的延迟和请求期间的数据库查询（纯 ASGI 中间件，不缓冲响应）"""
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        queries = _RequestQueries()
+        token = _request_queries.set(queries)
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            # 路由匹配后 FastAPI 在 scope 中记录路由，按路径模板统计（避免路径参数导致标签过多）
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            metrics.observe_request(
+                scope['method'], path, time.perf_counter() - start, queries, error=status >= 500
+            )
@@ -1,15 +1,16 @@
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 
-__version__ = 'v1'
+__version__ = 'v5'
 
 
 class Book(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     hash_id: str = Field(index=True, unique=True)  # 文件内容哈希
     title: str
-    path: str  # 相对于 books_dir 的路径
+    path: str = Field(index=True)  # 相对于 books_dir 的路径
     is_starred: bool = Field(default=False)
-    last_read_time: float | None = None
+    last_read_time: float | None = Field(default=None, index=True)
 
     # 文件元数据（用于增量扫描）
     file_size: int  # 文件大小（字节）
@@ -19,16 +20,46 @@ class Book(SQLModel, table=True):
     chapter_index: int | None = None  # 当前阅读的章节索引（对应 Chapter.order_index）
     chapter_offset: int | None = None  # 在章节内的字符偏移量（用于恢复阅读位置）
     is_finished: bool = Field(default=False)  # 是否已读完
+    progress_percent: float | None = None  # 阅读百分比（0-100，按字符计算，同步进度时更新）
+
+    # 章节统计（解析时计算，判断是否读完和计算阅读百分比时无需读取章节内容）
+    chapter_count: int = Field(default=0)  # 章节数（order_index 为 0 ~ chapter_count - 1）
+    total_chars: int = Field(default=0)  # 全部章节内容的字符数
+    last_chapter_length: int = Field(default=0)  # 最后一章内容的字符数
+
+    # 章节正文存储（见 services.body_store）
+    body_store: str = Field(default='table')  # 正文所在的存储：table / segment / source
+    body_segment: str | None = None  # segment 存储的段文件名（相对于正文目录）
+    encoding: str | None = None  # 原文件的编码（上次解析时使用，重新解析时优先尝试；source 存储读取时使用）
+    parsed_at: float = Field(default=0.0)  # 上次写入章节的时间（Unix 时间戳），章节 ETag 包含该值
 
     # 关联章节（一对多）
     chapters: list['Chapter'] = Relationship(back_populates='book')
 
 
 class Chapter(SQLModel, table=True):
+    # 按 (book_id, order_index) 定位章节；同时覆盖只按 book_id 的查询
+    __table_args__ = (Index('ix_chapter_book_id_order_index', 'book_id', 'order_index', unique=True),)
+
     id: int | None = Field(default=None, primary_key=True)
     book_id: int = Field(foreign_key='book.id')
     title: str
     order_index: int  # 章节序号
-    content: str  # 章节内容（UTF-8 编码的文本，不包含章节标题，已清洗）
+    char_count: int = Field(default=0)  # 章节内容的字符数
+    char_offset: int = Field(default=0)  # 之前所有章节内容的字符数之和
+
+    # 章节内容（不包含章节标题，已清洗）单独存放，元数据查询不会读取正文
+    # segment 存储：压缩后的正文在段文件中的位置；source 存储：本章在原文件中的字节范围
+    body_offset: int | None = None
+    body_size: int | None = None
 
     book: Book = Relationship(back_populates='chapters')
+
+
+class ChapterBody(SQLModel, table=True):
+    """table 存储的章节正文（zlib 压缩的 UTF-8 文本）"""
+
+    __tablename__ = 'chapter_body'  # pyright: ignore[reportAssignmentType]
+
+    chapter_id: int = Field(primary_key=True, foreign_key='chapter.id')
+    data: bytes
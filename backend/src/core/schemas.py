@@ -19,6 +19,18 @@ class MarkFinishedRequest(BaseModel):
     finished: bool
 
 
+class BookSummary(BaseModel):
+    """书架列表的精简字段（fields=lite）"""
+
+    id: int
+    title: str
+    is_starred: bool
+    is_finished: bool
+    last_read_time: float | None
+    chapter_index: int | None
+    progress_percent: float | None
+
+
 # Chapters
 class ChapterMetadata(BaseModel):
     id: int | None
@@ -28,6 +40,26 @@ class ChapterMetadata(BaseModel):
     # content is excluded intentionally
 
 
+# Search
+class BookSearchHit(BaseModel):
+    book_id: int
+    title: str
+
+
+class ChapterSearchHit(BaseModel):
+    book_id: int
+    book_title: str
+    order_index: int
+    chapter_title: str
+    snippet: str
+    offset: int  # 首个命中位置在章节正文中的字符偏移（可直接作为 chapter_offset 跳转）
+
+
+class SearchResponse(BaseModel):
+    books: list[BookSearchHit]
+    chapters: list[ChapterSearchHit]
+
+
 # Scan
 class ScanResponse(BaseModel):
     message: str
@@ -1,3 +1,6 @@
+import threading
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, Request
@@ -7,8 +10,13 @@ from fastapi.staticfiles import StaticFiles
 
 from api import api_router
 from core.config import settings
-from core.database import init_db
+from core.database import engine, init_db
 from core.log import setup_logging
+from core.metrics import MetricsMiddleware
+from services.body_store import migrate_inline_content
+from services.profiler import ProfilingMiddleware
+from services.search import ensure_chapter_index
+from services.watcher import book_watcher
 
 # 设置日志
 setup_logging()
@@ -18,13 +26,28 @@ settings.ensure_directories()
 
 # 初始化数据库（创建表）
 init_db()
+# 旧版数据库的章节正文移入正文存储
+migrate_inline_content(engine)
 
 IS_PRODUCTION = settings.is_production
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # 在后台线程中回填章节全文索引（需要读取全部正文，不阻塞启动）
+    threading.Thread(target=ensure_chapter_index, args=(engine,), name='chapter-index', daemon=True).start()
+    # 可选的书籍目录监视
+    if settings.watch_books_dir:
+        book_watcher.start()
+    yield
+    book_watcher.stop()
+
+
 app = FastAPI(
     title='Glean (拾阅)',
     description='轻量级的、自托管的个人小说云阅工具',
     version=settings.app_version,
+    lifespan=lifespan,
 )
 
 # CORS 配置
@@ -38,6 +61,13 @@ if not IS_PRODUCTION:
         allow_headers=['*'],
     )
 
+# 性能指标：每个路由的延迟和数据库查询
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# 按需剖析：请求头 X-Profile: 1
+app.add_middleware(ProfilingMiddleware)
+
 # 注册 API 路由
 app.include_router(api_router)
 
@@ -0,0 +1,466 @@
+"""
+章节正文存储：章节正文与章节元数据分开存放，元数据查询（目录、统计、进度）不会读取正文
+
+- table：chapter_body 表，每章一行 zlib 压缩的正文
+- segment：数据目录下每本书一个段文件，依次存放每章压缩后的正文，偏移和长度记录在 chapter 表中
+- source：不保存正文（index-only），chapter 表中记录每章在原 TXT 文件中的字节范围，读取时解析该范围
+
+每本书使用哪种存储记录在 Book.body_store 中，修改配置只影响之后写入的书籍。
+"""
+
+import os
+import secrets
+import zlib
+from abc import ABC, abstractmethod
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+from loguru import logger
+from sqlalchemy import Engine, event, inspect, text
+from sqlalchemy.orm import Session as SASession
+from sqlmodel import Session, delete, insert, select, update
+from sqlmodel.sql.expression import col
+
+from core.config import settings
+from core.models import Book, Chapter, ChapterBody
+
+from .parser import SourceIndex, iter_chapters, parse_chapter_source
+
+# zlib 压缩级别（每章独立压缩，保证随机读取时只需解压一章）
+# 中文小说正文上 3 级与 6 级的压缩率相差约 2%，压缩速度快约 50%
+COMPRESSION_LEVEL = 3
+
+# 迁移旧数据时每批处理的章节数
+MIGRATE_BATCH_SIZE = 500
+
+# Session.info 中记录的、在事务结束后需要删除的段文件
+_REMOVE_ON_COMMIT = 'body_store_remove_on_commit'
+_REMOVE_ON_ROLLBACK = 'body_store_remove_on_rollback'
+
+
+def compress_body(content: str) -> bytes:
+    return zlib.compress(content.encode(), COMPRESSION_LEVEL)
+
+
+def decompress_body(data: bytes) -> str:
+    return zlib.decompress(data).decode()
+
+
+class SourceChangedError(Exception):
+    """source 存储的原文件已被修改或删除，需要重新扫描"""
+
+
+class BodyLocation(NamedTuple):
+    """定位一章正文所需的信息"""
+
+    chapter_id: int
+    body_offset: int | None
+    body_size: int | None
+    body_segment: str | None
+    # table 存储：与章节位置一起查出的压缩正文（省去一次查询）
+    data: bytes | None = None
+
+
+class ChapterBodyStore(ABC):
+    """章节正文存储后端"""
+
+    name: str
+
+    @abstractmethod
+    def write(
+        self,
+        session: Session,
+        book: Book,
+        bodies: list[tuple[int, str]],
+        source_index: SourceIndex | None = None,
+    ) -> None:
+        """
+        写入书籍全部章节的正文（不提交）
+
+        bodies 为按章节顺序排列的 (chapter_id, content)，书籍原有的正文需要先通过 delete 删除；
+        source_index 为章节在原文件中的位置，只有 source 存储使用
+        """
+
+    @abstractmethod
+    def read(self, session: Session, location: BodyLocation) -> str | None:
+        """读取一章正文"""
+
+    @abstractmethod
+    def iter_book(self, session: Session, book: Book) -> Iterator[tuple[int, str]]:
+        """按章节顺序读取书籍全部章节的正文，返回 (chapter_id, content)"""
+
+    @abstractmethod
+    def delete(self, session: Session, book: Book) -> None:
+        """删除书籍全部章节的正文（不提交，在删除章节之前调用）"""
+
+    def delete_many(self, session: Session, books: Sequence[Book]) -> None:
+        """删除多本书籍全部章节的正文（默认逐本删除）"""
+        for book in books:
+            self.delete(session, book)
+
+
+class TableBodyStore(ChapterBodyStore):
+    name = 'table'
+
+    def write(
+        self,
+        session: Session,
+        book: Book,
+        bodies: list[tuple[int, str]],
+        source_index: SourceIndex | None = None,
+    ) -> None:
+        rows = [{'chapter_id': chapter_id, 'data': compress_body(content)} for chapter_id, content in bodies]
+        if rows:
+            session.exec(insert(ChapterBody), params=rows)
+
+    def read(self, session: Session, location: BodyLocation) -> str | None:
+        data = location.data
+        if data is None:
+            data = session.exec(
+                select(ChapterBody.data).where(ChapterBody.chapter_id == location.chapter_id)
+            ).first()
+        return None if data is None else decompress_body(data)
+
+    def iter_book(self, session: Session, book: Book) -> Iterator[tuple[int, str]]:
+        statement = (
+            select(Chapter.id, ChapterBody.data)
+            .join(ChapterBody, col(ChapterBody.chapter_id) == Chapter.id)
+            .where(Chapter.book_id == book.id)
+            .order_by(Chapter.order_index)
+        )
+        for chapter_id, data in session.exec(statement):
+            yield chapter_id, decompress_body(data)
+
+    def delete(self, session: Session, book: Book) -> None:
+        self.delete_many(session, [book])
+
+    def delete_many(self, session: Session, books: Sequence[Book]) -> None:
+        chapter_ids = select(Chapter.id).where(col(Chapter.book_id).in_([book.id for book in books]))
+        session.exec(delete(ChapterBody).where(col(ChapterBody.chapter_id).in_(chapter_ids)))
+
+
+class SegmentBodyStore(ChapterBodyStore):
+    """
+    段文件存储
+
+    每次写入生成新的段文件（先写临时文件再重命名），旧段文件在事务提交后删除；
+    事务回滚时删除新写入的段文件，数据库中的偏移始终指向完整的段文件。
+    """
+
+    name = 'segment'
+
+    @property
+    def root(self) -> Path:
+        return settings.chapter_bodies_dir
+
+    def write(
+        self,
+        session: Session,
+        book: Book,
+        bodies: list[tuple[int, str]],
+        source_index: SourceIndex | None = None,
+    ) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        segment = f'{book.id}-{secrets.token_hex(4)}.seg'
+        path = self.root / segment
+        temp_path = path.with_suffix('.tmp')
+
+        rows = []
+        offset = 0
+        with temp_path.open('wb') as f:
+            for chapter_id, content in bodies:
+                data = compress_body(content)
+                f.write(data)
+                rows.append({'id': chapter_id, 'body_offset': offset, 'body_size': len(data)})
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path.replace(path)
+        _remove_after(session, _REMOVE_ON_ROLLBACK, path)
+
+        if rows:
+            # 按主键批量 UPDATE
+            session.exec(update(Chapter), params=rows)
+        book.body_segment = segment
+
+    def read(self, session: Session, location: BodyLocation) -> str | None:
+        if location.body_segment is None or location.body_offset is None or location.body_size is None:
+            return None
+        with (self.root / location.body_segment).open('rb') as f:
+            f.seek(location.body_offset)
+            return decompress_body(f.read(location.body_size))
+
+    def iter_book(self, session: Session, book: Book) -> Iterator[tuple[int, str]]:
+        if book.body_segment is None:
+            return
+        data = (self.root / book.body_segment).read_bytes()
+        statement = (
+            select(Chapter.id, Chapter.body_offset, Chapter.body_size)
+            .where(Chapter.book_id == book.id)
+            .order_by(Chapter.order_index)
+        )
+        for chapter_id, offset, size in session.exec(statement):
+            if offset is not None and size is not None:
+                yield chapter_id, decompress_body(data[offset : offset + size])
+
+    def delete(self, session: Session, book: Book) -> None:
+        if book.body_segment is not None:
+            _remove_after(session, _REMOVE_ON_COMMIT, self.root / book.body_segment)
+            book.body_segment = None
+
+
+class SourceBodyStore(ChapterBodyStore):
+    """
+    原文件存储（index-only 导入）
+
+    只记录每章在原文件中的字节范围和文件编码，读取时解码并清洗该范围，结果与解析整个文件时的该章一致。
+    原文件的大小或修改时间与导入时不一致时抛出 SourceChangedError；
+    解析结果的标题或字符数与导入时不一致（定位出错）时回退为解析整个文件。
+    """
+
+    name = 'source'
+
+    def write(
+        self,
+        session: Session,
+        book: Book,
+        bodies: list[tuple[int, str]],
+        source_index: SourceIndex | None = None,
+    ) -> None:
+        if source_index is None or len(source_index.spans) != len(bodies):
+            raise ValueError('source store requires the chapter spans of every chapter')
+        rows = [
+            {'id': chapter_id, 'body_offset': offset, 'body_size': size}
+            for (chapter_id, _), (offset, size) in zip(bodies, source_index.spans, strict=True)
+        ]
+        if rows:
+            session.exec(update(Chapter), params=rows)
+        book.encoding = source_index.encoding
+
+    def read(self, session: Session, location: BodyLocation) -> str | None:
+        if location.body_offset is None or location.body_size is None:
+            return None
+        row = session.exec(
+            select(Book, Chapter.title, Chapter.order_index, Chapter.char_count)
+            .join(Chapter, col(Chapter.book_id) == Book.id)
+            .where(Chapter.id == location.chapter_id)
+        ).first()
+        if row is None:
+            return None
+        book, title, order_index, char_count = row
+        file_path = self._check_source(book)
+
+        with file_path.open('rb') as f:
+            f.seek(location.body_offset)
+            data = f.read(location.body_size)
+        chapter = parse_chapter_source(data, str(book.encoding), file_path.stem)
+        content = '\n\n'.join(chapter['content'])
+        if chapter['title'] == title and len(content) == char_count:
+            return content
+
+        logger.warning(f'Chapter {order_index} of {book.path} does not match its source span, reparsing')
+        for chapter in iter_chapters(file_path, encoding=book.encoding):
+            if chapter['order_index'] == order_index:
+                return '\n\n'.join(chapter['content'])
+        return None
+
+    def iter_book(self, session: Session, book: Book) -> Iterator[tuple[int, str]]:
+        file_path = self._check_source(book)
+        chapter_ids = session.exec(
+            select(Chapter.id).where(Chapter.book_id == book.id).order_by(Chapter.order_index)
+        ).all()
+        chapters = iter_chapters(file_path, encoding=book.encoding)
+        for chapter_id, chapter in zip(chapter_ids, chapters, strict=False):
+            if chapter_id is not None:
+                yield chapter_id, '\n\n'.join(chapter['content'])
+
+    def delete(self, session: Session, book: Book) -> None:
+        # 不会修改原文件；书籍记录的编码保留（重新解析时优先使用）
+        pass
+
+    @staticmethod
+    def _check_source(book: Book) -> Path:
+        """返回书籍文件的路径，文件与导入时不一致时抛出 SourceChangedError"""
+        file_path = settings.books_dir / book.path
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            raise SourceChangedError(f'Book file not found: {book.path}') from None
+        if stat.st_size != book.file_size or stat.st_mtime != book.file_mtime:
+            raise SourceChangedError(f'Book file changed since import: {book.path}')
+        return file_path
+
+
+def _remove_after(session: Session, key: str, path: Path) -> None:
+    """在事务提交（或回滚）后删除文件"""
+    session.info.setdefault(key, []).append(path)
+
+
+def _remove_files(session: SASession, key: str) -> None:
+    for path in session.info.pop(key, ()):
+        path.unlink(missing_ok=True)
+
+
+@contextmanager
+def savepoint(session: Session) -> Iterator[None]:
+    """
+    在 SAVEPOINT 中执行写入，出错时只回滚其中的修改并重新抛出异常
+
+    同时撤销其中登记的段文件删除：回滚时删除其中新写入的段文件，保留其中要在提交后删除的旧段文件
+    """
+    # pysqlite 只在 DML 之前自动开始事务：没有打开的事务时 SAVEPOINT 会自己开始事务，RELEASE 时直接提交
+    connection = session.connection()
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+    on_commit = len(session.info.get(_REMOVE_ON_COMMIT, ()))
+    on_rollback = len(session.info.get(_REMOVE_ON_ROLLBACK, ()))
+    try:
+        with session.begin_nested():
+            yield
+    except BaseException:
+        del session.info.get(_REMOVE_ON_COMMIT, [])[on_commit:]
+        written = session.info.get(_REMOVE_ON_ROLLBACK, [])
+        for path in written[on_rollback:]:
+            path.unlink(missing_ok=True)
+        del written[on_rollback:]
+        raise
+
+
+@event.listens_for(SASession, 'after_commit')
+def _after_commit(session: SASession) -> None:
+    # 释放 SAVEPOINT 时也会触发，等待外层事务提交
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_REMOVE_ON_ROLLBACK, None)
+    _remove_files(session, _REMOVE_ON_COMMIT)
+
+
+@event.listens_for(SASession, 'after_rollback')
+def _after_rollback(session: SASession) -> None:
+    # 回滚 SAVEPOINT 时也会触发，由 savepoint() 处理其中登记的文件
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_REMOVE_ON_COMMIT, None)
+    _remove_files(session, _REMOVE_ON_ROLLBACK)
+
+
+BODY_STORES: dict[str, ChapterBodyStore] = {
+    store.name: store for store in (TableBodyStore(), SegmentBodyStore(), SourceBodyStore())
+}
+
+
+def get_body_store(name: str | None = None) -> ChapterBodyStore:
+    """获取正文存储，默认为配置中用于新写入的存储"""
+    return BODY_STORES[name or settings.chapter_body_store]
+
+
+def write_chapter_bodies(
+    session: Session,
+    book: Book,
+    bodies: list[tuple[int, str]],
+    source_index: SourceIndex | None = None,
+) -> None:
+    """
+    使用配置的存储写入书籍全部章节的正文，并记录到 Book.body_store（不提交）
+
+    配置为 source 存储但无法定位章节（source_index 为 None）时改用 table 存储
+    """
+    store = get_body_store()
+    if store.name == 'source' and source_index is None:
+        logger.warning(
+            f'Chapters of {book.path} cannot be located in the source file, storing bodies in table'
+        )
+        store = get_body_store('table')
+    store.write(session, book, bodies, source_index)
+    book.body_store = store.name
+
+
+def delete_chapter_bodies(session: Session, book: Book) -> None:
+    """删除书籍全部章节的正文（不提交）"""
+    get_body_store(book.body_store).delete(session, book)
+
+
+def delete_books_bodies(session: Session, books: Sequence[Book]) -> None:
+    """删除多本书籍全部章节的正文，同一存储的书籍一起删除（不提交）"""
+    by_store: dict[str, list[Book]] = {}
+    for book in books:
+        by_store.setdefault(book.body_store, []).append(book)
+    for store_name, store_books in by_store.items():
+        get_body_store(store_name).delete_many(session, store_books)
+
+
+def read_chapter_body(session: Session, book_id: int, order_index: int) -> str | None:
+    """读取一章正文，章节不存在时返回 None"""
+    statement = (
+        select(
+            Book.body_store,
+            Chapter.id,
+            Chapter.body_offset,
+            Chapter.body_size,
+            Book.body_segment,
+            ChapterBody.data,
+        )
+        .join(Book, col(Book.id) == Chapter.book_id)
+        .outerjoin(ChapterBody, col(ChapterBody.chapter_id) == Chapter.id)
+        .where(Chapter.book_id == book_id, Chapter.order_index == order_index)
+    )
+    row = session.exec(statement).first()
+    if row is None:
+        return None
+    store_name, *location = row
+    return get_body_store(store_name).read(session, BodyLocation(*location))
+
+
+def iter_book_bodies(session: Session, book: Book) -> Iterator[tuple[int, str]]:
+    """按章节顺序读取书籍全部章节的正文，返回 (chapter_id, content)"""
+    return get_body_store(book.body_store).iter_book(session, book)
+
+
+def clear_chapter_bodies(session: Session) -> None:
+    """删除全部章节正文（段文件在事务提交后删除，不会修改 source 存储的原文件）"""
+    session.exec(delete(ChapterBody))
+    root = settings.chapter_bodies_dir
+    if root.exists():
+        for path in root.iterdir():
+            _remove_after(session, _REMOVE_ON_COMMIT, path)
+
+
+def migrate_inline_content(db_engine: Engine) -> None:
+    """
+    迁移旧版数据库：chapter 表中的 content 列移入 chapter_body 表（table 存储）
+
+    迁移后删除 content 列并 VACUUM 回收空间
+    """
+    columns = {column['name'] for column in inspect(db_engine).get_columns('chapter')}
+    if 'content' not in columns:
+        return
+
+    logger.info('Moving chapter contents into chapter_body')
+    migrated = 0
+    with db_engine.begin() as connection:
+        connection.execute(text("UPDATE book SET body_store = 'table', body_segment = NULL"))
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                text('SELECT id, content FROM chapter WHERE id > :last_id ORDER BY id LIMIT :limit'),
+                {'last_id': last_id, 'limit': MIGRATE_BATCH_SIZE},
+            ).all()
+            if not rows:
+                break
+            connection.execute(
+                text('INSERT OR REPLACE INTO chapter_body (chapter_id, data) VALUES (:chapter_id, :data)'),
+                [
+                    {'chapter_id': chapter_id, 'data': compress_body(content or '')}
+                    for chapter_id, content in rows
+                ],
+            )
+            last_id = rows[-1][0]
+            migrated += len(rows)
+        connection.execute(text('ALTER TABLE chapter DROP COLUMN content'))
+
+    # VACUUM 不能在事务中执行
+    with db_engine.connect() as connection:
+        connection.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+    logger.info(f'Moved {migrated} chapter contents')
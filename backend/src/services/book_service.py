@@ -1,13 +1,212 @@
 """书籍服务：创建和更新 Book 和 Chapter"""
 
+import time
+from collections.abc import Sequence
+from itertools import batched
 from pathlib import Path
+from typing import NotRequired, TypedDict
 
 from loguru import logger
-from sqlmodel import Session, select
+from pydantic import BaseModel, Field
+from sqlmodel import Session, delete, insert, select, update
+from sqlmodel.sql.expression import col
 
+from core.config import settings
+from core.metrics import HistogramData, in_worker_process, metrics, stage_timer, timed_stage
 from core.models import Book, Chapter
 
-from .parser import calculate_file_hash, parse_chapters
+from .body_store import delete_books_bodies, delete_chapter_bodies, write_chapter_bodies
+from .cache import chapter_cache
+from .parser import (
+    ChapterDict,
+    FileHash,
+    SourceIndex,
+    detect_file_encoding,
+    hash_file,
+    index_chapters,
+    is_legacy_hash,
+    parse_chapters,
+    read_chapters,
+)
+from .profiler import ProfileStats, collect_stats, profiled, start_profiler
+from .search import (
+    index_book,
+    index_book_chapters,
+    reindex_book,
+    reindex_chapter_title,
+    unindex_book,
+    unindex_book_chapters,
+    unindex_books,
+)
+
+# 批量写入章节时每批的行数（控制单次 executemany 的内存占用）
+CHAPTER_INSERT_BATCH_SIZE = 500
+# 批量删除书籍时每批的书籍数（控制 IN 列表的参数个数）
+BOOK_DELETE_BATCH_SIZE = 500
+
+
+class ParsedBook(TypedDict):
+    """解析阶段的产物（可跨进程传递），由写入阶段落库"""
+
+    file_path: Path
+    hash_id: str
+    file_size: int
+    file_mtime: float
+    # 为 None 表示文件内容未变化，跳过了章节解析
+    chapters: list[ChapterDict] | None
+    # source 存储：章节在原文件中的位置（无法定位时为 None）
+    source_index: NotRequired[SourceIndex | None]
+    # 解析章节时使用的编码、编码的检测方式（detect_file_encoding）以及是否因解码出错回退到 gb18030
+    encoding: NotRequired[str]
+    encoding_method: NotRequired[str]
+    encoding_fallback: NotRequired[bool]
+    # 在进程池的子进程中解析时记录的阶段耗时，由写入阶段合并到主进程的指标
+    stage_metrics: NotRequired[dict[str, HistogramData]]
+    # 解析阶段的剖析数据（profile=True 时），由写入阶段与写入的剖析合并保存
+    profile_stats: NotRequired[ProfileStats | None]
+
+
+class EncodingStats(BaseModel):
+    """编码检测统计（累计值，在写入阶段按解析结果记录）"""
+
+    hits: int = 0  # 使用书籍记录的编码，省去 chardet
+    misses: int = 0  # 重新检测（BOM / 严格 UTF-8 / chardet / 默认 gb18030）
+    fallbacks: int = 0  # 检测到的编码解码出错，按 gb18030 重新解析
+    methods: dict[str, int] = Field(default_factory=dict)  # 各检测方式的次数
+
+    def record(self, parsed: ParsedBook) -> None:
+        method = parsed.get('encoding_method')
+        if method is None:
+            return
+        if method == 'cached':
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.methods[method] = self.methods.get(method, 0) + 1
+        if parsed.get('encoding_fallback'):
+            self.fallbacks += 1
+
+
+encoding_stats = EncodingStats()
+
+
+def parse_book_file(
+    file_path: Path,
+    known_hash_id: str | None = None,
+    force_reparse: bool = False,
+    known_file_size: int | None = None,
+    known_encoding: str | None = None,
+    profile: bool = False,
+) -> ParsedBook:
+    """
+    读取文件元数据、计算哈希并解析章节（不访问数据库）
+
+    该函数是纯 CPU/IO 任务，可在进程池中执行。
+    哈希在解析读取文件的同一遍中计算；只有文件内容可能未变化（大小与记录一致）时才先单独计算哈希，
+    与记录一致则跳过解析。
+
+    参数:
+        file_path: 文件路径（绝对路径）
+        known_hash_id: 数据库中已记录的哈希，若与当前文件一致则跳过解析
+        force_reparse: 是否强制重新解析
+        known_file_size: 数据库中已记录的文件大小（为 None 时视为未知）
+        known_encoding: 书籍上次解析时使用的编码（强制重新解析时重新检测）
+        profile: 是否剖析解析过程（结果在 parsed['profile_stats'] 中）
+    """
+    if not profile:
+        return _parse_book_file(file_path, known_hash_id, force_reparse, known_file_size, known_encoding)
+    profiler = start_profiler()
+    try:
+        parsed = _parse_book_file(file_path, known_hash_id, force_reparse, known_file_size, known_encoding)
+    finally:
+        stats = collect_stats(profiler)
+    parsed['profile_stats'] = stats
+    return parsed
+
+
+def _parse_book_file(
+    file_path: Path,
+    known_hash_id: str | None,
+    force_reparse: bool,
+    known_file_size: int | None,
+    known_encoding: str | None,
+) -> ParsedBook:
+    stat = file_path.stat()
+    parsed = ParsedBook(
+        file_path=file_path,
+        hash_id='',
+        file_size=stat.st_size,
+        file_mtime=stat.st_mtime,
+        chapters=None,
+    )
+    if (
+        known_hash_id is not None
+        and not force_reparse
+        and (known_file_size is None or known_file_size == stat.st_size)
+    ):
+        # 旧版本的 MD5 hash_id 同时计算 MD5 比较，内容未变化时由写入阶段更新为新的 hash_id
+        file_hash = hash_file(file_path, legacy=is_legacy_hash(known_hash_id))
+        parsed['hash_id'] = file_hash.hexdigest()
+        if file_hash.matches(known_hash_id):
+            return parsed
+
+    file_hash = FileHash()
+    _parse_chapters(parsed, file_hash, None if force_reparse else known_encoding)
+    parsed['hash_id'] = file_hash.hexdigest()
+    if in_worker_process():
+        parsed['stage_metrics'] = metrics.pop_stages()
+    return parsed
+
+
+def _parse_chapters(
+    parsed: ParsedBook, file_hash: FileHash | None = None, known_encoding: str | None = None
+) -> None:
+    """
+    检测编码并解析章节，结果写入 parsed
+
+    检测到的编码解码出错时按 gb18030 重新解析（只有这种情况会再读取一遍文件）
+    """
+    file_path = parsed['file_path']
+    with stage_timer('detect_encoding'):
+        encoding, method = detect_file_encoding(file_path, known_encoding)
+    try:
+        chapters, source_index = _parse_with_encoding(file_path, encoding, file_hash)
+        fallback = False
+    except UnicodeDecodeError:
+        if encoding == 'gb18030':
+            raise
+        logger.warning(f'Failed to read {file_path} with {encoding}, retrying with gb18030')
+        if file_hash is not None:
+            file_hash.reset()
+        encoding, fallback = 'gb18030', True
+        chapters, source_index = _parse_with_encoding(file_path, encoding, file_hash)
+    parsed.update(
+        chapters=chapters,
+        source_index=source_index,
+        encoding=encoding,
+        encoding_method=method,
+        encoding_fallback=fallback,
+    )
+
+
+def _parse_with_encoding(
+    file_path: Path, encoding: str, file_hash: FileHash | None
+) -> tuple[list[ChapterDict], SourceIndex | None]:
+    """按配置选择流式或整体解析，source 存储同时定位每章在原文件中的位置"""
+    if settings.chapter_body_store == 'source':
+        return index_chapters(file_path, file_hash=file_hash, encoding=encoding)
+    if settings.streaming_parser:
+        return read_chapters(file_path, file_hash, encoding=encoding), None
+    return parse_chapters(file_path, file_hash, encoding), None
+
+
+def get_relative_path(file_path: Path, books_dir: Path) -> Path:
+    """计算相对于 books_dir 的路径（用于存储）"""
+    try:
+        return file_path.relative_to(books_dir)
+    except ValueError:
+        # 如果文件不在 books_dir 内，使用绝对路径
+        return Path(file_path)
 
 
 def create_or_update_book(
@@ -15,6 +214,7 @@ def create_or_update_book(
     file_path: Path,
     books_dir: Path,
     force_reparse: bool = False,
+    profile: bool = False,
 ) -> tuple[Book, bool]:
     """
     创建或更新书籍
@@ -24,26 +224,61 @@ def create_or_update_book(
         file_path: 文件路径（绝对路径）
         books_dir: 书籍目录（用于计算相对路径）
         force_reparse: 是否强制重新解析（用于全量扫描）
+        profile: 是否剖析解析和写入过程（保存到 PROFILES_DIR，文件名包含书籍路径）
 
     返回:
         (book, is_new) - 书籍对象和是否为新创建的标志
     """
+    relative_path = get_relative_path(file_path, books_dir)
+    existing_book = session.exec(select(Book).where(Book.path == str(relative_path))).first()
+
+    known_hash_id = existing_book.hash_id if existing_book else None
+    known_file_size = existing_book.file_size if existing_book else None
+    known_encoding = existing_book.encoding if existing_book else None
+    with profiled('book', str(relative_path), profile):
+        parsed = parse_book_file(file_path, known_hash_id, force_reparse, known_file_size, known_encoding)
+        return save_parsed_book(
+            session, parsed, books_dir, force_reparse, book_id=existing_book.id if existing_book else None
+        )
 
-    # 计算相对路径（用于存储）
-    try:
-        relative_path = file_path.relative_to(books_dir)
-    except ValueError:
-        # 如果文件不在 books_dir 内，使用绝对路径
-        relative_path = Path(file_path)
+
+@timed_stage('db_write')
+def save_parsed_book(
+    session: Session,
+    parsed: ParsedBook,
+    books_dir: Path,
+    force_reparse: bool = False,
+    commit: bool = True,
+    book_id: int | None = None,
+) -> tuple[Book, bool]:
+    """
+    将解析结果写入数据库
+
+    参数:
+        session: 数据库会话
+        parsed: parse_book_file 的返回值
+        books_dir: 书籍目录（用于计算相对路径）
+        force_reparse: 是否强制重新解析（用于全量扫描）
+        commit: 是否提交；为 False 时只 flush，由调用方批量提交，并在提交后失效该书的章节缓存
+        book_id: 调用方已知的该路径对应的书籍 id（省去按路径查询），为 None 时按路径查找
+
+    返回:
+        (book, is_new) - 书籍对象和是否为新创建的标志
+    """
+    file_path = parsed['file_path']
+    relative_path = get_relative_path(file_path, books_dir)
+    if 'stage_metrics' in parsed:
+        metrics.merge_stages(parsed.pop('stage_metrics'))
 
     # 检查书籍是否已存在（优先通过 path 查找，因为 path 更稳定）
-    existing_book = session.exec(select(Book).where(Book.path == str(relative_path))).first()
+    if book_id is not None:
+        existing_book = session.get(Book, book_id)
+    else:
+        existing_book = session.exec(select(Book).where(Book.path == str(relative_path))).first()
 
-    # 获取文件元数据和哈希
-    stat = file_path.stat()
-    file_size = stat.st_size
-    file_mtime = stat.st_mtime
-    hash_id = calculate_file_hash(file_path)
+    file_size = parsed['file_size']
+    file_mtime = parsed['file_mtime']
+    hash_id = parsed['hash_id']
 
     if existing_book:
         # 更新现有书籍
@@ -53,7 +288,11 @@ def create_or_update_book(
         # 检查是否需要重新解析
         # 1. 强制重新解析（全量扫描）
         # 2. 文件被修改（先检查 file_size, 再检查 hash_id 变化）
-        needs_reparse = force_reparse or book.file_size != file_size or book.hash_id != hash_id
+        # 解析阶段确认内容未变化（chapters 为 None）时 hash_id 可能只是从旧版本的 MD5 迁移
+        unchanged = parsed['chapters'] is None and not force_reparse
+        needs_reparse = not unchanged and (
+            force_reparse or book.file_size != file_size or book.hash_id != hash_id
+        )
 
         if needs_reparse:
             # 需要重新解析
@@ -63,33 +302,34 @@ def create_or_update_book(
             book.file_mtime = file_mtime
             book.path = str(relative_path)
 
-            # 删除旧章节
-            old_chapters = session.exec(select(Chapter).where(Chapter.book_id == book.id)).all()
-            for chapter in old_chapters:
-                session.delete(chapter)
-
-            # 解析新章节
-            chapters_data = parse_chapters(file_path)
-            for chapter_data in chapters_data:
-                chapter = Chapter(
-                    book_id=book.id,
-                    title=chapter_data['title'],
-                    order_index=chapter_data['order_index'],
-                    content='\n\n'.join(chapter_data['content']),
-                )
-                session.add(chapter)
+            # 删除旧章节，写入新章节
+            chapters_data = _ensure_chapters(parsed)
+            delete_book_chapters(session, book)
+            _set_chapter_stats(
+                book, insert_chapters(session, book, chapters_data, parsed.get('source_index'))
+            )
+            book.encoding = parsed.get('encoding')
+            # 时钟精度不足时也保证解析时间递增（ETag 包含解析时间）
+            book.parsed_at = max(time.time(), book.parsed_at + 1e-6)
+            # 章节变化后重新计算阅读百分比（章节序号可能已失效）
+            book.progress_percent = calculate_progress_percent(session, book)
 
             session.add(book)
-            session.commit()
-            session.refresh(book)
+            _commit_book(session, book, commit)
             logger.info(f'Updated existing book: {relative_path}')
+        elif book.file_mtime != file_mtime or book.hash_id != hash_id:
+            # 内容未变化（只有修改时间变化），记录新的修改时间，之后的增量扫描不再读取该文件
+            book.file_mtime = file_mtime
+            book.hash_id = hash_id
+            session.add(book)
+            _commit_book(session, book, commit)
     else:
         # 创建新书籍
         logger.info(f'Creating new book: {relative_path}')
         is_new = True
 
         # 解析章节
-        chapters_data = parse_chapters(file_path)
+        chapters_data = _ensure_chapters(parsed)
 
         # 提取书名（使用文件名，去掉扩展名）
         title = file_path.stem
@@ -101,32 +341,183 @@ def create_or_update_book(
             path=str(relative_path),
             file_size=file_size,
             file_mtime=file_mtime,
+            encoding=parsed.get('encoding'),
+            parsed_at=time.time(),
         )
         session.add(book)
         session.flush()  # 获取 book.id
+        index_book(session, book.id, title)
 
         # 创建章节
-        for chapter_data in chapters_data:
-            chapter = Chapter(
-                book_id=book.id,
-                title=chapter_data['title'],
-                order_index=chapter_data['order_index'],
-                content='\n\n'.join(chapter_data['content']),
-            )
-            session.add(chapter)
+        _set_chapter_stats(book, insert_chapters(session, book, chapters_data, parsed.get('source_index')))
 
-        session.commit()
-        session.refresh(book)
+        _commit_book(session, book, commit)
         logger.info(f'Created new book: {relative_path} with {len(chapters_data)} chapters')
 
     return book, is_new
 
 
-def reparse_book(session: Session, book_id: int, books_dir: Path) -> Book:
+def _commit_book(session: Session, book: Book, commit: bool) -> None:
+    """提交书籍的修改（commit 为 False 时只 flush）"""
+    if not commit:
+        session.flush()
+        return
+    session.commit()
+    # 提交之后再失效缓存，避免并发读取把旧章节重新写入缓存（SQLite 也可能复用已删除书籍的 id）
+    chapter_cache.invalidate_book(book.id)
+    session.refresh(book)
+
+
+def insert_chapters(
+    session: Session,
+    book: Book,
+    chapters_data: list[ChapterDict],
+    source_index: SourceIndex | None = None,
+) -> list[int]:
+    """
+    批量写入章节
+
+    绕过 ORM 对象构建，按 CHAPTER_INSERT_BATCH_SIZE 分批执行 executemany，
+    章节元数据写入 chapter 表，正文写入正文存储（source 存储只记录 source_index 中的位置），
+    最后一次性写入全文索引
+    同时写入每章的字符数和累计字符偏移，返回每章的字符数
+    """
+    char_counts: list[int] = []
+    bodies: list[tuple[int, str]] = []
+    char_offset = 0
+    for start in range(0, len(chapters_data), CHAPTER_INSERT_BATCH_SIZE):
+        rows = []
+        contents = []
+        for chapter_data in chapters_data[start : start + CHAPTER_INSERT_BATCH_SIZE]:
+            content = '\n\n'.join(chapter_data['content'])
+            rows.append(
+                {
+                    'book_id': book.id,
+                    'title': chapter_data['title'],
+                    'order_index': chapter_data['order_index'],
+                    'char_count': len(content),
+                    'char_offset': char_offset,
+                }
+            )
+            contents.append(content)
+            char_counts.append(len(content))
+            char_offset += len(content)
+        # RETURNING 按参数顺序返回新章节的 id
+        chapter_ids = (
+            session.exec(insert(Chapter).returning(Chapter.id, sort_by_parameter_order=True), params=rows)
+            .scalars()
+            .all()
+        )
+        bodies.extend(zip(chapter_ids, contents, strict=True))
+
+    write_chapter_bodies(session, book, bodies, source_index)
+    # 写入全文索引
+    index_book_chapters(
+        session,
+        book.id,
+        (
+            (chapter_id, chapter_data['title'], chapter_data['order_index'], content)
+            for (chapter_id, content), chapter_data in zip(bodies, chapters_data, strict=True)
+        ),
+    )
+    return char_counts
+
+
+def _set_chapter_stats(book: Book, char_counts: list[int]) -> None:
+    """更新书籍的章节统计"""
+    book.chapter_count = len(char_counts)
+    book.total_chars = sum(char_counts)
+    book.last_chapter_length = char_counts[-1] if char_counts else 0
+
+
+def calculate_progress_percent(session: Session, book: Book) -> float | None:
+    """
+    根据阅读进度计算阅读百分比（0-100）
+
+    只读取当前章节的累计字符偏移，不读取章节内容
+    """
+    if book.chapter_index is None or book.total_chars <= 0:
+        return None
+    char_offset = session.exec(
+        select(Chapter.char_offset).where(
+            Chapter.book_id == book.id,
+            Chapter.order_index == book.chapter_index,
+        )
+    ).first()
+    if char_offset is None:
+        return None
+    return round(min(100.0, (char_offset + (book.chapter_offset or 0)) * 100 / book.total_chars), 2)
+
+
+def delete_book_chapters(session: Session, book: Book) -> None:
+    """使用单条 DELETE 语句删除书籍的全部章节（及其正文和全文索引）"""
+    unindex_book_chapters(session, book.id)
+    delete_chapter_bodies(session, book)
+    session.exec(delete(Chapter).where(col(Chapter.book_id) == book.id))
+
+
+def delete_book(session: Session, book: Book) -> None:
+    """删除书籍记录、章节、正文和全文索引（不提交，不删除书籍文件）"""
+    delete_book_chapters(session, book)
+    unindex_book(session, book.id)
+    session.delete(book)
+
+
+def delete_books(session: Session, book_ids: Sequence[int]) -> None:
+    """
+    批量删除书籍记录、章节、正文和全文索引（不提交，不删除书籍文件）
+
+    每批 BOOK_DELETE_BATCH_SIZE 本书，每张表一条 DELETE 语句
+    """
+    for batch in batched(book_ids, BOOK_DELETE_BATCH_SIZE):
+        books = session.exec(select(Book).where(col(Book.id).in_(batch))).all()
+        unindex_books(session, batch)
+        delete_books_bodies(session, books)
+        session.exec(delete(Chapter).where(col(Chapter.book_id).in_(batch)))
+        session.exec(delete(Book).where(col(Book.id).in_(batch)))
+
+
+def _ensure_chapters(parsed: ParsedBook) -> list[ChapterDict]:
+    """获取解析结果中的章节，解析阶段跳过时补充解析"""
+    if parsed['chapters'] is None:
+        _parse_chapters(parsed)
+    assert parsed['chapters'] is not None
+    encoding_stats.record(parsed)
+    return parsed['chapters']
+
+
+def move_book(session: Session, book: Book, file_path: Path, books_dir: Path, hash_id: str) -> None:
+    """
+    书籍文件被移动或重命名（内容不变）：更新路径、文件信息和书名，保留章节和阅读进度（不提交）
+
+    书名和前言章节的标题来自文件名，重命名时一并更新；hash_id 为新文件的哈希（旧版本的 MD5 随之迁移）
+    """
+    stat = file_path.stat()
+    book.hash_id = hash_id
+    old_title = Path(book.path).stem
+    title = file_path.stem
+    book.path = str(get_relative_path(file_path, books_dir))
+    book.file_size = stat.st_size
+    book.file_mtime = stat.st_mtime
+    if title != old_title:
+        book.title = title
+        reindex_book(session, book.id, title)
+        preface_id = session.exec(
+            select(Chapter.id).where(
+                Chapter.book_id == book.id, Chapter.order_index == 0, Chapter.title == old_title
+            )
+        ).first()
+        if preface_id is not None:
+            session.exec(update(Chapter).where(col(Chapter.id) == preface_id).values(title=title))
+            reindex_chapter_title(session, book.id, 0, preface_id, title)
+    session.add(book)
+
+
+def reparse_book(session: Session, book_id: int, books_dir: Path, profile: bool = False) -> Book:
     """
     重新解析指定书籍
 
-    用于手动触发重新解析
+    用于手动触发重新解析，profile 为 True 时剖析解析和写入过程
     """
     book = session.get(Book, book_id)
     if not book:
@@ -137,12 +528,7 @@ def reparse_book(session: Session, book_id: int, books_dir: Path) -> Book:
     if not file_path.exists():
         raise ValueError(f'Book file not found: {file_path}')
 
-    # 删除旧章节
-    old_chapters = session.exec(select(Chapter).where(Chapter.book_id == book.id)).all()
-    for chapter in old_chapters:
-        session.delete(chapter)
-
-    # 强制重新解析
-    book, _ = create_or_update_book(session, file_path, books_dir, force_reparse=True)
+    # 强制重新解析（旧章节在写入阶段删除）
+    book, _ = create_or_update_book(session, file_path, books_dir, force_reparse=True, profile=profile)
 
     return book
@@ -0,0 +1,114 @@
+"""
+进程内的章节响应缓存
+
+章节内容只会在书籍被重新解析（hash_id 变化或手动重新解析）或删除时改变，
+因此按书籍维度缓存序列化后的响应体，并在书籍变化时整体失效。
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+
+from core.config import settings
+
+
+class BookCache:
+    """
+    按字节数限制大小的 LRU 缓存（线程安全）
+
+    - 缓存键为 (book_id, 子键)，值为响应体 bytes
+    - 同时缓存 book_id -> ETag 前缀（hash_id 和解析时间），用于在不访问数据库的情况下响应 If-None-Match
+    - 每本书维护一个版本号：读取数据库前记录版本号，写入缓存时版本号已变化说明期间书籍被修改，
+      放弃写入，避免并发的旧数据在失效之后重新进入缓存
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[int, Hashable], bytes] = OrderedDict()
+        self._keys_by_book: dict[int, set[tuple[int, Hashable]]] = {}
+        self._etags: dict[int, str] = {}
+        self._generations: dict[int, int] = {}
+        self._epoch = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def size(self) -> int:
+        """当前缓存的响应体总字节数"""
+        return self._size
+
+    def generation(self, book_id: int) -> int:
+        """书籍当前的版本号（在读取数据库之前获取）"""
+        # 两个计数都只增不减，任意一个变化都会使版本号变化
+        return self._epoch + self._generations.get(book_id, 0)
+
+    def get_etag(self, book_id: int) -> str | None:
+        return self._etags.get(book_id)
+
+    def set_etag(self, book_id: int, etag: str, generation: int) -> None:
+        with self._lock:
+            if self.enabled and self.generation(book_id) == generation:
+                self._etags[book_id] = etag
+
+    def get(self, book_id: int, key: Hashable) -> bytes | None:
+        with self._lock:
+            value = self._entries.get((book_id, key))
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((book_id, key))
+            self.hits += 1
+            return value
+
+    def put(self, book_id: int, key: Hashable, value: bytes, generation: int) -> None:
+        # 超过总容量的条目不缓存
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if self.generation(book_id) != generation:
+                return
+            entry_key = (book_id, key)
+            if entry_key in self._entries:
+                self._remove(entry_key)
+            self._entries[entry_key] = value
+            self._keys_by_book.setdefault(book_id, set()).add(entry_key)
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_book(self, book_id: int) -> None:
+        """书籍被修改或删除后调用，移除该书的全部缓存"""
+        with self._lock:
+            self._generations[book_id] = self._generations.get(book_id, 0) + 1
+            self._etags.pop(book_id, None)
+            for entry_key in list(self._keys_by_book.get(book_id, ())):
+                self._remove(entry_key)
+
+    def clear(self) -> None:
+        """清空全部缓存（如清空数据库时）"""
+        with self._lock:
+            # 所有书籍的版本号随之变化，使正在进行的读取不会写入缓存
+            self._epoch += 1
+            self._entries.clear()
+            self._keys_by_book.clear()
+            self._etags.clear()
+            self._size = 0
+
+    def _remove(self, entry_key: tuple[int, Hashable]) -> None:
+        value = self._entries.pop(entry_key)
+        self._size -= len(value)
+        book_keys = self._keys_by_book.get(entry_key[0])
+        if book_keys is not None:
+            book_keys.discard(entry_key)
+            if not book_keys:
+                del self._keys_by_book[entry_key[0]]
+
+
+# 全局章节缓存实例
+chapter_cache = BookCache(settings.chapter_cache_bytes)
@@ -1,15 +1,60 @@
-from .cleaner import clean_content, clean_html, clean_line_breaks
-from .core import ChapterDict, parse_chapters
-from .utils import calculate_file_hash, detect_encoding
-from .validator import is_line_chapter_title
+from .cleaner import (
+    CleaningPipeline,
+    CleaningStage,
+    HTMLStripper,
+    LineBreakCleaner,
+    clean_content,
+    clean_html,
+    clean_line,
+    clean_line_breaks,
+    default_cleaning_stages,
+)
+from .core import (
+    ChapterDict,
+    SourceIndex,
+    index_chapters,
+    iter_chapters,
+    parse_chapter_source,
+    parse_chapters,
+    read_chapters,
+)
+from .utils import (
+    LEGACY_HASH_LENGTH,
+    DetectedEncoding,
+    FileHash,
+    calculate_file_hash,
+    detect_encoding,
+    detect_file_encoding,
+    hash_file,
+    is_legacy_hash,
+)
+from .validator import classify_chapter_titles, is_line_chapter_title
 
 __all__ = [
     'ChapterDict',
+    'SourceIndex',
     'parse_chapters',
+    'iter_chapters',
+    'read_chapters',
+    'index_chapters',
+    'parse_chapter_source',
+    'FileHash',
+    'LEGACY_HASH_LENGTH',
     'calculate_file_hash',
+    'hash_file',
+    'is_legacy_hash',
+    'DetectedEncoding',
     'detect_encoding',
+    'detect_file_encoding',
     'is_line_chapter_title',
+    'classify_chapter_titles',
     'clean_content',
     'clean_html',
+    'clean_line',
     'clean_line_breaks',
+    'HTMLStripper',
+    'LineBreakCleaner',
+    'CleaningStage',
+    'CleaningPipeline',
+    'default_cleaning_stages',
 ]
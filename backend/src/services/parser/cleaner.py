@@ -1,8 +1,15 @@
 import re
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from functools import cache
+from html import unescape
 from html.parser import HTMLParser
 from typing import override
 
-from opencc_purepy import OpenCC
+from core.config import settings
+from core.metrics import stage_timer
+
+from .converter import T2SEngine, convert_t2s
 
 # Maximimum title length for checking during line break cleaning
 MAX_TITLE_LENGTH_FOR_CLEANING = 15
@@ -13,28 +20,196 @@ _FULL_TO_HALF_TRANS = str.maketrans(
     '０１２３４５６７８９ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ「」',
     '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ""',
 )
+# 需要转为半角的全角字符的连续片段
+_FULL_WIDTH_REGEX = re.compile(f'[{re.escape("".join(map(chr, _FULL_TO_HALF_TRANS)))}]+')
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """提取 HTML 中的文本，支持多次 feed 增量处理"""
+
+    def __init__(self):
+        super().__init__()
+        self.result: list[str] = []
+
+    @override
+    def handle_data(self, data: str):
+        self.result.append(data)
+
+    def get_text(self) -> str:
+        return ''.join(self.result)
+
+    def pop_text(self) -> str:
+        """取出目前已提取的文本并清空"""
+        text = self.get_text()
+        self.result = []
+        return text
+
+
+# 常见的格式标签（不包括 script / style / textarea / title 等内容不按 HTML 解析的元素，属性值不含 < 和 >），
+# 以及不含 --、< 和 > 的注释。HTMLParser 对这些标记不输出任何内容
+_SIMPLE_MARKUP_REGEX = re.compile(
+    r'<(?:/?(?:a|b|big|blockquote|body|br|center|dd|div|dl|dt|em|font|h[1-6]|head|hr|html|i|img|li|meta|ol|p'
+    r'|pre|s|small|span|strike|strong|sub|sup|table|tbody|td|th|thead|tr|tt|u|ul)'
+    r"""(?:\s+[^\s"'<>/=]+(?:\s*=\s*(?:"[^"<>]*"|'[^'<>]*'|[^\s"'<>=`]+))?)*\s*/?"""
+    r'|!--(?:[^<>-]|-(?!-))*--)>',
+    re.IGNORECASE,
+)
+# 字符引用的结束位置（& 之后没有这些字符时，引用可能在下一块继续）
+_CHARREF_END_REGEX = re.compile(r'[\s;<&]')
+# 分块处理时末尾最多保留的字符数，更长的不是不完整的标记（如单独的 <），直接处理
+_MAX_PENDING_MARKUP = 1024
+
+
+def _strip_simple_markup(text: str) -> str | None:
+    """
+    去除常见的标签和注释并解码字符引用，结果与 HTMLParser 一致
+
+    标签之间的每段文本分别解码（与 HTMLParser 相同）；去除后仍有 < 时返回 None，交给 HTMLParser 处理
+    """
+    parts = _SIMPLE_MARKUP_REGEX.split(text)
+    if any('<' in part for part in parts):
+        return None
+    return ''.join(unescape(part) if '&' in part else part for part in parts)
+
+
+def _safe_cut(text: str) -> int:
+    """分块处理时可以安全切分的位置：末尾不完整的标签或字符引用之前"""
+    limit = max(0, len(text) - _MAX_PENDING_MARKUP)
+    tag_start = text.rfind('<', limit)
+    if tag_start >= 0 and text.find('>', tag_start) < 0:
+        return tag_start
+    charref_start = text.rfind('&', limit)
+    if charref_start >= 0 and not _CHARREF_END_REGEX.search(text, charref_start + 1):
+        return charref_start
+    return len(text)
+
+
+class HTMLStripper:
+    """
+    分块去除 HTML 标签，提取纯文本（块边界可以在任意位置）
+
+    按代价从低到高分为三级：
+    1. 没有 < 和 & 的文本原样返回（大多数 TXT 文件）
+    2. 只有常见标签（<br>、<p> 等）、注释和字符引用（&nbsp; 等）时用正则去除
+    3. 其他情况（script、单独的 < 等）从该块起改用 HTMLParser
+
+    末尾不完整的标签或字符引用保留到下一块。输入结束时剩余的部分交给 HTMLParser 并调用 close，
+    输出其缓冲的全部内容，因此结果与分块方式无关。
+    """
+
+    def __init__(self):
+        # 尚未处理的末尾（不完整的标签或字符引用）
+        self._pending = ''
+        self._parser: _HTMLTextExtractor | None = None
+
+    def feed(self, chunk: str) -> str:
+        """输入一块文本，返回已经确定的纯文本"""
+        text = self._pending + chunk
+        if self._parser is None and '<' not in text and '&' not in text:
+            self._pending = ''
+            return text
+        cut = _safe_cut(text)
+        self._pending = text[cut:]
+        if self._parser is None:
+            stripped = _strip_simple_markup(text[:cut])
+            if stripped is not None:
+                return stripped
+            self._parser = _HTMLTextExtractor()
+        self._parser.feed(text[:cut])
+        return self._parser.pop_text()
+
+    def finish(self) -> str:
+        """输入结束，返回剩余的文本（HTMLParser 缓冲的内容在 close 时输出），之后可以输入新的文本"""
+        text = self._pending
+        parser = self._parser
+        self._pending = ''
+        self._parser = None
+        if parser is None:
+            if not text:
+                return ''
+            parser = _HTMLTextExtractor()
+        parser.feed(text)
+        parser.close()
+        return parser.pop_text()
 
 
 def clean_html(content: str) -> str:
     """
     去除 HTML 标签，提取纯文本
+
+    没有 < 和 & 时原样返回，其他情况见 HTMLStripper
+    """
+    if '<' not in content and '&' not in content:
+        return content
+    stripper = HTMLStripper()
+    return stripper.feed(content) + stripper.finish()
+
+
+# 以下正则大多以 \n 开头（只在换行符处尝试匹配），比在每个字符处尝试的正则快得多
+# 三个以上的连续换行（文本中没有 \r 时）
+_MULTI_NEWLINE_REGEX = re.compile(r'\n\n\n+')
+# 三个以上的连续换行（任意的 \r 和 \n）
+_MULTI_CR_LF_REGEX = re.compile(r'[\r\n]{3,}')
+# 行首的空白
+_LINE_START_SPACE_REGEX = re.compile(r'\n[^\S\n]+')
+# 行尾有空白的换行
+_LINE_END_SPACE_REGEX = re.compile(r'\n(?<=[^\S\n]\n)')
+# 空行（去除行首尾空白之后连续的换行）
+_EMPTY_LINES_REGEX = re.compile(r'\n\n+')
+
+
+def _collapse_line_breaks(content: str) -> str:
+    r"""
+    合并连续的多个换行：三个以上连续的 \r 或 \n 合并为一个 \n，剩余的 \r\n 替换为 \n
+
+    与按 (?:\r\n|\r|\n){3,} 合并的结果一致（回溯时 \r\n 也可以算作两个换行）
+    """
+    if '\r' not in content:
+        return _MULTI_NEWLINE_REGEX.sub('\n', content)
+    replaced = content.replace('\r\n', '\n')
+    if '\r' not in replaced and '\n\n' not in content:
+        # 只有 \r\n 换行（没有单独的 \r 和连续的 \n）：替换后两个以上连续的 \n 原来至少是三个字符
+        return _EMPTY_LINES_REGEX.sub('\n', replaced)
+    # 剩余的 \r\n 中的 \r 是行尾的空白
+    return _MULTI_CR_LF_REGEX.sub('\n', content).replace('\r\n', '\n')
+
+
+def _strip_lines(content: str) -> str:
+    """去除每行首尾的空白，空行变为连续的换行"""
+    content = _LINE_START_SPACE_REGEX.sub('\n', content)
+    if _LINE_END_SPACE_REGEX.search(content):
+        content = '\n'.join([line.rstrip() for line in content.split('\n')])
+    return content.strip()
+
+
+@cache
+def _continued_lines_regex(max_title_length: int, end_punctuations: str) -> re.Pattern[str]:
     """
+    需要合并为一段的连续行（各行已去除首尾空白），从段落首行末尾的换行开始匹配
+
+    首行不以标点结尾且长度不小于 max_title_length（否则单独成段，用定长的后向断言判断），之后的行依次合并，
+    直到以标点结尾的行、空行或文本结束。缓冲区中的内容长度总是不小于 max_title_length，
+    所以首行之后只需判断行尾标点
+    """
+    punctuations = re.escape(end_punctuations)
+    open_end = f'(?<![{punctuations}])' if end_punctuations else ''
+    return re.compile(
+        rf'\n(?<=[^\n]{{{max(1, max_title_length) - 1}}}[^\n{punctuations}]\n)(?=[^\n])'
+        rf'(?:[^\n]++{open_end}\n(?=[^\n]))*+'
+    )
 
-    class HTMLTextExtractor(HTMLParser):
-        def __init__(self):
-            super().__init__()
-            self.result: list[str] = []
 
-        @override
-        def handle_data(self, data: str):
-            self.result.append(data)
+def _join_lines(match: re.Match[str]) -> str:
+    return match.group().replace('\n', ' ')
 
-        def get_text(self) -> str:
-            return ''.join(self.result)
 
-    parser = HTMLTextExtractor()
-    parser.feed(content)
-    return parser.get_text()
+def _merge_lines(content: str, max_title_length: int, end_punctuations: str) -> str:
+    """去除每行首尾的空白并合并被拆分的句子（已合并连续换行），段落之间用两个换行分隔"""
+    content = _strip_lines(content)
+    content = _continued_lines_regex(max_title_length, end_punctuations).sub(_join_lines, content)
+    if '\n\n' in content:
+        content = _EMPTY_LINES_REGEX.sub('\n', content)
+    return content.replace('\n', '\n\n')
 
 
 def clean_line_breaks(
@@ -52,75 +227,261 @@ def clean_line_breaks(
     2. 恢复被拆分的句子：如果行尾不是标点符号，且不太可能是标题，则合并下一行
 
     这是因为网站按宽度拆分文本，导致原本一个句子被分成多行，需要恢复。
+
+    每一步都是对全文的正则替换或字符串方法，不为每行创建对象（只有行尾有空白时逐行去除）
     """
     # 合并连续的多个换行（保留一个，用于段落分隔）
-    content = re.sub(r'(?:\r\n|\r|\n){3,}', '\n', content)
+    content = _collapse_line_breaks(content)
+    return _merge_lines(content, max_title_length, end_punctuations)
 
-    # 按行处理，恢复被拆分的句子
-    lines = [line.strip() for line in content.split('\n')]
-    if not lines:
-        return content
 
-    result_lines = []
-    buffer = []
-    buffer_len = 0
+def clean_content(content: str) -> str:
+    """
+    清洗文本内容，段落之间用两个换行分隔
+
+    按配置依次执行以下清洗步骤（见 CleaningPipeline，按块在一次遍历中完成）：
+    1. 去除 HTML 标签
+    2. 全角转半角（数字、字母、引号）
+    3. 繁体转简体
+    4. 清理多余换行
+    """
+    return '\n\n'.join(CleaningPipeline().clean(content))
+
 
-    for line in lines:
-        # 空行：先刷新缓冲区，但不添加空行到结果中
-        if not line:
-            if buffer:
-                result_lines.append(' '.join(buffer))
-                buffer = []
-                buffer_len = 0
-            continue
+def clean_line(line: str) -> str:
+    """
+    单独清洗一行（按配置去除 HTML、全角转半角、繁体转简体并去掉首尾空白）
 
-        # 将当前行加入缓冲区（相当于通过栈积累碎片）
-        buffer.append(line)
-        buffer_len += len(line)
+    用于在原文件中查找标题行，结果与 clean_content 输出中独占一段的该行一致
+    """
+    return CleaningPipeline().clean_line(line)
 
-        # 检查是否因为标点或标题原因，当前缓冲区内容已经构成完整的一段/句
-        # 条件：行尾是标点符号，或者总长度像是标题
-        end_with_punctuation = line[-1] in end_punctuations
 
-        # 计算当前合并后的总长度：字符长度 + 空格数量
-        current_total_len = buffer_len + max(0, len(buffer) - 1)
-        is_likely_title = current_total_len < max_title_length
+class LineBreakCleaner:
+    """
+    clean_line_breaks 的增量版本
 
-        if end_with_punctuation or is_likely_title:
-            # 缓冲区内容已完整，刷新到结果
-            result_lines.append(' '.join(buffer))
-            buffer = []
-            buffer_len = 0
+    分块输入文本（块边界可以在任意位置），每当一个段落确定时立即输出。
+    所有块的输出依次拼接后，与对完整文本调用 clean_line_breaks 的结果按段落一一对应。
+    """
 
-    # 处理剩余的缓冲区内容
-    if buffer:
-        result_lines.append(' '.join(buffer))
+    def __init__(
+        self,
+        max_title_length: int = MAX_TITLE_LENGTH_FOR_CLEANING,
+        end_punctuations: str = END_PUNCTUATIONS,
+    ):
+        self.max_title_length = max_title_length
+        self.end_punctuations = end_punctuations
+        # 尾部尚未结束的连续换行（可能与下一块拼成 3 个以上换行）
+        self._pending_breaks = ''
+        # 最后一个确定结束的段落之后的文本（已合并连续换行）
+        self._pending = ''
 
-    # 重新组合，段落之间用两个换行分隔
-    return '\n\n'.join(result_lines)
+    def feed(self, chunk: str) -> Iterator[str]:
+        """输入一块文本，输出已经确定的段落"""
+        text = self._pending_breaks + chunk
+        # 保留尾部的连续换行，等待下一块确定其长度
+        body = text.rstrip('\r\n')
+        self._pending_breaks = text[len(body) :]
+        if not body:
+            return
+        start = len(self._pending)
+        text = self._pending + _collapse_line_breaks(body)
+        cut = self._last_paragraph_end(text, start)
+        self._pending = text[cut:]
+        yield from self._paragraphs(text[:cut])
 
+    def finish(self) -> Iterator[str]:
+        """输入结束，输出剩余的段落"""
+        text = self._pending + _collapse_line_breaks(self._pending_breaks)
+        self._pending = ''
+        self._pending_breaks = ''
+        yield from self._paragraphs(text)
 
-def clean_content(content: str) -> str:
+    def _last_paragraph_end(self, text: str, start: int) -> int:
+        """
+        最后一个以标点结尾的行或空行之后的位置（段落一定在此结束），没有时返回 0
+
+        只检查换行符在 start 之后的行（之前的行在上一块中已经检查过）
+        """
+        end = text.rfind('\n')
+        while end >= start:
+            line_start = text.rfind('\n', 0, end) + 1
+            line = text[line_start:end].rstrip()
+            if not line or line[-1] in self.end_punctuations:
+                return end + 1
+            end = line_start - 1
+        return 0
+
+    def _paragraphs(self, text: str) -> Iterator[str]:
+        merged = _merge_lines(text, self.max_title_length, self.end_punctuations)
+        if merged:
+            yield from merged.split('\n\n')
+
+
+# CleaningPipeline.clean 每次处理的字符数
+CLEAN_CHUNK_SIZE = 256 * 1024
+
+
+class CleaningStage(ABC):
     """
-    清洗文本内容
+    清洗流水线中的一个阶段（最后的换行清理除外）
 
-    执行以下清洗步骤：
-    1. 去除 HTML 标签
-    2. 全角转半角（数字、字母、引号）
-    3. 繁体转简体
-    4. 清理多余换行
+    无状态的阶段只需实现 clean；需要跨块保留状态的阶段还要实现 feed / finish
+    """
+
+    # 阶段名（也是 stage_timer 记录的阶段名）
+    name: str
+    # 是否只能对完整的行执行（如繁简转换的词组不能被块边界截断），否则块边界可以在任意位置
+    per_line = False
+
+    @abstractmethod
+    def clean(self, text: str) -> str:
+        """清洗一段完整的文本"""
+
+    def feed(self, text: str) -> str:
+        """输入一块文本，返回已经确定的结果"""
+        return self.clean(text)
+
+    def finish(self) -> str:
+        """输入结束，返回剩余的结果并重置状态"""
+        return ''
+
+
+class HTMLStage(CleaningStage):
+    """去除 HTML 标签（见 HTMLStripper）"""
+
+    name = 'clean_html'
+
+    def __init__(self):
+        self._stripper = HTMLStripper()
+
+    @override
+    def clean(self, text: str) -> str:
+        return clean_html(text)
+
+    @override
+    def feed(self, text: str) -> str:
+        return self._stripper.feed(text)
+
+    @override
+    def finish(self) -> str:
+        text = self._stripper.finish()
+        self._stripper = HTMLStripper()
+        return text
+
+
+def _to_half_width(match: re.Match[str]) -> str:
+    return match.group().translate(_FULL_TO_HALF_TRANS)
+
+
+class FullWidthStage(CleaningStage):
+    """
+    全角转半角（数字、字母、引号）
+
+    str.translate 对非 ASCII 文本逐字查表，只转换全角字符的片段要快得多
+    """
+
+    name = 'translate'
+
+    @override
+    def clean(self, text: str) -> str:
+        return _FULL_WIDTH_REGEX.sub(_to_half_width, text)
+
+
+class T2SStage(CleaningStage):
+    """繁体转简体（换行符是 OpenCC 的分词边界，按整行分块转换与整体转换结果一致）"""
+
+    name = 't2s'
+    per_line = True
+
+    def __init__(self, engine: T2SEngine | None = None):
+        self.engine = engine
+
+    @override
+    def clean(self, text: str) -> str:
+        return convert_t2s(text, self.engine)
+
+
+def default_cleaning_stages() -> list[CleaningStage]:
+    """按配置启用的清洗阶段（CLEAN_HTML / CLEAN_FULL_WIDTH / T2S_ENGINE），按执行顺序排列"""
+    stages: list[CleaningStage] = []
+    if settings.clean_html:
+        stages.append(HTMLStage())
+    if settings.clean_full_width:
+        stages.append(FullWidthStage())
+    if settings.t2s_engine != 'none':
+        stages.append(T2SStage())
+    return stages
+
+
+class CleaningPipeline:
     """
-    # 1. 去除 HTML 标签
-    content = clean_html(content)
+    清洗流水线：分块输入原始文本，按段落输出清洗后的内容
+
+    - 每块依次经过各阶段，最后清理多余换行（LineBreakCleaner），全文只遍历一次，
+      内存占用只与块大小和最长段落有关，与全文长度无关
+    - per_line 阶段之前按最后一个换行符切分，不完整的行留到下一块
+    - 每个阶段单独计时（stage_timer），换行清理记为 line_breaks
+    - 默认按配置启用各阶段；不清理换行（CLEAN_LINE_BREAKS=false）时每个非空行为一段
+
+    输出的段落不为空、不含换行且已去除首尾空白，与 clean_content 结果中以空行分隔的段落一致。
+    finish 之后可以输入新的文本。
+    """
+
+    def __init__(self, stages: list[CleaningStage] | None = None, line_breaks: bool | None = None):
+        self.stages = default_cleaning_stages() if stages is None else stages
+        if line_breaks is None:
+            line_breaks = settings.clean_line_breaks
+        self._line_breaks = LineBreakCleaner() if line_breaks else None
+        # 各 per_line 阶段（最后一项为按行输出）之前尚未遇到换行符的部分
+        self._partial_lines = [''] * (len(self.stages) + 1)
+
+    def feed(self, chunk: str) -> Iterator[str]:
+        """输入一块原始文本，输出已经确定的段落"""
+        yield from self._run(chunk, final=False)
+
+    def finish(self) -> Iterator[str]:
+        """输入结束，输出剩余的段落"""
+        yield from self._run('', final=True)
+
+    def clean(self, content: str, chunk_size: int = CLEAN_CHUNK_SIZE) -> list[str]:
+        """清洗完整的文本，返回全部段落（同样按块处理）"""
+        paragraphs: list[str] = []
+        for start in range(0, len(content), chunk_size):
+            paragraphs.extend(self.feed(content[start : start + chunk_size]))
+        paragraphs.extend(self.finish())
+        return paragraphs
 
-    # 2. 全角转半角
-    content = content.translate(_FULL_TO_HALF_TRANS)
+    def clean_line(self, line: str) -> str:
+        """单独清洗一行（执行各阶段并去掉首尾空白），与输出中独占一段的该行一致"""
+        for stage in self.stages:
+            line = stage.clean(line)
+        return line.strip()
 
-    # 3. 繁体转简体
-    converter = OpenCC('t2s')
-    content = converter.convert(content)
+    def _complete_lines(self, index: int, text: str, final: bool) -> str:
+        """取出到最后一个换行符为止的完整行，其余留到下一块（输入结束时全部取出）"""
+        text = self._partial_lines[index] + text
+        cut = len(text) if final else text.rfind('\n') + 1
+        self._partial_lines[index] = text[cut:]
+        return text[:cut]
 
-    # 4. 清理多余换行
-    content = clean_line_breaks(content)
+    def _run(self, text: str, final: bool) -> Iterator[str]:
+        for index, stage in enumerate(self.stages):
+            if stage.per_line:
+                text = self._complete_lines(index, text, final)
+            if not text and not final:
+                return
+            with stage_timer(stage.name):
+                text = stage.feed(text) + stage.finish() if final else stage.feed(text)
 
-    return content
+        if self._line_breaks is None:
+            lines = self._complete_lines(len(self.stages), text, final).split('\n')
+            paragraphs = [line for line in map(str.strip, lines) if line]
+        else:
+            # 先取出本块的全部段落再输出，耗时不计入下游处理段落的时间
+            with stage_timer('line_breaks'):
+                paragraphs = list(self._line_breaks.feed(text))
+                if final:
+                    paragraphs.extend(self._line_breaks.finish())
+        yield from paragraphs
@@ -0,0 +1,112 @@
+import re
+from functools import cache
+from typing import Literal
+
+from opencc_purepy import OpenCC
+from opencc_purepy.core import DELIMITERS
+
+from core.config import settings
+
+# 繁简转换引擎：
+# - fast: 预编译的最长匹配引擎（单字用 str.translate，词组只在可能的起始字处匹配）
+# - opencc: opencc_purepy 原实现
+# - none: 不做繁简转换
+T2SEngine = Literal['fast', 'opencc', 'none']
+
+
+@cache
+def get_opencc() -> OpenCC:
+    """获取共享的 OpenCC('t2s') 实例（构建时需要加载词典，只构建一次）"""
+    return OpenCC('t2s')
+
+
+class FastT2SConverter:
+    """
+    与 OpenCC('t2s').convert 结果一致的繁简转换器
+
+    OpenCC 在分隔符之间的片段内，从左到右按“最长词优先”匹配词组词典和单字词典。
+    这里将两个词典预编译为：
+    - 单字转换表：直接用 str.translate 转换
+    - 多字词表：按首字索引最大词长，只在首字命中的位置尝试最长匹配
+
+    词典中不存在包含分隔符的词，因此无需切分片段，匹配天然不会跨越分隔符。
+    """
+
+    def __init__(self, phrases: dict[str, str], characters: dict[str, str]):
+        # 同一个词在两个词典中都存在时，OpenCC 先查词组词典
+        merged = {**characters, **phrases}
+        # 分隔符本身不会被转换，包含分隔符的词永远不会被匹配
+        merged = {k: v for k, v in merged.items() if k and DELIMITERS.isdisjoint(k)}
+
+        singles = {k: v for k, v in merged.items() if len(k) == 1 and k != v}
+        self._char_table = str.maketrans(singles)
+
+        self._words = {k: v for k, v in merged.items() if len(k) > 1}
+        self._max_word_length: dict[str, int] = {}
+        for word in self._words:
+            self._max_word_length[word[0]] = max(self._max_word_length.get(word[0], 0), len(word))
+        self._word_start_regex = re.compile(
+            f'[{"".join(re.escape(c) for c in sorted(self._max_word_length))}]'
+        )
+
+        # 快速预检：只有包含会被改写的单字，或包含会被改写的词时，转换结果才可能与原文不同
+        self._changing_chars = frozenset(singles)
+        self._changing_words_by_start: dict[str, list[str]] = {}
+        for word, value in self._words.items():
+            if word != value:
+                self._changing_words_by_start.setdefault(word[0], []).append(word)
+
+    def needs_conversion(self, text: str) -> bool:
+        """判断文本是否包含需要转换的繁体字/词（不包含时转换结果必然与原文相同）"""
+        chars = set(text)
+        if not self._changing_chars.isdisjoint(chars):
+            return True
+        for start in chars.intersection(self._changing_words_by_start):
+            if any(word in text for word in self._changing_words_by_start[start]):
+                return True
+        return False
+
+    def convert(self, text: str) -> str:
+        result: list[str] = []
+        pos = 0
+        n = len(text)
+        for match in self._word_start_regex.finditer(text):
+            start = match.start()
+            if start < pos:
+                # 位于已匹配的词内部
+                continue
+            for length in range(min(self._max_word_length[text[start]], n - start), 1, -1):
+                value = self._words.get(text[start : start + length])
+                if value is not None:
+                    result.append(text[pos:start].translate(self._char_table))
+                    result.append(value)
+                    pos = start + length
+                    break
+        result.append(text[pos:].translate(self._char_table))
+        return ''.join(result)
+
+
+@cache
+def get_fast_converter() -> FastT2SConverter:
+    """获取共享的 FastT2SConverter 实例（复用 OpenCC 已加载的词典）"""
+    dictionary = get_opencc().dictionary
+    return FastT2SConverter(dictionary.ts_phrases[0], dictionary.ts_characters[0])
+
+
+def convert_t2s(text: str, engine: T2SEngine | None = None) -> str:
+    """
+    繁体转简体
+
+    参数:
+        text: 待转换文本
+        engine: 转换引擎，默认使用配置 settings.t2s_engine
+    """
+    engine = engine or settings.t2s_engine
+    if engine == 'none' or not text:
+        return text
+    # 大部分书籍本身就是简体，预检通过后直接跳过转换
+    if not get_fast_converter().needs_conversion(text):
+        return text
+    if engine == 'opencc':
+        return get_opencc().convert(text)
+    return get_fast_converter().convert(text)
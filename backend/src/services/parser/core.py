@@ -1,87 +1,334 @@
+import codecs
+import io
+import mmap
 import re
+from collections.abc import Iterable, Iterator
+from itertools import batched
 from pathlib import Path
-from typing import TypedDict
+from typing import NamedTuple, NotRequired, TypedDict
 
 from loguru import logger
 
-from .cleaner import clean_content
-from .utils import detect_encoding
-from .validator import is_line_chapter_title
+from core.metrics import stage_timer
+
+from .cleaner import CleaningPipeline
+from .utils import FileHash, detect_encoding
+from .validator import classify_chapter_titles
 
 
 class ChapterDict(TypedDict):
     title: str
     order_index: int
     content: list[str]
+    # 章节标题行是全文中的第几个标题行（前言为 -1），仅 index_chapters 记录
+    title_line_index: NotRequired[int]
+
+
+class SourceIndex(NamedTuple):
+    """章节在原文件中的位置（index-only 导入时代替正文保存）"""
+
+    encoding: str
+    # 每章的 (字节偏移, 字节长度)，按章节顺序排列，从标题行开始到下一章标题行之前
+    spans: list[tuple[int, int]]
 
 
-def parse_chapters(file_path: Path) -> list[ChapterDict]:
+# 流式解析时每次读取的字节数
+STREAM_CHUNK_SIZE = 256 * 1024
+# 少于该段落数的章节视为误判的标题，标题回退为正文
+MIN_CHAPTER_LINES = 5
+# 每批判断是否为章节标题的行数
+TITLE_CLASSIFY_BATCH_SIZE = 1024
+
+# 章节名中需要替换为空格的字符
+_TITLE_SANITIZE_REGEX = re.compile(r'[^\u4e00-\u9fffA-Za-z0-9， ]')
+
+
+def _resolve_encoding(file_path: Path) -> str:
     """
-    基于行扫描的章节解析逻辑
+    检测文件编码，并确认整个文件可以按该编码解码
+
+    检测失败或解码出错时回退到 gb18030（与整体读取时的回退逻辑一致）
     """
-    # 1. 读取并清洗 (自动检测编码)
     encoding = detect_encoding(file_path)
     try:
-        raw_content = file_path.read_text(encoding=encoding)
+        with open(file_path, encoding=encoding) as f:
+            while f.read(STREAM_CHUNK_SIZE):
+                pass
     except UnicodeDecodeError:
-        # Fallback to gb18030 if detection failed or was wrong
         logger.warning(f'Failed to read {file_path} with {encoding}, retrying with gb18030')
-        raw_content = file_path.read_text(encoding='gb18030', errors='strict')
+        encoding = 'gb18030'
+    return encoding
 
-    content = clean_content(raw_content)
 
-    # 2. 拆分为非空行
-    lines = [line.strip() for line in content.split('\n') if line.strip()]
+def _split_chapters(
+    lines: Iterable[str], default_title: str, title_lines: list[str] | None = None
+) -> Iterator[ChapterDict]:
+    """
+    将非空行序列切分为章节，每个章节确定后立即输出
 
-    if not lines:
-        raise ValueError(f'No content in file: {file_path}')
+    - 第一个章节为前言/默认章节（标题为 default_title）
+    - 段落数少于 MIN_CHAPTER_LINES 的章节视为误判：标题回退为上一章节的正文
+    - order_index 按输出顺序从 0 开始
+    - 传入 title_lines 时按顺序收集所有标题行（包括误判的），并在章节中记录 title_line_index
+    """
+    # 最近一个确认有效的章节（后续的短章节标题还会追加到它的末尾）
+    merged: ChapterDict | None = None
+    # 正在收集正文的章节
+    current = ChapterDict(title=default_title, order_index=-1, content=[])
+    if title_lines is not None:
+        current['title_line_index'] = -1
+    order_index = 0
 
-    # 3. 扫描章节
-    # 结构: [ {'title': str, 'content': str} ]
-    # 初始章节（前言/默认章节）
-    raw_chapters: list[ChapterDict] = [ChapterDict(title=file_path.stem, order_index=-1, content=[])]
+    def close_current() -> ChapterDict | None:
+        """结束当前章节，返回因此而确定的上一个章节"""
+        nonlocal merged, order_index
+        if merged is None:
+            merged = current
+            return None
+        if len(current['content']) < MIN_CHAPTER_LINES:
+            # 短章节 -> 标题回退为正文，追加到上一个章节的末尾
+            merged['content'].append(current['title'])
+            return None
+        done, merged = merged, current
+        done['order_index'] = order_index
+        order_index += 1
+        return done
 
-    for line in lines:
-        if is_line_chapter_title(line):
-            # 发现新章节
-            raw_chapters.append(
-                ChapterDict(
+    # 分批判断章节标题（批大小固定，流式解析时内存占用不随文件增长）
+    for batch in batched(lines, TITLE_CLASSIFY_BATCH_SIZE):
+        with stage_timer('classify_titles'):
+            flags = classify_chapter_titles(batch)
+        for line, is_title in zip(batch, flags):
+            if is_title:
+                # 发现新章节
+                done = close_current()
+                if done is not None:
+                    yield done
+                current = ChapterDict(
                     # 将章节名里的 ASCII 符号转换为空格并去掉头尾空格
-                    title=re.sub(
-                        r'[^\u4e00-\u9fffA-Za-z0-9， ]',
-                        ' ',
-                        line,
-                    ).strip(),
+                    title=_TITLE_SANITIZE_REGEX.sub(' ', line).strip(),
                     order_index=-1,
                     content=[],
                 )
-            )
-        else:
-            # 是正文，归属到当前章节
-            if raw_chapters[-1]['content']:
-                raw_chapters[-1]['content'].append(line)
+                if title_lines is not None:
+                    current['title_line_index'] = len(title_lines)
+                    title_lines.append(line)
             else:
-                raw_chapters[-1]['content'] = [line]
-
-    # 4. 后处理：合并空章节
-    merged_chapters: list[ChapterDict] = []
-
-    for i, chapter in enumerate(raw_chapters):
-        if i == 0:
-            merged_chapters.append(chapter)
-            continue
-
-        # 检查当前章节是否为空（或者内容非常少，可能是误判的标题）
-        if len(chapter['content']) < 5:
-            # 短章节 -> 标题回退为正文
-            # 追加到 上一个章节(merged_chapters[-1]) 的末尾
-            merged_chapters[-1]['content'].append(chapter['title'])
-        else:
-            merged_chapters.append(chapter)
-
-    # 5. 计算 order_index
-    for i, chapter in enumerate(merged_chapters):
-        chapter['order_index'] = i
-
-    logger.info(f'Parsed {len(merged_chapters)} chapters from {file_path}')
-    return merged_chapters
+                # 是正文，归属到当前章节
+                current['content'].append(line)
+
+    done = close_current()
+    if done is not None:
+        yield done
+    if merged is not None:
+        merged['order_index'] = order_index
+        yield merged
+
+
+def parse_chapters(
+    file_path: Path, file_hash: FileHash | None = None, encoding: str | None = None
+) -> list[ChapterDict]:
+    """
+    基于行扫描的章节解析逻辑
+
+    传入 file_hash 时在读取文件的同时计算哈希；
+    指定 encoding 时不检测编码，解码出错时直接抛出 UnicodeDecodeError（由调用方决定如何回退）
+    """
+    # 1. 读取 (未指定编码时自动检测)
+    data = file_path.read_bytes()
+    if file_hash is not None:
+        file_hash.update(data)
+    if encoding is not None:
+        with stage_timer('decode'):
+            raw_content = data.decode(encoding)
+    else:
+        encoding = detect_encoding(file_path)
+        try:
+            with stage_timer('decode'):
+                raw_content = data.decode(encoding)
+        except UnicodeDecodeError:
+            # Fallback to gb18030 if detection failed or was wrong
+            logger.warning(f'Failed to read {file_path} with {encoding}, retrying with gb18030')
+            raw_content = data.decode('gb18030', errors='strict')
+    # 与按文本模式读取文件时一样转换换行符
+    if '\r' in raw_content:
+        raw_content = raw_content.replace('\r\n', '\n').replace('\r', '\n')
+
+    # 2. 清洗并拆分为段落（非空行）
+    lines = CleaningPipeline().clean(raw_content)
+
+    if not lines:
+        raise ValueError(f'No content in file: {file_path}')
+
+    # 3. 扫描章节并合并空章节
+    chapters = list(_split_chapters(lines, file_path.stem))
+
+    logger.info(f'Parsed {len(chapters)} chapters from {file_path}')
+    return chapters
+
+
+def iter_chapters(
+    file_path: Path, chunk_size: int = STREAM_CHUNK_SIZE, encoding: str | None = None
+) -> Iterator[ChapterDict]:
+    """
+    流式章节解析：与 parse_chapters 结果一致，但按块读取、增量清洗，每个章节确定后立即输出
+
+    内存占用与最长的章节成正比，而不是整个文件。
+    未指定 encoding 时先检测编码并读取全文确认可以解码（输出章节后无法再回退编码）。
+    """
+    yield from _iter_chapters(file_path, encoding or _resolve_encoding(file_path), chunk_size)
+
+
+def read_chapters(
+    file_path: Path,
+    file_hash: FileHash | None = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    encoding: str | None = None,
+) -> list[ChapterDict]:
+    """
+    流式解析全部章节（结果与 iter_chapters 一致），传入 file_hash 时在同一遍读取中计算哈希
+
+    不预先读取全文校验编码，只在解码出错时按 gb18030 重新读取，通常只读取一遍文件；
+    指定 encoding 时不检测也不回退，解码出错时抛出 UnicodeDecodeError
+    """
+    chapters, _ = _read_chapters(file_path, chunk_size, file_hash, encoding=encoding)
+    return chapters
+
+
+def _read_chapters(
+    file_path: Path,
+    chunk_size: int,
+    file_hash: FileHash | None = None,
+    title_lines: list[str] | None = None,
+    encoding: str | None = None,
+) -> tuple[list[ChapterDict], str]:
+    """解析全部章节，返回章节和实际使用的编码"""
+    if encoding is not None:
+        return list(_iter_chapters(file_path, encoding, chunk_size, title_lines, file_hash)), encoding
+    encoding = detect_encoding(file_path)
+    try:
+        return list(_iter_chapters(file_path, encoding, chunk_size, title_lines, file_hash)), encoding
+    except UnicodeDecodeError:
+        logger.warning(f'Failed to read {file_path} with {encoding}, retrying with gb18030')
+    if file_hash is not None:
+        file_hash.reset()
+    if title_lines is not None:
+        title_lines.clear()
+    return list(_iter_chapters(file_path, 'gb18030', chunk_size, title_lines, file_hash)), 'gb18030'
+
+
+def _iter_chapters(
+    file_path: Path,
+    encoding: str,
+    chunk_size: int,
+    title_lines: list[str] | None = None,
+    file_hash: FileHash | None = None,
+) -> Iterator[ChapterDict]:
+    line_count = 0
+
+    def iter_lines() -> Iterator[str]:
+        nonlocal line_count
+        cleaner = CleaningPipeline()
+        # 按字节读取（同时更新哈希）并增量解码，与文本模式一样转换换行符
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                if file_hash is not None:
+                    file_hash.update(chunk)
+                with stage_timer('decode'):
+                    text = decoder.decode(chunk)
+                for line in cleaner.feed(text):
+                    line_count += 1
+                    yield line
+        for line in cleaner.feed(decoder.decode(b'', final=True)):
+            line_count += 1
+            yield line
+        for line in cleaner.finish():
+            line_count += 1
+            yield line
+
+    chapter_count = 0
+    for chapter in _split_chapters(iter_lines(), file_path.stem, title_lines):
+        # 标题行也计入 line_count，因此输出第一个章节时仍为 0 说明文件没有任何内容
+        if line_count == 0:
+            raise ValueError(f'No content in file: {file_path}')
+        chapter_count += 1
+        yield chapter
+
+    logger.info(f'Parsed {chapter_count} chapters from {file_path}')
+
+
+def index_chapters(
+    file_path: Path,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    file_hash: FileHash | None = None,
+    encoding: str | None = None,
+) -> tuple[list[ChapterDict], SourceIndex | None]:
+    """
+    流式解析章节，并定位每章在原文件中的字节范围（index-only 导入）
+
+    无法定位时（如 UTF-16 等换行符不是单字节的编码，或标题行无法与原文件的行对应）返回的 SourceIndex 为 None。
+    传入 file_hash 时在解析读取文件的同时计算哈希；encoding 与 read_chapters 相同。
+    """
+    title_lines: list[str] = []
+    chapters, encoding = _read_chapters(file_path, chunk_size, file_hash, title_lines, encoding)
+    spans = _locate_chapters(file_path, encoding, chapters, title_lines)
+    if spans is None:
+        logger.warning(f'Failed to locate chapters in {file_path}')
+        return chapters, None
+    return chapters, SourceIndex(encoding, spans)
+
+
+def _locate_chapters(
+    file_path: Path, encoding: str, chapters: list[ChapterDict], title_lines: list[str]
+) -> list[tuple[int, int]] | None:
+    """
+    按顺序将清洗后的标题行与原文件的行一一对应，得到每章起始行的字节偏移
+
+    标题行通常独占一行，先按字符数筛选原文件的行，再单独清洗比较，避免重新清洗全文；
+    标题行由多行合并而成等无法对应的情况返回 None。
+    """
+    # 只支持换行符为单字节的编码（UTF-8 的 BOM 只在文件开头）
+    if not 'a\n'.encode(encoding).endswith(b'a\n'):
+        return None
+    starts: list[int] = []
+    pipeline = CleaningPipeline()
+    with file_path.open('rb') as f:
+        size = f.seek(0, 2)
+        if size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            position = 0
+            for title_line in title_lines:
+                while True:
+                    if position >= size:
+                        return None
+                    end = mm.find(b'\n', position)
+                    end = size if end < 0 else end + 1
+                    line = mm[position:end].decode(encoding).strip()
+                    line_start, position = position, end
+                    # 含 HTML 标签或实体的行清洗后长度会变化，不能按长度筛选
+                    maybe_title = '<' in line or '&' in line or len(line) == len(title_line)
+                    if maybe_title and pipeline.clean_line(line) == title_line:
+                        starts.append(line_start)
+                        break
+
+    offsets = [
+        0 if chapter['title_line_index'] < 0 else starts[chapter['title_line_index']] for chapter in chapters
+    ]
+    ends = [*offsets[1:], size]
+    return [(start, end - start) for start, end in zip(offsets, ends, strict=True)]
+
+
+def parse_chapter_source(data: bytes, encoding: str, default_title: str) -> ChapterDict:
+    """
+    解析原文件中的一章（index_chapters 定位的字节范围）
+
+    结果与解析整个文件时的该章一致（前言章节的标题为 default_title）
+    """
+    # 与按文本模式读取文件时一样转换换行符
+    text = data.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+    lines = CleaningPipeline().clean(text)
+    # 字节范围从本章标题行开始，其后误判的短章节标题已回退为正文，最后一个章节即为本章
+    *_, chapter = _split_chapters(lines, default_title)
+    return chapter
@@ -1,44 +1,189 @@
+import codecs
 import hashlib
 from pathlib import Path
+from typing import BinaryIO, NamedTuple
 
-from chardet import detect
+from chardet.universaldetector import UniversalDetector
 from loguru import logger
 
+from core.config import settings
+
+# 检测编码时每次读取的字节数
+ENCODING_SAMPLE_SIZE = 16 * 1024
+# 每次输入 chardet 的字节数（常见的中文文本通常几 KB 就能得出结论）
+ENCODING_DETECT_STEP = 4 * 1024
+# BOM -> 编码（UTF-32 LE 的 BOM 以 UTF-16 LE 的 BOM 开头，需要先判断）
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+# chardet 返回的编码 -> 实际使用的编码（GB2312 / GBK 统一按超集 GB18030 解码，ASCII 按 UTF-8 解码）
+_ENCODING_ALIASES = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'ascii': 'utf-8'}
+
+
+_ASCII_BYTES = bytes(range(128))
+
+
+class DetectedEncoding(NamedTuple):
+    encoding: str
+    # 检测方式：bom / utf-8（严格 UTF-8 解码成功）/ cached（书籍记录的编码）/
+    # detector（chardet）/ default（检测失败）
+    method: str
+
 
 def detect_encoding(file_path: Path) -> str:
     """
     检测文件编码
 
-    使用 chardet 检测文件编码
-    返回编码名称（如 'utf-8', 'gb18030'）
+    返回编码名称（如 'utf-8', 'gb18030'），检测过程见 detect_file_encoding
+    """
+    return detect_file_encoding(file_path).encoding
+
+
+def detect_file_encoding(file_path: Path, known_encoding: str | None = None) -> DetectedEncoding:
+    """
+    检测文件编码，依次尝试（只读取文件开头，最多 ENCODING_DETECT_BUDGET 字节）：
+
+    1. BOM
+    2. 严格 UTF-8 解码：读到的内容可以按 UTF-8 解码即使用 UTF-8（全是 ASCII 时继续读取，直到出现非 ASCII）
+    3. known_encoding（书籍上次解析时使用的编码）：可以解码读到的内容时直接使用，省去 chardet
+    4. chardet 的 UniversalDetector：逐块输入，有结论或达到预算时停止
 
     注意：charset-normalizer 在某些文件上可能返回 None，因此使用 chardet
     """
-    # 读取前 1024 字节进行检测（对于大文件更高效）
+    budget = max(settings.encoding_detect_budget, ENCODING_SAMPLE_SIZE)
+    chunks: list[bytes] = []
     with open(file_path, 'rb') as f:
-        sample = f.read(1024)
+        head = f.read(ENCODING_SAMPLE_SIZE)
+        for bom, encoding in _BOMS:
+            if head.startswith(bom):
+                return DetectedEncoding(encoding, 'bom')
+
+        # 严格 UTF-8：找到第一块含非 ASCII 字符的内容
+        size = 0
+        chunk = head
+        utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            while chunk:
+                chunks.append(chunk)
+                size += len(chunk)
+                utf8_decoder.decode(chunk)
+                if not chunk.isascii() or size >= budget:
+                    return DetectedEncoding('utf-8', 'utf-8')
+                chunk = f.read(ENCODING_SAMPLE_SIZE)
+            utf8_decoder.decode(b'', final=True)
+            return DetectedEncoding('utf-8', 'utf-8')
+        except UnicodeDecodeError:
+            pass
+
+        if known_encoding is not None and _can_decode(chunks, known_encoding):
+            return DetectedEncoding(known_encoding, 'cached')
+
+        # chardet 是纯 Python 实现，很慢：开头的 ASCII 内容不影响检测结果，从第一个非 ASCII 字节开始，
+        # 每次输入 ENCODING_DETECT_STEP 字节，有结论后立即停止
+        detector = UniversalDetector()
+        chunk = chunks[-1]
+        chunk = chunk[len(chunk) - len(chunk.lstrip(_ASCII_BYTES)) :]
+        while chunk:
+            for start in range(0, len(chunk), ENCODING_DETECT_STEP):
+                detector.feed(chunk[start : start + ENCODING_DETECT_STEP])
+                if detector.done:
+                    break
+            if detector.done or size >= budget:
+                break
+            chunk = f.read(ENCODING_SAMPLE_SIZE)
+            size += len(chunk)
+        detector.close()
 
-    result = detect(sample)
-    encoding = result.get('encoding', None)
+    encoding = detector.result.get('encoding')
     # 如果检测失败，默认使用 gb18030（常见的中文编码）
     if not encoding:
         logger.warning(f'Failed to detect encoding for {file_path}, using default encoding gb18030')
-        encoding = 'gb18030'
-    # 统一处理 GB2312 -> GB18030
-    if encoding.lower() == 'gb2312':
-        encoding = 'gb18030'
-    return encoding.lower()
+        return DetectedEncoding('gb18030', 'default')
+    encoding = encoding.lower()
+    return DetectedEncoding(_ENCODING_ALIASES.get(encoding, encoding), 'detector')
 
 
-def calculate_file_hash(file_path: Path) -> str:
+def _can_decode(chunks: list[bytes], encoding: str) -> bool:
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+    except LookupError:
+        return False
+    try:
+        for chunk in chunks:
+            decoder.decode(chunk)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+# 读取文件计算哈希时每次读取的字节数
+FILE_HASH_CHUNK_SIZE = 1024 * 1024
+# hash_id 使用 160 位 BLAKE2b（40 个十六进制字符），旧版本使用 MD5（32 个字符），按长度区分
+FILE_HASH_DIGEST_SIZE = 20
+LEGACY_HASH_LENGTH = 32
+
+
+class FileHash:
     """
-    计算文件内容的 MD5 哈希值
+    文件内容哈希（hash_id），可在解析读取文件的同一遍中逐块更新
 
-    用于检测文件是否被修改
+    legacy 为 True 时同时计算旧版本的 MD5，用于与数据库中尚未迁移的 hash_id 比较
     """
-    hash_md5 = hashlib.md5()
+
+    def __init__(self, legacy: bool = False) -> None:
+        self._legacy = legacy
+        self.reset()
+
+    def reset(self) -> None:
+        """重新开始计算（解析时编码回退、重新读取文件）"""
+        self._hash = hashlib.blake2b(digest_size=FILE_HASH_DIGEST_SIZE)
+        self._md5 = hashlib.md5() if self._legacy else None
+
+    def update(self, data: bytes) -> None:
+        self._hash.update(data)
+        if self._md5 is not None:
+            self._md5.update(data)
+
+    def update_from(self, f: BinaryIO) -> None:
+        """读取文件的剩余内容"""
+        while chunk := f.read(FILE_HASH_CHUNK_SIZE):
+            self.update(chunk)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def legacy_hexdigest(self) -> str:
+        assert self._md5 is not None
+        return self._md5.hexdigest()
+
+    def matches(self, hash_id: str) -> bool:
+        """是否与已记录的 hash_id（新版本或旧版本的 MD5）一致"""
+        if self._md5 is not None and is_legacy_hash(hash_id):
+            return self.legacy_hexdigest() == hash_id
+        return self.hexdigest() == hash_id
+
+
+def is_legacy_hash(hash_id: str) -> bool:
+    """是否为旧版本的 MD5 hash_id"""
+    return len(hash_id) == LEGACY_HASH_LENGTH
+
+
+def hash_file(file_path: Path, legacy: bool = False) -> FileHash:
+    """读取整个文件计算哈希（按 1 MiB 分块读取）"""
+    file_hash = FileHash(legacy)
     with open(file_path, 'rb') as f:
-        # 分块读取，避免大文件占用过多内存
-        for chunk in iter(lambda: f.read(4096), b''):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+        file_hash.update_from(f)
+    return file_hash
+
+
+def calculate_file_hash(file_path: Path) -> str:
+    """
+    计算文件内容的哈希（BLAKE2b）
+
+    用于检测文件内容是否变化；需要解析的文件应在解析时计算（传入 FileHash），避免重复读取
+    """
+    return hash_file(file_path).hexdigest()
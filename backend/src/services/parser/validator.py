@@ -1,4 +1,5 @@
 import re
+from collections.abc import Sequence
 
 # --- 基础子模式 ---
 # 中文数字: 一到七位 (如: 一千七百二十一)
@@ -37,29 +38,26 @@ def _generate_chapter_regex() -> re.Pattern[str]:
 
 _CHAPTER_REGEX = _generate_chapter_regex()
 
+# --- 预筛选 ---
+# _CHAPTER_REGEX 的每个分支都要求行内出现以下内容之一：
+# 数字（分支 2、5）、“第”（分支 1）、“分卷阅读”（分支 3）、“章节目录”（分支 4），
+# 或者行首（含换行后的行首）是特殊关键词（分支 6）
+_PREFILTER_CHAR_REGEX = re.compile(r'[\d第\n]')
+_SPECIAL_WORD_INITIALS = frozenset(word[0] for word in _SPECIAL_WORDS.strip('()').split('|'))
 
-def is_line_chapter_title(line: str) -> bool:
-    """
-    判断某一行是否为章节标题
-    """
-    line = line.strip()
-
-    # 0. 基础过滤
-    if not line:
-        # 出现这种情况是有问题的, 空内容在前面就拦截掉了
-        raise ValueError('Line is empty')
 
-    # 1. 长度校验
-    # 如果标题行太长（超过 30 字），极有可能不是标题而是正文
-    if len(line) > 30:
-        return False
+def _is_title_candidate(line: str) -> bool:
+    """预筛选：返回 False 的行一定不会匹配 _CHAPTER_REGEX"""
+    return (
+        line[0] in _SPECIAL_WORD_INITIALS
+        or _PREFILTER_CHAR_REGEX.search(line) is not None
+        or '分卷阅读' in line
+        or '章节目录' in line
+    )
 
-    # 2. 标点符号校验 (结尾不应该是逗号、顿号、冒号，且一般不包括句号)
-    if line.endswith(('，', '、', '：')):
-        return False
-    if '。' in line:
-        return False
 
+def _match_title(line: str) -> bool:
+    """对已去除首尾空白、通过长度和标点校验的行执行正则匹配和前后缀校验"""
     # 3. 正则匹配
     match = _CHAPTER_REGEX.search(line)
     if not match:
@@ -89,3 +87,53 @@ def is_line_chapter_title(line: str) -> bool:
             return False
 
     return True
+
+
+def is_line_chapter_title(line: str) -> bool:
+    """
+    判断某一行是否为章节标题
+    """
+    line = line.strip()
+
+    # 0. 基础过滤
+    if not line:
+        # 出现这种情况是有问题的, 空内容在前面就拦截掉了
+        raise ValueError('Line is empty')
+
+    # 1. 长度校验
+    # 如果标题行太长（超过 30 字），极有可能不是标题而是正文
+    if len(line) > 30:
+        return False
+
+    # 2. 标点符号校验 (结尾不应该是逗号、顿号、冒号，且一般不包括句号)
+    if line.endswith(('，', '、', '：')):
+        return False
+    if '。' in line:
+        return False
+
+    return _match_title(line)
+
+
+def classify_chapter_titles(lines: Sequence[str]) -> list[bool]:
+    """
+    批量判断每一行是否为章节标题，返回与 lines 等长的布尔列表
+
+    结果与逐行调用 is_line_chapter_title 完全一致，但先用廉价的预筛选排除
+    不可能匹配的行（绝大多数正文行），只对候选行执行完整的正则匹配。
+    """
+    mask: list[bool] = []
+    append = mask.append
+    for raw_line in lines:
+        line = raw_line.strip()
+        if not line:
+            raise ValueError('Line is empty')
+        if (
+            len(line) > 30
+            or line.endswith(('，', '、', '：'))
+            or '。' in line
+            or not _is_title_candidate(line)
+        ):
+            append(False)
+        else:
+            append(_match_title(line))
+    return mask
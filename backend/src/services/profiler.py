@@ -0,0 +1,213 @@
+"""
+按需性能剖析：对单次扫描中的每本书或单个请求使用 cProfile，结果保存到 PROFILES_DIR
+
+- 扫描：POST /api/scan?profile=true，子进程中的解析与扫描线程中的写入合并为一个文件，
+  只保存耗时不少于 PROFILE_MIN_SECONDS 的书籍（文件名包含书籍路径）
+- 重新解析：POST /api/books/{book_id}/reparse?profile=true
+- 请求：请求头 X-Profile: 1（已登录或未启用身份验证时有效），剖析整个请求处理过程
+- 最多保留 PROFILE_MAX_FILES 个文件，超出时删除最旧的文件
+
+cProfile 记录进程内的所有线程，同一时间只能有一个剖析在运行：已有剖析在运行时跳过（记录警告）。
+解析子进程各自剖析，不受影响。
+
+保存的 .prof 文件可以用 pstats / snakeviz 等工具查看，
+GET /api/system/profiles/{name}?format=text 返回文本摘要。
+"""
+
+import cProfile
+import io
+import pstats
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from pydantic import BaseModel
+
+from core.config import settings
+from core.security import verify_token
+
+PROFILE_SUFFIX = '.prof'
+PROFILE_HEADER = b'x-profile'
+# pstats 的原始数据（{函数: 统计}），可跨进程传递
+ProfileStats = dict[tuple[str, int, str], Any]
+
+_UNSAFE_CHARS_REGEX = re.compile(r'[^\w.-]+')
+_PROFILE_NAME_REGEX = re.compile(r'^[\w.-]+\.prof$')
+# 本进程中正在运行的剖析
+_active = threading.Lock()
+
+
+class ProfileInfo(BaseModel):
+    name: str
+    size: int
+    created: float
+
+
+class _RawStats:
+    """让 pstats.Stats 可以从跨进程传来的原始数据构造"""
+
+    def __init__(self, stats: ProfileStats) -> None:
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+def start_profiler() -> cProfile.Profile | None:
+    """开始剖析，已有剖析在运行时返回 None"""
+    if not _active.acquire(blocking=False):
+        logger.warning('Another profile is running, skipping')
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 其他剖析工具（如调试器）正在运行
+        _active.release()
+        logger.warning('Another profiling tool is active, skipping')
+        return None
+    return profiler
+
+
+def collect_stats(profiler: cProfile.Profile | None) -> ProfileStats | None:
+    """停止剖析并返回原始数据"""
+    if profiler is None:
+        return None
+    profiler.disable()
+    _active.release()
+    profiler.create_stats()
+    return profiler.stats  # pyright: ignore[reportAttributeAccessIssue]
+
+
+def save_profile(kind: str, name: str, *parts: ProfileStats | None, min_seconds: float = 0.0) -> Path | None:
+    """
+    合并多段剖析数据并保存（跳过为 None 的部分），总耗时少于 min_seconds 时不保存
+
+    文件名为 {时间}-{kind}-{name}.prof（name 中的路径分隔符等替换为下划线）
+    """
+    collected = [part for part in parts if part is not None]
+    if not collected:
+        return None
+    stats = pstats.Stats(_RawStats(collected[0]))
+    for part in collected[1:]:
+        stats.add(_RawStats(part))
+    if stats.total_tt < min_seconds:  # pyright: ignore[reportAttributeAccessIssue]
+        return None
+    profiles_dir = settings.profiles_dir
+    profiles_dir.mkdir(parents=True, exist_ok=True)
+    slug = _UNSAFE_CHARS_REGEX.sub('_', name).strip('_')[:120]
+    path = profiles_dir / f'{datetime.now():%Y%m%d-%H%M%S-%f}-{kind}-{slug}{PROFILE_SUFFIX}'
+    stats.dump_stats(path)
+    logger.info(f'Saved profile: {path.name}')
+    _prune_profiles(profiles_dir)
+    return path
+
+
+@contextmanager
+def profiled(
+    kind: str,
+    name: str,
+    enabled: bool = True,
+    previous: ProfileStats | None = None,
+    min_seconds: float = 0.0,
+) -> Iterator[None]:
+    """
+    剖析代码块并保存（enabled 为 False 时不做任何事）
+
+    previous 为之前（如在解析子进程中）剖析的数据，与本次的结果合并为一个文件
+    """
+    if not enabled:
+        yield
+        return
+    profiler = start_profiler()
+    try:
+        yield
+    finally:
+        save_profile(kind, name, previous, collect_stats(profiler), min_seconds=min_seconds)
+
+
+def _prune_profiles(profiles_dir: Path) -> None:
+    """只保留最新的 PROFILE_MAX_FILES 个文件"""
+    paths = sorted(profiles_dir.glob(f'*{PROFILE_SUFFIX}'))
+    for path in paths[: max(0, len(paths) - settings.profile_max_files)]:
+        path.unlink(missing_ok=True)
+
+
+def list_profiles() -> list[ProfileInfo]:
+    """已保存的剖析文件，最新的在前"""
+    if not settings.profiles_dir.is_dir():
+        return []
+    profiles = []
+    for path in settings.profiles_dir.glob(f'*{PROFILE_SUFFIX}'):
+        stat = path.stat()
+        profiles.append(ProfileInfo(name=path.name, size=stat.st_size, created=stat.st_mtime))
+    profiles.sort(key=lambda profile: profile.name, reverse=True)
+    return profiles
+
+
+def get_profile_path(name: str) -> Path | None:
+    """按文件名查找剖析文件（只接受 list_profiles 返回的文件名格式，防止路径穿越）"""
+    if not _PROFILE_NAME_REGEX.match(name):
+        return None
+    path = settings.profiles_dir / name
+    return path if path.is_file() else None
+
+
+def format_profile(path: Path, sort: str = 'cumulative', limit: int = 50) -> str:
+    """剖析文件的文本摘要（按 sort 排序的前 limit 个函数）"""
+    output = io.StringIO()
+    stats = pstats.Stats(str(path), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def _request_authorized(headers: list[tuple[bytes, bytes]]) -> bool:
+    """未启用身份验证，或请求带有有效的 Token"""
+    if not settings.app_password:
+        return True
+    for key, value in headers:
+        if key == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            return scheme.lower() == 'bearer' and verify_token(token) is not None
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    请求头 X-Profile 为 1 / true 时剖析该请求（纯 ASGI 中间件）
+
+    剖析期间进程内的其他活动（并发的请求、扫描线程）也会被记录
+    """
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http' or not self._wants_profile(scope['headers']):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        profiler = start_profiler()
+        if profiler is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stats = collect_stats(profiler)
+            logger.info(f'Profiled {scope["method"]} {scope["path"]} in {time.perf_counter() - start:.3f} s')
+            save_profile('request', f'{scope["method"]} {scope["path"]}', stats)
+
+    @staticmethod
+    def _wants_profile(headers: list[tuple[bytes, bytes]]) -> bool:
+        for key, value in headers:
+            if key == PROFILE_HEADER:
+                return value.lower() in (b'1', b'true') and _request_authorized(headers)
+        return False
@@ -1,15 +1,52 @@
-"""扫描服务：目录扫描和文件处理"""
-
-import asyncio
-
-from pydantic import BaseModel
+"""
+扫描服务：目录扫描和文件处理
+
+扫描在独立的工作线程中执行，使用自己的数据库会话，不占用 API 的事件循环
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple
+
+from loguru import logger
+from pydantic import BaseModel, Field
+from sqlalchemy import Engine
 from sqlmodel import Session, select
-from sqlmodel.sql.expression import col
 
 from core.config import settings
+from core.database import engine
+from core.metrics import mark_worker_process, metrics
 from core.models import Book
 
-from .book_service import create_or_update_book
+from .body_store import savepoint
+from .book_service import (
+    EncodingStats,
+    ParsedBook,
+    delete_books,
+    encoding_stats,
+    parse_book_file,
+    save_parsed_book,
+)
+from .cache import chapter_cache
+from .profiler import profiled
+
+
+class WatcherStatus(BaseModel):
+    """目录监视的状态（累计值，不随扫描重置）"""
+
+    is_running: bool = False
+    backend: str = ''  # inotify 等系统事件（watchfiles）/ polling
+    pending_files: int = 0  # 等待防抖结束的文件数
+    files_added: int = 0
+    files_updated: int = 0
+    files_moved: int = 0
+    files_removed: int = 0
+    error: str | None = None
 
 
 # 全局扫描状态
@@ -18,9 +55,13 @@ class ScanStatus(BaseModel):
     files_scanned: int
     files_added: int
     files_updated: int
+    files_skipped: int  # 解析或写入失败而跳过的文件数（也计入 files_scanned）
     total_files: int
     current_file: str
     error: str | None
+    watcher: WatcherStatus = Field(default_factory=WatcherStatus)
+    # 编码检测统计（所有解析过的书籍，包括目录监视和手动重新解析）
+    encoding: EncodingStats = Field(default_factory=lambda: encoding_stats)
 
 
 _scan_status = ScanStatus(
@@ -28,6 +69,7 @@ _scan_status = ScanStatus(
     files_scanned=0,
     files_added=0,
     files_updated=0,
+    files_skipped=0,
     total_files=0,
     current_file='',
     error=None,
@@ -45,18 +87,117 @@ def reset_scan_status() -> None:
     _scan_status.files_scanned = 0
     _scan_status.files_added = 0
     _scan_status.files_updated = 0
+    _scan_status.files_skipped = 0
     _scan_status.total_files = 0
     _scan_status.current_file = ''
     _scan_status.error = None
 
 
-async def scan_directory(session: Session, full_scan: bool = False) -> None:
+class BookSnapshot(NamedTuple):
+    """扫描开始时数据库中记录的书籍文件信息"""
+
+    file_size: int
+    file_mtime: float
+    hash_id: str
+    book_id: int
+    encoding: str | None
+
+
+def load_snapshot(session: Session) -> dict[str, BookSnapshot]:
+    """一次查询读取所有书籍的 {path: BookSnapshot}"""
+    statement = select(Book.path, Book.file_size, Book.file_mtime, Book.hash_id, Book.id, Book.encoding)
+    return {path: BookSnapshot(*rest) for path, *rest in session.exec(statement)}
+
+
+def walk_txt_files(books_dir: Path) -> Iterator[tuple[str, str, os.stat_result]]:
+    """
+    使用 os.scandir 递归遍历目录下的所有 TXT 文件，返回 (相对路径, 绝对路径, stat)
+
+    scandir 遍历目录时已得到文件类型，只对 TXT 文件调用 stat，不读取文件内容；
+    不进入指向目录的符号链接（与 Path.rglob 一致），无法读取的目录记录警告后跳过
+    """
+    stack = [('', str(books_dir))]
+    while stack:
+        relative_dir, directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((relative_path, entry.path))
+                    elif entry.name.endswith('.txt') and entry.is_file():
+                        yield relative_path, entry.path, entry.stat()
+        except OSError as e:
+            logger.warning(f'Failed to scan directory {directory}: {e}')
+
+
+def _create_parse_executor() -> ProcessPoolExecutor:
+    """创建解析进程池（使用 spawn，避免在多线程的服务进程中 fork；子进程记录的指标随解析结果传回）"""
+    return ProcessPoolExecutor(
+        max_workers=settings.scan_worker_count,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=mark_worker_process,
+    )
+
+
+class ScanWorker:
+    """扫描工作线程，同一时间只运行一个扫描"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, full_scan: bool = False, profile: bool = False) -> bool:
+        """在工作线程中启动扫描并立即返回，已有扫描在运行（包括已请求停止但尚未结束）时返回 False"""
+        with self._lock:
+            if _scan_status.is_running or (self._thread is not None and self._thread.is_alive()):
+                return False
+            # 线程启动前就标记为运行中，避免重复启动
+            reset_scan_status()
+            _scan_status.is_running = True
+            self._thread = threading.Thread(
+                target=scan_directory,
+                kwargs={'full_scan': full_scan, 'profile': profile},
+                name='scanner',
+                daemon=True,
+            )
+            self._thread.start()
+        return True
+
+    def join(self, timeout: float | None = None) -> None:
+        """等待当前扫描结束"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+scan_worker = ScanWorker()
+
+
+def start_scan(full_scan: bool = False, profile: bool = False) -> bool:
+    """在后台工作线程中启动扫描，返回 False 表示已有扫描在运行"""
+    return scan_worker.start(full_scan, profile)
+
+
+def scan_directory(full_scan: bool = False, db_engine: Engine | None = None, profile: bool = False) -> None:
     """
-    扫描书籍目录
+    扫描书籍目录（阻塞执行，由 start_scan 在工作线程中调用）
+
+    扫描开始时一次性读取数据库中所有书籍的文件信息（load_snapshot），与目录遍历的结果（walk_txt_files）比较：
+    增量扫描只解析大小或修改时间变化的文件，未变化的文件不会被打开；数据库中有、目录中没有的书籍批量删除。
+
+    变化的文件分为两个阶段处理：
+    1. 解析阶段：在进程池中并行计算哈希和解析章节（parse_book_file）
+    2. 写入阶段：按完成顺序逐个写入数据库（save_parsed_book），同一时间只有一个写入者；
+       每 SCAN_COMMIT_BATCH_SIZE 本书或 SCAN_COMMIT_INTERVAL 秒提交一次。
+       每本书在各自的 SAVEPOINT 中写入，写入失败时只回滚该书并跳过；
+       批次提交失败时回滚，批次内的书籍重新解析后再写入一次，再次失败时跳过
+
+    解析或写入失败的文件计入 files_skipped，error 记录最后一个错误
 
     参数:
-        session: 数据库会话
         full_scan: 是否执行全量扫描（True）或增量扫描（False）
+        db_engine: 数据库引擎（默认使用全局引擎），扫描使用自己的会话
+        profile: 是否剖析每本书的解析和写入（合并保存，跳过耗时少于 PROFILE_MIN_SECONDS 的书籍）
     """
     books_dir = settings.books_dir
 
@@ -65,91 +206,190 @@ async def scan_directory(session: Session, full_scan: bool = False) -> None:
         _scan_status.is_running = False
         return
 
-    reset_scan_status()
-    _scan_status.is_running = True
-
-    try:
-        # 收集所有 TXT 文件
-        txt_files = list(books_dir.rglob('*.txt'))
-        _scan_status.total_files = len(txt_files)
-
-        # 获取数据库中所有书籍的 hash_id（用于检测已删除的文件）
-        existing_books = session.exec(select(Book)).all()
-        existing_hash_ids = {book.hash_id for book in existing_books}
-        found_hash_ids = set[str]()
-
-        # 处理每个文件
-        for file_path in txt_files:
-            if not _scan_status.is_running:
-                break  # 允许取消扫描
-
-            _scan_status.current_file = str(file_path.relative_to(books_dir))
-
+    if not _scan_status.is_running:
+        reset_scan_status()
+        _scan_status.is_running = True
+
+    executor = _create_parse_executor()
+    # 限制同时在途的解析任务数量，避免解析结果堆积占用过多内存
+    max_in_flight = settings.scan_worker_count * 2
+    # 解析任务 -> (文件路径, 数据库中的记录)
+    in_flight: dict[Future[ParsedBook], tuple[Path, BookSnapshot | None]] = {}
+    # 已写入但尚未提交的书籍：(文件路径, 数据库中的记录, book_id, is_new)
+    pending: list[tuple[Path, BookSnapshot | None, int, bool]] = []
+    batch_started = 0.0
+    # 因批次提交失败而重新解析过的文件（只重试一次）
+    retried = set[Path]()
+    # 扫描吞吐量：解析了章节的文件数和字节数
+    started = time.monotonic()
+    parsed_files = 0
+    parsed_bytes = 0
+
+    with Session(db_engine or engine) as session:
+
+        def submit(file_path: Path, known: BookSnapshot | None) -> None:
+            # 全量扫描时强制重新解析
+            future = executor.submit(
+                parse_book_file,
+                file_path,
+                known.hash_id if known else None,
+                full_scan,
+                known.file_size if known else None,
+                known.encoding if known else None,
+                profile,
+            )
+            in_flight[future] = (file_path, known)
+
+        def commit_batch() -> None:
+            """提交当前批次，提交之后再更新计数和失效缓存"""
+            if not pending:
+                return
             try:
-                # 检查文件是否需要处理
-                if not full_scan:
-                    # 增量扫描：检查文件是否已存在且未修改
-                    stat = file_path.stat()
-                    existing_book = session.exec(
-                        select(Book).where(Book.path == str(file_path.relative_to(books_dir)))
-                    ).first()
-
-                    if existing_book:
-                        # 检查文件是否被修改
-                        if (
-                            existing_book.file_size == stat.st_size
-                            and existing_book.file_mtime == stat.st_mtime
-                        ):
-                            # 文件未修改，跳过
-                            found_hash_ids.add(existing_book.hash_id)
-                            _scan_status.files_scanned += 1
-                            continue
-
-                # 处理文件（在后台线程中执行，因为涉及文件 I/O）
-                # 全量扫描时强制重新解析
-                loop = asyncio.get_event_loop()
-                book, is_new = await loop.run_in_executor(
-                    None,
-                    create_or_update_book,
-                    session,
-                    file_path,
-                    books_dir,
-                    full_scan,  # 全量扫描时强制重新解析
-                )
-
-                found_hash_ids.add(book.hash_id)
-
+                session.commit()
+            except Exception as e:
+                rollback_batch(f'Error committing scan results: {str(e)}')
+                return
+            for _, _, book_id, is_new in pending:
+                chapter_cache.invalidate_book(book_id)
                 if is_new:
                     _scan_status.files_added += 1
                 else:
                     _scan_status.files_updated += 1
-
                 _scan_status.files_scanned += 1
-
-            except Exception as e:
-                # 记录错误但继续处理其他文件
-                error_msg = f'Error processing {file_path}: {str(e)}'
-                _scan_status.error = error_msg
-                # 继续处理下一个文件
-                continue
-
-        # 删除数据库中不存在的文件记录
-        deleted_hash_ids = existing_hash_ids - found_hash_ids
-        if deleted_hash_ids:
-            deleted_books = session.exec(
-                select(Book).where(
-                    col(Book.hash_id).in_(deleted_hash_ids),
-                )
-            ).all()
-            for book in deleted_books:
-                session.delete(book)
-            session.commit()
-
-    except Exception as e:
-        _scan_status.error = f'Scan error: {str(e)}'
-    finally:
-        _scan_status.is_running = False
-        _scan_status.current_file = ''
+            pending.clear()
+
+        def skip(file_path: Path, error: str) -> None:
+            """记录跳过的文件"""
+            logger.warning(f'Skipped {file_path}: {error}')
+            _scan_status.error = f'Error processing {file_path}: {error}'
+            _scan_status.files_skipped += 1
+            _scan_status.files_scanned += 1
+
+        def rollback_batch(error: str) -> None:
+            """回滚当前批次，批次内的文件重新解析（已重试过的文件跳过）"""
+            session.rollback()
+            _scan_status.error = error
+            for file_path, known, *_ in pending:
+                if file_path in retried:
+                    skip(file_path, error)
+                else:
+                    retried.add(file_path)
+                    submit(file_path, known)
+            pending.clear()
+
+        def write_results(done: set[Future[ParsedBook]]) -> None:
+            """写入阶段：将完成的解析结果写入数据库"""
+            nonlocal batch_started, parsed_files, parsed_bytes
+            for future in done:
+                file_path, known = in_flight.pop(future)
+                _scan_status.current_file = str(file_path.relative_to(books_dir))
+                try:
+                    parsed = future.result()
+                except Exception as e:
+                    # 记录错误但继续处理其他文件
+                    skip(file_path, str(e))
+                    continue
+                if parsed['chapters'] is not None:
+                    parsed_files += 1
+                    parsed_bytes += parsed['file_size']
+                try:
+                    with (
+                        savepoint(session),
+                        profiled(
+                            'scan',
+                            _scan_status.current_file,
+                            profile,
+                            parsed.pop('profile_stats', None),
+                            settings.profile_min_seconds,
+                        ),
+                    ):
+                        book, is_new = save_parsed_book(
+                            session,
+                            parsed,
+                            books_dir,
+                            full_scan,
+                            commit=False,
+                            book_id=known.book_id if known else None,
+                        )
+                except Exception as e:
+                    # SAVEPOINT 已回滚该书的部分修改，批次内的其他书籍不受影响
+                    skip(file_path, str(e))
+                    continue
+
+                if not pending:
+                    batch_started = time.monotonic()
+                pending.append((file_path, known, book.id, is_new))
+                if len(pending) >= settings.scan_commit_batch_size:
+                    commit_batch()
+
+        def wait_results() -> None:
+            """等待至少一个解析任务完成并写入；批次打开超过 SCAN_COMMIT_INTERVAL 时提交"""
+            timeout = None
+            if pending:
+                timeout = max(0.0, batch_started + settings.scan_commit_interval - time.monotonic())
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            write_results(done)
+            if pending and time.monotonic() - batch_started >= settings.scan_commit_interval:
+                commit_batch()
+
+        try:
+            snapshot = load_snapshot(session)
+            # 先遍历整个目录，得到进度的总文件数
+            txt_files = list(walk_txt_files(books_dir))
+            _scan_status.total_files = len(txt_files)
+            seen_paths = {relative_path for relative_path, _, _ in txt_files}
+
+            # 处理每个文件
+            for relative_path, path, stat in txt_files:
+                if not _scan_status.is_running:
+                    break  # 允许取消扫描
+
+                known = snapshot.get(relative_path)
+                if (
+                    not full_scan
+                    and known is not None
+                    and known.file_size == stat.st_size
+                    and known.file_mtime == stat.st_mtime
+                ):
+                    # 增量扫描：文件未修改时跳过
+                    _scan_status.files_scanned += 1
+                    continue
+                # 提交到进程池解析
+                submit(Path(path), known)
+
+                while len(in_flight) >= max_in_flight and _scan_status.is_running:
+                    wait_results()
+
+            # 等待剩余的解析任务（包括批次回滚后重新提交的任务）
+            while in_flight and _scan_status.is_running:
+                wait_results()
+            # 已写入的书籍即使扫描被取消也提交
+            commit_batch()
+
+            # 扫描被取消时不清理记录（未处理完的文件不代表已删除）
+            if not _scan_status.is_running:
+                return
+
+            # 批量删除文件已不存在的书籍记录
+            deleted_book_ids = [known.book_id for path, known in snapshot.items() if path not in seen_paths]
+            if deleted_book_ids:
+                logger.info(f'Removing {len(deleted_book_ids)} books whose files no longer exist')
+                delete_books(session, deleted_book_ids)
+                session.commit()
+                for book_id in deleted_book_ids:
+                    chapter_cache.invalidate_book(book_id)
+
+        except Exception as e:
+            session.rollback()
+            _scan_status.error = f'Scan error: {str(e)}'
+        finally:
+            # 取消尚未开始的解析任务，不等待正在执行的任务
+            executor.shutdown(wait=False, cancel_futures=True)
+            metrics.record_scan(
+                _scan_status.files_scanned, parsed_files, parsed_bytes, time.monotonic() - started
+            )
+            _scan_status.is_running = False
+            _scan_status.current_file = ''
 
 
 def stop_scan() -> None:
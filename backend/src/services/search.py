@@ -0,0 +1,327 @@
+"""全文搜索：维护 FTS5 索引（book_fts / chapter_fts）并执行查询"""
+
+import re
+from collections.abc import Iterable, Iterator, Sequence
+
+from loguru import logger
+from sqlalchemy import Engine, bindparam, text
+from sqlmodel import Session, select
+
+from core.config import settings
+from core.models import Book, Chapter
+from core.schemas import BookSearchHit, ChapterSearchHit
+
+from .body_store import SourceChangedError, iter_book_bodies, read_chapter_body
+
+# trigram 分词器只能用 MATCH 匹配不少于 3 个字符的子串，更短的查询只搜索章节标题（书内搜索时逐章扫描正文）
+FTS_MIN_QUERY_LENGTH = 3
+
+# 摘要中命中位置两侧保留的字符数
+SNIPPET_CHARS = 32
+
+
+def index_book(session: Session, book_id: int, title: str) -> None:
+    """索引书名"""
+    session.exec(
+        text('INSERT INTO book_fts (rowid, title) VALUES (:book_id, :title)'),
+        params={'book_id': book_id, 'title': title},
+    )
+
+
+def index_book_chapters(
+    session: Session, book_id: int, chapters: Iterable[tuple[int, str, int, str]]
+) -> None:
+    """
+    索引书籍的全部章节（在章节写入后调用）
+
+    chapters 为 (chapter_id, title, order_index, content)，正文不保存在 chapter 表中，由调用方提供；
+    chapter_fts 是无内容表，只写入索引，不保存正文
+    """
+    if not settings.fulltext_index:
+        return
+    rows = [
+        {'rowid': chapter_id, 'title': title, 'content': content}
+        for chapter_id, title, _order_index, content in chapters
+    ]
+    if rows:
+        session.exec(
+            text('INSERT INTO chapter_fts (rowid, title, content) VALUES (:rowid, :title, :content)'),
+            params=rows,
+        )
+
+
+def ensure_chapter_index(db_engine: Engine) -> None:
+    """
+    为尚未索引章节的书籍回填章节全文索引（新建索引，或关闭 fulltext_index 期间导入的书籍）
+
+    以每本书第一章的 rowid 是否在 chapter_fts 中判断是否已索引；逐本书读取正文并提交，
+    source 存储的原文件已变化的书籍记录警告后跳过。在启动后的后台线程中调用
+    """
+    if not settings.fulltext_index:
+        return
+    with Session(db_engine) as session:
+        book_ids = session.exec(
+            text(
+                'SELECT b.id FROM book AS b '
+                'JOIN chapter AS c ON c.id = '
+                '(SELECT id FROM chapter WHERE book_id = b.id ORDER BY order_index LIMIT 1) '
+                'WHERE NOT EXISTS (SELECT 1 FROM chapter_fts WHERE rowid = c.id)'
+            )
+        ).all()
+        if not book_ids:
+            return
+        logger.info(f'Backfilling chapter full-text index for {len(book_ids)} books')
+        for (book_id,) in book_ids:
+            book = session.get(Book, book_id)
+            if book is None:
+                continue
+            titles = {
+                chapter_id: (title, order_index)
+                for chapter_id, title, order_index in session.exec(
+                    select(Chapter.id, Chapter.title, Chapter.order_index).where(Chapter.book_id == book_id)
+                )
+            }
+            try:
+                index_book_chapters(
+                    session,
+                    book_id,
+                    (
+                        (chapter_id, *titles[chapter_id], content)
+                        for chapter_id, content in iter_book_bodies(session, book)
+                    ),
+                )
+            except SourceChangedError:
+                session.rollback()
+                logger.warning(f'Source file changed, skipped in full-text index: {book.path}')
+                continue
+            session.commit()
+
+
+def unindex_book_chapters(session: Session, book_id: int) -> None:
+    """删除书籍全部章节的索引（在章节删除前调用，通过 rowid 删除，避免扫描整个索引）"""
+    session.exec(
+        text('DELETE FROM chapter_fts WHERE rowid IN (SELECT id FROM chapter WHERE book_id = :book_id)'),
+        params={'book_id': book_id},
+    )
+
+
+def reindex_book(session: Session, book_id: int, title: str) -> None:
+    """更新书名索引"""
+    unindex_book(session, book_id)
+    index_book(session, book_id, title)
+
+
+def reindex_chapter_title(
+    session: Session, book_id: int, order_index: int, chapter_id: int, title: str
+) -> None:
+    """更新章节标题索引（无内容表只能整行重建，从正文存储读取正文；未索引的章节不处理）"""
+    params = {'chapter_id': chapter_id}
+    statement = text('SELECT EXISTS (SELECT 1 FROM chapter_fts WHERE rowid = :chapter_id)')
+    if not session.exec(statement, params=params).one()[0]:
+        return
+    content = _read_body(session, book_id, order_index)
+    session.exec(text('DELETE FROM chapter_fts WHERE rowid = :chapter_id'), params=params)
+    session.exec(
+        text('INSERT INTO chapter_fts (rowid, title, content) VALUES (:chapter_id, :title, :content)'),
+        params={'chapter_id': chapter_id, 'title': title, 'content': content},
+    )
+
+
+def unindex_book(session: Session, book_id: int) -> None:
+    """删除书名索引"""
+    session.exec(text('DELETE FROM book_fts WHERE rowid = :book_id'), params={'book_id': book_id})
+
+
+def unindex_books(session: Session, book_ids: Sequence[int]) -> None:
+    """删除多本书籍的书名和全部章节的索引（在章节删除前调用）"""
+    session.exec(
+        text(
+            'DELETE FROM chapter_fts WHERE rowid IN (SELECT id FROM chapter WHERE book_id IN :book_ids)'
+        ).bindparams(bindparam('book_ids', expanding=True)),
+        params={'book_ids': list(book_ids)},
+    )
+    session.exec(
+        text('DELETE FROM book_fts WHERE rowid IN :book_ids').bindparams(
+            bindparam('book_ids', expanding=True)
+        ),
+        params={'book_ids': list(book_ids)},
+    )
+
+
+def clear_index(session: Session) -> None:
+    """清空全部索引"""
+    session.exec(text('DELETE FROM book_fts'))
+    session.exec(text('DELETE FROM chapter_fts'))
+
+
+def _fts_phrase(query: str) -> str:
+    """将用户输入转换为 FTS5 短语查询（按子串精确匹配，不解析查询语法）"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _escape_like(query: str) -> str:
+    return query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_books(session: Session, query: str, limit: int) -> list[BookSearchHit]:
+    """按书名搜索，结果按相关度排序"""
+    if len(query) >= FTS_MIN_QUERY_LENGTH:
+        statement = text(
+            'SELECT rowid, title FROM book_fts WHERE book_fts MATCH :match ORDER BY rank LIMIT :limit'
+        )
+        params = {'match': _fts_phrase(query), 'limit': limit}
+    else:
+        statement = text(
+            "SELECT id, title FROM book WHERE title LIKE :pattern ESCAPE '\\' ORDER BY id LIMIT :limit"
+        )
+        params = {'pattern': f'%{_escape_like(query)}%', 'limit': limit}
+    rows = session.exec(statement, params=params).all()
+    return [BookSearchHit(book_id=book_id, title=title) for book_id, title in rows]
+
+
+def _find(pattern: re.Pattern[str], content: str) -> tuple[str, int] | None:
+    """正文中首个命中位置两侧各 SNIPPET_CHARS 个字符的摘要和命中位置，未命中时返回 None"""
+    match = pattern.search(content)
+    if match is None:
+        return None
+    start = max(match.start() - SNIPPET_CHARS, 0)
+    end = match.end() + SNIPPET_CHARS
+    snippet = ('…' if start > 0 else '') + content[start:end] + ('…' if end < len(content) else '')
+    return snippet, match.start()
+
+
+def _read_body(session: Session, book_id: int, order_index: int) -> str:
+    """读取章节正文（source 存储的原文件已变化时返回空字符串）"""
+    try:
+        return read_chapter_body(session, book_id, order_index) or ''
+    except SourceChangedError:
+        return ''
+
+
+def _search_indexed(
+    session: Session, query: str, limit: int, book_id: int | None
+) -> Iterator[tuple[int, str, int, str, str]]:
+    """通过 chapter_fts 匹配，按相关度返回前 limit 条（只读取这些章节的正文）"""
+    params: dict[str, str | int] = {'match': _fts_phrase(query), 'limit': limit}
+    book_filter = ''
+    if book_id is not None:
+        book_filter = 'AND c.book_id = :book_id'
+        params['book_id'] = book_id
+    # CROSS JOIN 固定先查询索引再按 rowid 查找章节（否则按书籍过滤时会对每个章节执行一次 MATCH）
+    statement = text(
+        f"""
+        SELECT c.book_id, b.title, c.order_index, c.title
+        FROM chapter_fts AS f CROSS JOIN chapter AS c ON c.id = f.rowid JOIN book AS b ON b.id = c.book_id
+        WHERE chapter_fts MATCH :match {book_filter}
+        ORDER BY f.rank
+        LIMIT :limit
+        """
+    )
+    for hit_book_id, book_title, order_index, chapter_title in session.exec(statement, params=params).all():
+        yield (
+            hit_book_id,
+            book_title,
+            order_index,
+            chapter_title,
+            _read_body(session, hit_book_id, order_index),
+        )
+
+
+def _search_book_scan(
+    session: Session, query: str, limit: int, book_id: int
+) -> Iterator[tuple[int, str, int, str, str]]:
+    """
+    短查询无法使用 trigram 索引：按章节顺序逐章读取指定书籍的正文查找，找到 limit 条后停止
+
+    只用于书内搜索（最多读取一本书的正文），不扫描整个书库
+    """
+    book = session.get(Book, book_id)
+    if book is None:
+        return
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    chapters = {
+        chapter_id: (order_index, title)
+        for chapter_id, order_index, title in session.exec(
+            select(Chapter.id, Chapter.order_index, Chapter.title).where(Chapter.book_id == book.id)
+        )
+    }
+    found = 0
+    try:
+        for chapter_id, content in iter_book_bodies(session, book):
+            order_index, title = chapters[chapter_id]
+            if pattern.search(title) or pattern.search(content):
+                yield book.id, book.title, order_index, title, content
+                found += 1
+                if found >= limit:
+                    return
+    except SourceChangedError:
+        logger.warning(f'Source file changed, skipped in search: {book.path}')
+
+
+def _search_titles(session: Session, query: str, limit: int, book_id: int | None) -> list[ChapterSearchHit]:
+    """只按章节标题 LIKE 搜索（没有摘要，偏移为 0）"""
+    params: dict[str, str | int] = {'pattern': f'%{_escape_like(query)}%', 'limit': limit}
+    book_filter = ''
+    if book_id is not None:
+        book_filter = 'AND c.book_id = :book_id'
+        params['book_id'] = book_id
+    statement = text(
+        f"""
+        SELECT c.book_id, b.title, c.order_index, c.title
+        FROM chapter AS c JOIN book AS b ON b.id = c.book_id
+        WHERE c.title LIKE :pattern ESCAPE '\\' {book_filter}
+        ORDER BY c.book_id, c.order_index
+        LIMIT :limit
+        """
+    )
+    return [
+        ChapterSearchHit(
+            book_id=hit_book_id,
+            book_title=book_title,
+            order_index=order_index,
+            chapter_title=chapter_title,
+            snippet='',
+            offset=0,
+        )
+        for hit_book_id, book_title, order_index, chapter_title in session.exec(
+            statement, params=params
+        ).all()
+    ]
+
+
+def search_chapters(
+    session: Session, query: str, limit: int, book_id: int | None = None
+) -> list[ChapterSearchHit]:
+    """
+    按章节标题和正文搜索
+
+    返回命中的章节、摘要以及首个命中位置在章节正文中的字符偏移（与阅读进度 chapter_offset 一致），
+    标题命中而正文未命中时偏移为 0。
+    chapter_fts 不保存正文，摘要和偏移从命中章节的正文生成。
+    少于 3 个字符的查询无法使用索引：指定书籍时逐章读取该书的正文，否则只搜索章节标题。
+    """
+    if not settings.fulltext_index:
+        # 未建立正文索引时只搜索章节标题
+        return _search_titles(session, query, limit, book_id)
+    if len(query) >= FTS_MIN_QUERY_LENGTH:
+        results = _search_indexed(session, query, limit, book_id)
+    elif book_id is not None:
+        results = _search_book_scan(session, query, limit, book_id)
+    else:
+        return _search_titles(session, query, limit, book_id)
+
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    hits = []
+    for hit_book_id, book_title, order_index, chapter_title, content in results:
+        snippet, offset = _find(pattern, content) or (content[: SNIPPET_CHARS * 2], 0)
+        hits.append(
+            ChapterSearchHit(
+                book_id=hit_book_id,
+                book_title=book_title,
+                order_index=order_index,
+                chapter_title=chapter_title,
+                snippet=snippet,
+                offset=offset,
+            )
+        )
+    return hits
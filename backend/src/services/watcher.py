@@ -0,0 +1,240 @@
+"""
+目录监视：书籍目录中的 TXT 文件新增、修改、移动或删除后自动导入，无需手动触发扫描
+
+- 优先使用 watchfiles（inotify / FSEvents / ReadDirectoryChangesW 等系统事件），
+  不可用或 WATCH_FORCE_POLLING=true（如 NAS 挂载的目录）时定期遍历目录比较文件的大小和修改时间
+- 文件最后一次变化后经过 WATCH_DEBOUNCE 秒才导入，避免导入复制到一半的文件
+- 移动或重命名通过 hash_id 识别：新路径的文件内容与某本文件已不存在的书籍相同时只更新路径，保留阅读进度
+  （尚未迁移的旧版本 MD5 hash_id 也能识别）
+- 扫描运行期间暂停导入，扫描结束后继续
+"""
+
+import os
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import Engine
+from sqlmodel import Session, func, select
+from sqlmodel.sql.expression import col
+
+from core.config import settings
+from core.database import engine
+from core.models import Book
+
+from .book_service import (
+    create_or_update_book,
+    delete_books,
+    get_relative_path,
+    move_book,
+    parse_book_file,
+    save_parsed_book,
+)
+from .cache import chapter_cache
+from .parser import LEGACY_HASH_LENGTH, hash_file
+from .scanner import WatcherStatus, get_scan_status, walk_txt_files
+
+try:
+    import watchfiles
+except ImportError:  # pragma: no cover - watchfiles 随 uvicorn[standard] 安装
+    watchfiles = None
+
+# 没有文件变化时检查防抖是否结束的间隔（毫秒）
+WATCH_TICK_MS = 200
+
+
+class BookWatcher:
+    """书籍目录监视线程"""
+
+    def __init__(self, db_engine: Engine | None = None) -> None:
+        self._engine = db_engine or engine
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # 等待防抖结束的路径（绝对路径）-> 最后一次变化的时间
+        self._pending: dict[str, float] = {}
+
+    @property
+    def status(self) -> WatcherStatus:
+        return get_scan_status().watcher
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if not settings.books_dir.is_dir():
+            self.status.error = f'Books directory does not exist: {settings.books_dir}'
+            return
+        self._stop.clear()
+        use_polling = watchfiles is None or settings.watch_force_polling
+        self.status.backend = 'polling' if use_polling else 'watchfiles'
+        self._thread = threading.Thread(
+            target=self._run, args=(use_polling,), name='book-watcher', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.status.is_running = False
+
+    def _run(self, use_polling: bool) -> None:
+        try:
+            # 轮询的基准在监视线程中读取（NAS 等挂载的目录遍历较慢，不阻塞服务启动），
+            # 读取完成后才标记为运行中，之后的变化都能被检测到
+            changes = self._poll_changes(self._stat_books_dir()) if use_polling else self._watch_changes()
+            self.status.is_running = True
+            logger.info(f'Watching {settings.books_dir} ({self.status.backend})')
+            for paths in changes:
+                now = time.monotonic()
+                for path in paths:
+                    self._pending[path] = now
+                self.flush(now)
+        except Exception as e:
+            logger.exception('Book watcher stopped')
+            self.status.error = f'Watcher error: {str(e)}'
+        finally:
+            self.status.is_running = False
+
+    def _watch_changes(self) -> Iterator[set[str]]:
+        """系统文件事件，没有变化时每 WATCH_TICK_MS 毫秒产生一个空集合"""
+        assert watchfiles is not None
+        for changes in watchfiles.watch(
+            settings.books_dir,
+            stop_event=self._stop,
+            rust_timeout=WATCH_TICK_MS,
+            yield_on_timeout=True,
+            debounce=WATCH_TICK_MS,
+            raise_interrupt=False,
+        ):
+            yield {path for _, path in changes}
+
+    def _poll_changes(self, previous: dict[str, tuple[int, float]]) -> Iterator[set[str]]:
+        """每 WATCH_POLL_INTERVAL 秒遍历一次目录，比较 TXT 文件的大小和修改时间（不读取文件内容）"""
+        next_poll = time.monotonic() + settings.watch_poll_interval
+        while not self._stop.wait(WATCH_TICK_MS / 1000):
+            if time.monotonic() < next_poll:
+                yield set()
+                continue
+            current = self._stat_books_dir()
+            next_poll = time.monotonic() + settings.watch_poll_interval
+            yield {
+                path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)
+            }
+            previous = current
+
+    @staticmethod
+    def _stat_books_dir() -> dict[str, tuple[int, float]]:
+        return {path: (stat.st_size, stat.st_mtime) for _, path, stat in walk_txt_files(settings.books_dir)}
+
+    def flush(self, now: float | None = None) -> None:
+        """导入防抖已结束的文件（扫描运行期间保留，等扫描结束后再导入）"""
+        now = time.monotonic() if now is None else now
+        self.status.pending_files = len(self._pending)
+        if not self._pending or get_scan_status().is_running:
+            return
+        settled = [
+            path for path, changed in self._pending.items() if now - changed >= settings.watch_debounce
+        ]
+        if not settled:
+            return
+        for path in settled:
+            del self._pending[path]
+        self.status.pending_files = len(self._pending)
+        try:
+            self.apply_changes(settled)
+        except Exception as e:
+            logger.exception('Failed to apply book directory changes')
+            self.status.error = f'Error applying changes: {str(e)}'
+
+    def apply_changes(self, paths: list[str]) -> None:
+        """
+        导入一批发生变化的路径
+
+        - 存在的 TXT 文件：新文件与某本文件已不存在的书籍内容相同时视为移动，否则交给 create_or_update_book
+        - 存在的目录（整个目录被移入）：导入其中的所有 TXT 文件
+        - 不存在的路径：删除该路径（或以其为目录的路径）下文件已不存在的书籍
+        """
+        books_dir = settings.books_dir
+        files: dict[str, Path] = {}
+        gone: set[str] = set()
+        for path_str in paths:
+            path = Path(path_str)
+            if path.is_dir():
+                for _, file_path, _ in walk_txt_files(path):
+                    files[str(get_relative_path(Path(file_path), books_dir))] = Path(file_path)
+            elif path.is_file():
+                if path.suffix == '.txt':
+                    files[str(get_relative_path(path, books_dir))] = path
+            else:
+                gone.add(str(get_relative_path(path, books_dir)))
+
+        with Session(self._engine) as session:
+            for relative_path, file_path in files.items():
+                try:
+                    self._import_file(session, relative_path, file_path)
+                except Exception as e:
+                    session.rollback()
+                    logger.exception(f'Failed to import {file_path}')
+                    self.status.error = f'Error processing {file_path}: {str(e)}'
+
+            if gone:
+                self._remove_books(session, gone)
+
+    def _import_file(self, session: Session, relative_path: str, file_path: Path) -> None:
+        books_dir = settings.books_dir
+        book = session.exec(select(Book).where(Book.path == relative_path)).first()
+        if book is not None:
+            stat = file_path.stat()
+            if book.file_size == stat.st_size and book.file_mtime == stat.st_mtime:
+                return
+            create_or_update_book(session, file_path, books_dir)
+            self.status.files_updated += 1
+            return
+
+        # 解析时同时计算哈希；内容相同、文件已不存在的书籍：文件被移动或重命名
+        parsed = parse_book_file(file_path)
+        moved = self._find_moved_book(session, file_path, parsed['hash_id'])
+        if moved is not None:
+            logger.info(f'Book moved: {moved.path} -> {relative_path}')
+            move_book(session, moved, file_path, books_dir, parsed['hash_id'])
+            session.commit()
+            chapter_cache.invalidate_book(moved.id)
+            self.status.files_moved += 1
+            return
+
+        save_parsed_book(session, parsed, books_dir)
+        self.status.files_added += 1
+
+    @staticmethod
+    def _find_moved_book(session: Session, file_path: Path, hash_id: str) -> Book | None:
+        """查找内容与 file_path 相同、文件已不存在的书籍"""
+        hash_ids = [hash_id]
+        # 还有旧版本 MD5 hash_id 的书籍时同时按 MD5 查找（需要再读取一遍文件）
+        if session.exec(select(Book.id).where(func.length(Book.hash_id) == LEGACY_HASH_LENGTH)).first():
+            hash_ids.append(hash_file(file_path, legacy=True).legacy_hexdigest())
+        for candidate in session.exec(select(Book).where(col(Book.hash_id).in_(hash_ids))):
+            if not (settings.books_dir / candidate.path).exists():
+                return candidate
+        return None
+
+    def _remove_books(self, session: Session, gone: set[str]) -> None:
+        """删除已不存在的路径（包括被删除或移走的目录中）的书籍"""
+        condition = col(Book.path).in_(gone)
+        for path in gone:
+            condition |= col(Book.path).startswith(path + os.sep, autoescape=True)
+        candidates = session.exec(select(Book.id, Book.path).where(condition)).all()
+        # 确认文件确实不存在（可能已被重新创建）
+        book_ids = [book_id for book_id, path in candidates if not (settings.books_dir / path).exists()]
+        if not book_ids:
+            return
+        logger.info(f'Removing {len(book_ids)} books whose files were deleted')
+        delete_books(session, book_ids)
+        session.commit()
+        for book_id in book_ids:
+            chapter_cache.invalidate_book(book_id)
+        self.status.files_removed += len(book_ids)
+
+
+book_watcher = BookWatcher()
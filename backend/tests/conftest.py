@@ -0,0 +1,68 @@
+# pyright: reportMissingImports=false
+"""测试共用的 fixture，以及构造书籍的辅助函数（测试中通过 from conftest import ... 使用）"""
+
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, create_engine
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from core.config import settings
+from core.database import create_fts_tables
+from services.book_service import ParsedBook
+from services.cache import chapter_cache
+from services.parser import ChapterDict
+
+
+@pytest.fixture
+def engine(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Engine]:
+    """以 tmp_path 为数据目录的测试数据库（已创建全部表、全文索引和空的书籍目录）"""
+    monkeypatch.setattr(settings, 'data_dir', tmp_path)
+    settings.books_dir.mkdir()
+    engine = create_engine(f'sqlite:///{tmp_path / "test.db"}')
+    SQLModel.metadata.create_all(engine)
+    create_fts_tables(engine)
+    yield engine
+    engine.dispose()
+    # 不同测试的数据库会使用相同的 book.id
+    chapter_cache.clear()
+
+
+@pytest.fixture
+def session(engine: Engine) -> Iterator[Session]:
+    with Session(engine) as session:
+        yield session
+
+
+def write_book(name: str, text: str, preface: str = '前言内容。') -> Path:
+    """在书籍目录中写入一本书：前言（第 0 章），之后是第一章，正文为 text 重复 5 行"""
+    path = settings.books_dir / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text('\n'.join([preface, '第一章 开始', *[text] * 5]), encoding='utf-8')
+    return path
+
+
+def parsed_book(
+    books_dir: Path,
+    hash_id: str,
+    contents: list[str],
+    titles: list[str] | None = None,
+    name: str = 'book',
+) -> ParsedBook:
+    """构造 save_parsed_book 的输入：每章正文按空行分段，titles 默认为「第 N 章」"""
+    if titles is None:
+        titles = [f'第{i + 1}章' for i in range(len(contents))]
+    return ParsedBook(
+        file_path=books_dir / f'{name}.txt',
+        hash_id=hash_id,
+        file_size=len(contents),
+        file_mtime=0,
+        chapters=[
+            ChapterDict(title=title, order_index=i, content=content.split('\n\n'))
+            for i, (title, content) in enumerate(zip(titles, contents, strict=True))
+        ],
+    )
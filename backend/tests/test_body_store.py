@@ -0,0 +1,213 @@
+# pyright: reportMissingImports=false
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlmodel import Session, SQLModel, create_engine, select
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import parsed_book, write_book
+
+from core.config import settings
+from core.database import create_fts_tables, migrate_columns
+from core.models import Book, ChapterBody
+from services.body_store import (
+    SourceChangedError,
+    iter_book_bodies,
+    migrate_inline_content,
+    read_chapter_body,
+    savepoint,
+)
+from services.book_service import create_or_update_book, delete_book, insert_chapters, save_parsed_book
+from services.parser import ChapterDict
+from services.search import ensure_chapter_index, search_chapters
+
+
+@pytest.mark.parametrize('store', ['table', 'segment'])
+def test_read_and_delete(engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, store: str):
+    monkeypatch.setattr(settings, 'chapter_body_store', store)
+    contents = ['南山经之首曰鹊山。\n\n其首曰招摇之山。', '西山经华山之首。' * 100, '']
+    with Session(engine) as session:
+        book, _ = save_parsed_book(session, parsed_book(tmp_path, 'h1', contents), tmp_path)
+        assert book.body_store == store
+        assert [read_chapter_body(session, book.id, i) for i in range(3)] == contents
+        assert read_chapter_body(session, book.id, 3) is None
+        assert [content for _, content in iter_book_bodies(session, book)] == contents
+
+        delete_book(session, book)
+        session.commit()
+        assert session.exec(select(ChapterBody)).all() == []
+        assert list(settings.chapter_bodies_dir.glob('*')) == []
+
+
+def test_reparse_switches_store(engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    with Session(engine) as session:
+        monkeypatch.setattr(settings, 'chapter_body_store', 'segment')
+        book, _ = save_parsed_book(session, parsed_book(tmp_path, 'h1', ['一', '二']), tmp_path)
+        first_segment = settings.chapter_bodies_dir / str(book.body_segment)
+        assert first_segment.exists()
+
+        # 重新解析后旧段文件在提交后删除
+        book, _ = save_parsed_book(session, parsed_book(tmp_path, 'h2', ['三', '四']), tmp_path)
+        assert not first_segment.exists()
+        assert read_chapter_body(session, book.id, 1) == '四'
+
+        monkeypatch.setattr(settings, 'chapter_body_store', 'table')
+        book, _ = save_parsed_book(session, parsed_book(tmp_path, 'h3', ['五']), tmp_path)
+        assert (book.body_store, book.body_segment) == ('table', None)
+        assert list(settings.chapter_bodies_dir.glob('*')) == []
+        assert read_chapter_body(session, book.id, 0) == '五'
+
+
+def test_segment_removed_on_rollback(engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'chapter_body_store', 'segment')
+    with Session(engine) as session:
+        book = Book(hash_id='h1', title='t', path='t.txt', file_size=1, file_mtime=0)
+        session.add(book)
+        session.flush()
+        insert_chapters(session, book, [ChapterDict(title='1', order_index=0, content=['正文'])])
+        assert len(list(settings.chapter_bodies_dir.glob('*.seg'))) == 1
+        session.rollback()
+        assert list(settings.chapter_bodies_dir.glob('*')) == []
+
+
+def test_savepoint(engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """SAVEPOINT 回滚时只删除其中写入的段文件；释放 SAVEPOINT 不会提交外层事务"""
+    monkeypatch.setattr(settings, 'chapter_body_store', 'segment')
+    with Session(engine) as session:
+        with savepoint(session):
+            save_parsed_book(session, parsed_book(tmp_path, 'h1', ['正文'], name='a'), tmp_path, commit=False)
+        with pytest.raises(RuntimeError), savepoint(session):
+            save_parsed_book(session, parsed_book(tmp_path, 'h2', ['正文'], name='b'), tmp_path, commit=False)
+            raise RuntimeError('boom')
+        assert len(list(settings.chapter_bodies_dir.glob('*.seg'))) == 1
+        session.rollback()
+        assert list(settings.chapter_bodies_dir.glob('*')) == []
+        assert session.exec(select(Book)).all() == []
+
+
+def _write_source_book(books_dir: Path, encoding: str) -> Path:
+    lines = ['<p>简介：這是一本測試用的書</p>', '第一章 开始']
+    lines += [f'第一章的第{i}段正文，内容足够长所以不会被当作标题。' for i in range(6)]
+    lines += ['第二章 误判', '只有一段。', '第三章 继续']
+    lines += [f'第三章的第{i}段正文，内容足够长所以不会被当作标题。' for i in range(5)]
+    books_dir.mkdir(parents=True, exist_ok=True)
+    file_path = books_dir / '测试.txt'
+    file_path.write_bytes('\r\n'.join(lines).encode(encoding))
+    return file_path
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'gb18030'])
+def test_source_store(engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, encoding: str):
+    monkeypatch.setattr(settings, 'chapter_body_store', 'source')
+    file_path = _write_source_book(settings.books_dir, encoding)
+    with Session(engine) as session:
+        book, _ = create_or_update_book(session, file_path, settings.books_dir)
+        assert (book.body_store, book.encoding) == ('source', encoding)
+        assert session.exec(select(ChapterBody)).all() == []
+
+        monkeypatch.setattr(settings, 'chapter_body_store', 'table')
+        expected, _ = create_or_update_book(session, file_path, settings.books_dir, force_reparse=True)
+        expected_contents = [content for _, content in iter_book_bodies(session, expected)]
+        monkeypatch.setattr(settings, 'chapter_body_store', 'source')
+        book, _ = create_or_update_book(session, file_path, settings.books_dir, force_reparse=True)
+        assert session.exec(select(ChapterBody)).all() == []
+        assert [read_chapter_body(session, book.id, i) for i in range(3)] == expected_contents
+        assert [content for _, content in iter_book_bodies(session, book)] == expected_contents
+
+        # 原文件变化后需要重新扫描
+        os.utime(file_path, (0, 0))
+        with pytest.raises(SourceChangedError):
+            read_chapter_body(session, book.id, 0)
+        file_path.unlink()
+        with pytest.raises(SourceChangedError):
+            read_chapter_body(session, book.id, 0)
+
+
+def test_backfill_skips_changed_source(engine, monkeypatch: pytest.MonkeyPatch):
+    """回填章节全文索引时跳过原文件已变化的书籍，其他书籍照常索引"""
+    monkeypatch.setattr(settings, 'chapter_body_store', 'source')
+    monkeypatch.setattr(settings, 'fulltext_index', False)
+    file_path = _write_source_book(settings.books_dir, 'utf-8')
+    other_path = write_book('其他.txt', '其首曰招摇之山，临于西海之上。')
+    with Session(engine) as session:
+        create_or_update_book(session, file_path, settings.books_dir)
+        create_or_update_book(session, other_path, settings.books_dir)
+    os.utime(file_path, (0, 0))
+
+    monkeypatch.setattr(settings, 'fulltext_index', True)
+    ensure_chapter_index(engine)
+    with Session(engine) as session:
+        assert [hit.book_title for hit in search_chapters(session, '招摇之山', 10)] == ['其他']
+    # 重新扫描后再次回填
+    with Session(engine) as session:
+        create_or_update_book(session, file_path, settings.books_dir)
+    ensure_chapter_index(engine)
+    with Session(engine) as session:
+        assert len(search_chapters(session, '足够长', 10)) == 2
+
+
+def test_source_store_fallbacks(engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'chapter_body_store', 'source')
+    file_path = _write_source_book(settings.books_dir, 'utf-8')
+    with Session(engine) as session:
+        book, _ = create_or_update_book(session, file_path, settings.books_dir)
+        expected = read_chapter_body(session, book.id, 2)
+        # 字节范围与导入时的章节不一致时回退为解析整个文件
+        session.exec(text('UPDATE chapter SET body_offset = 0 WHERE book_id = :id').bindparams(id=book.id))
+        assert read_chapter_body(session, book.id, 2) == expected
+
+    # 无法定位章节的编码改用 table 存储（仍记录文件编码，下次解析时优先使用）
+    file_path.write_text(file_path.read_text(encoding='utf-8'), encoding='utf-16')
+    with Session(engine) as session:
+        book, _ = create_or_update_book(session, file_path, settings.books_dir)
+        assert (book.body_store, book.encoding) == ('table', 'utf-16')
+        assert read_chapter_body(session, book.id, 2) == expected
+
+
+def test_migrate_inline_content(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'data_dir', tmp_path)
+    engine = create_engine(f'sqlite:///{tmp_path / "test.db"}')
+    # 正文保存在 chapter.content 列的旧版表结构
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                'CREATE TABLE book (id INTEGER PRIMARY KEY, hash_id VARCHAR NOT NULL, '
+                'title VARCHAR NOT NULL, path VARCHAR NOT NULL, is_starred BOOLEAN NOT NULL, '
+                'last_read_time FLOAT, file_size INTEGER NOT NULL, file_mtime FLOAT NOT NULL, '
+                'chapter_index INTEGER, chapter_offset INTEGER, is_finished BOOLEAN NOT NULL)'
+            )
+        )
+        connection.execute(
+            text(
+                'CREATE TABLE chapter (id INTEGER PRIMARY KEY, '
+                'book_id INTEGER NOT NULL REFERENCES book (id), title VARCHAR NOT NULL, '
+                'order_index INTEGER NOT NULL, content VARCHAR NOT NULL)'
+            )
+        )
+        connection.execute(
+            text("INSERT INTO book VALUES (1, 'h1', '山海经', 'a.txt', 0, NULL, 1, 0, 1, 1, 0)")
+        )
+        connection.execute(
+            text("INSERT INTO chapter VALUES (1, 1, '南山', 0, '鹊山'), (2, 1, '西山', 1, '其首曰招摇之山')")
+        )
+
+    SQLModel.metadata.create_all(engine)
+    migrate_columns(engine)
+    create_fts_tables(engine)
+    migrate_inline_content(engine)
+    ensure_chapter_index(engine)
+    assert 'content' not in {column['name'] for column in inspect(engine).get_columns('chapter')}
+    # 重复执行不做任何事
+    migrate_inline_content(engine)
+
+    with Session(engine) as session:
+        assert read_chapter_body(session, 1, 1) == '其首曰招摇之山'
+        book = session.get_one(Book, 1)
+        assert (book.total_chars, book.progress_percent) == (9, round(3 * 100 / 9, 2))
+        hits = search_chapters(session, '招摇之山', 10)
+        assert [(hit.order_index, hit.offset) for hit in hits] == [(1, 3)]
+    engine.dispose()
@@ -0,0 +1,74 @@
+# pyright: reportMissingImports=false
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlmodel import Session, create_engine, select
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import parsed_book
+
+from api.books import check_book_finished
+from core.database import migrate_columns
+from core.models import Book, Chapter
+from services.book_service import calculate_progress_percent, save_parsed_book
+
+
+def test_chapter_stats_and_progress(engine, tmp_path: Path):
+    parsed = parsed_book(tmp_path, 'h1', ['a' * 100, 'b' * 100 + '\n\n' + 'c' * 98, 'd' * 1000])
+    with Session(engine) as session:
+        book, _ = save_parsed_book(session, parsed, tmp_path)
+        assert (book.chapter_count, book.total_chars, book.last_chapter_length) == (3, 1300, 1000)
+        chapters = session.exec(select(Chapter).order_by(Chapter.order_index)).all()
+        assert [(c.char_count, c.char_offset) for c in chapters] == [(100, 0), (200, 100), (1000, 300)]
+
+        book.chapter_index, book.chapter_offset = 1, 50
+        assert calculate_progress_percent(session, book) == round(150 * 100 / 1300, 2)
+        assert not check_book_finished(book)
+
+        # 最后一章剩余不超过 max(5%, 200) 字符时视为读完
+        book.chapter_index, book.chapter_offset = 2, 799
+        assert not check_book_finished(book)
+        book.chapter_offset = 800
+        assert check_book_finished(book)
+        assert calculate_progress_percent(session, book) == round(1100 * 100 / 1300, 2)
+
+        book.chapter_index = 5
+        assert calculate_progress_percent(session, book) is None
+
+
+V1_STATEMENTS = [
+    'CREATE TABLE book (id INTEGER PRIMARY KEY, hash_id VARCHAR NOT NULL, title VARCHAR NOT NULL, '
+    'path VARCHAR NOT NULL, is_starred BOOLEAN NOT NULL, last_read_time FLOAT, file_size INTEGER NOT NULL, '
+    'file_mtime FLOAT NOT NULL, chapter_index INTEGER, chapter_offset INTEGER, is_finished BOOLEAN NOT NULL)',
+    'CREATE TABLE chapter (id INTEGER PRIMARY KEY, book_id INTEGER NOT NULL REFERENCES book (id), '
+    'title VARCHAR NOT NULL, order_index INTEGER NOT NULL, content VARCHAR NOT NULL)',
+    "INSERT INTO book VALUES (1, 'h1', 't', 'a.txt', 0, NULL, 1, 0, 1, 5, 0)",
+    "INSERT INTO book VALUES (2, 'h2', 't', 'b.txt', 0, NULL, 1, 0, NULL, NULL, 0)",
+    "INSERT INTO chapter VALUES (1, 1, '1', 0, 'aaaa'), (2, 1, '2', 1, 'bbbbbbbbbb'), (3, 1, '3', 2, 'cc')",
+]
+
+
+def test_migrate_columns_backfills_stats(tmp_path: Path):
+    engine = create_engine(f'sqlite:///{tmp_path / "test.db"}')
+    # v1 表结构（没有章节统计列）
+    with engine.begin() as connection:
+        for statement in V1_STATEMENTS:
+            connection.execute(text(statement))
+
+    added = migrate_columns(engine)
+    assert {'chapter.char_count', 'book.total_chars'} <= added
+    assert migrate_columns(engine) == set()
+
+    with Session(engine) as session:
+        book = session.get(Book, 1)
+        assert book is not None
+        assert (book.chapter_count, book.total_chars, book.last_chapter_length) == (3, 16, 2)
+        assert book.progress_percent == 56.25
+        chapters = session.exec(select(Chapter).order_by(Chapter.order_index)).all()
+        assert [(c.char_count, c.char_offset) for c in chapters] == [(4, 0), (10, 4), (2, 14)]
+        empty_book = session.get(Book, 2)
+        assert empty_book is not None
+        assert (empty_book.chapter_count, empty_book.progress_percent) == (0, None)
+    engine.dispose()
@@ -0,0 +1,62 @@
+# pyright: reportMissingImports=false
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from services.cache import BookCache
+
+
+def test_lru_eviction_by_bytes():
+    cache = BookCache(max_bytes=10)
+    cache.put(1, 0, b'aaaa', cache.generation(1))
+    cache.put(1, 1, b'bbbb', cache.generation(1))
+    # 访问后变为最近使用
+    assert cache.get(1, 0) == b'aaaa'
+    cache.put(2, 0, b'cccc', cache.generation(2))
+    assert cache.get(1, 1) is None
+    assert cache.get(1, 0) == b'aaaa'
+    assert cache.get(2, 0) == b'cccc'
+    assert cache.size == 8
+    # 超过总容量的条目不缓存
+    cache.put(3, 0, b'x' * 11, cache.generation(3))
+    assert cache.get(3, 0) is None
+    assert cache.size == 8
+
+
+def test_invalidate_book():
+    cache = BookCache(max_bytes=100)
+    cache.set_etag(1, 'h1', cache.generation(1))
+    cache.put(1, 'toc', b'[]', cache.generation(1))
+    cache.put(2, 'toc', b'[]', cache.generation(2))
+    cache.invalidate_book(1)
+    assert cache.get_etag(1) is None
+    assert cache.get(1, 'toc') is None
+    assert cache.get(2, 'toc') == b'[]'
+    cache.clear()
+    assert cache.get(2, 'toc') is None
+    assert cache.size == 0
+
+
+def test_stale_put_is_ignored():
+    """读取数据库期间书籍被修改，读到的旧数据不应进入缓存"""
+    cache = BookCache(max_bytes=100)
+    generation = cache.generation(1)
+    cache.invalidate_book(1)
+    cache.put(1, 0, b'old', generation)
+    cache.set_etag(1, 'old', generation)
+    assert cache.get(1, 0) is None
+    assert cache.get_etag(1) is None
+
+    generation = cache.generation(1)
+    cache.clear()
+    cache.put(1, 0, b'old', generation)
+    assert cache.get(1, 0) is None
+
+
+def test_disabled_cache():
+    cache = BookCache(max_bytes=0)
+    cache.put(1, 0, b'a', cache.generation(1))
+    cache.set_etag(1, 'h1', cache.generation(1))
+    assert cache.get(1, 0) is None
+    assert cache.get_etag(1) is None
@@ -0,0 +1,56 @@
+# pyright: reportMissingImports=false
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import parsed_book
+
+from api import chapters
+from core.database import get_db_session
+from services.book_service import save_parsed_book
+
+
+def test_etag_changes_on_reparse(engine, tmp_path: Path):
+    """文件不变时重新解析（如清洗配置变化）也会改变 ETag，旧 ETag 不再命中 304 和 If-Range"""
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(chapters.router, prefix='/books')
+    app.dependency_overrides[get_db_session] = get_session
+
+    with Session(engine) as session:
+        book, _ = save_parsed_book(session, parsed_book(tmp_path, 'h1', ['這是正文']), tmp_path)
+        book_id = book.id
+
+    with TestClient(app) as client:
+        toc = client.get(f'/books/{book_id}/chapters')
+        chapter = client.get(f'/books/{book_id}/chapters/0')
+        assert chapter.text == '這是正文'
+        old_etags = toc.headers['etag'], chapter.headers['etag']
+        assert old_etags[0] != old_etags[1]
+        headers = {'If-None-Match': old_etags[1]}
+        assert client.get(f'/books/{book_id}/chapters/0', headers=headers).status_code == 304
+
+        # 同一文件（hash_id 不变）按新的配置重新解析
+        with Session(engine) as session:
+            save_parsed_book(session, parsed_book(tmp_path, 'h1', ['这是正文']), tmp_path, force_reparse=True)
+
+        toc = client.get(f'/books/{book_id}/chapters', headers={'If-None-Match': old_etags[0]})
+        assert toc.status_code == 200 and toc.headers['etag'] != old_etags[0]
+        chapter = client.get(f'/books/{book_id}/chapters/0', headers=headers)
+        assert chapter.status_code == 200 and chapter.text == '这是正文'
+        assert chapter.headers['etag'] not in old_etags
+        # If-Range 使用旧 ETag 时返回完整的新内容
+        chapter = client.get(
+            f'/books/{book_id}/chapters/0', headers={'Range': 'chars=2-', 'If-Range': old_etags[1]}
+        )
+        assert chapter.status_code == 200 and chapter.text == '这是正文'
+        assert client.get(f'/books/{book_id + 1}/chapters').status_code == 404
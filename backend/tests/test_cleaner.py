@@ -1,37 +1,58 @@
 # pyright: reportMissingImports=false
 import sys
+from html.parser import HTMLParser
 from pathlib import Path
 
 import pytest
 
 sys.path.append(str(Path(__file__).parent.parent / 'src'))
-from services.parser.cleaner import clean_line_breaks
+from core.config import settings
+from services.parser.cleaner import (
+    CleaningPipeline,
+    CleaningStage,
+    HTMLStripper,
+    LineBreakCleaner,
+    clean_content,
+    clean_html,
+    clean_line,
+    clean_line_breaks,
+)
 
+LINE_BREAK_CASES = [
+    (
+        '这是一个很长的段落(80字)，它没有结束标点符号\n接下一行。',
+        '这是一个很长的段落(80字)，它没有结束标点符号 接下一行。',
+        'Split Paragraph',
+    ),
+    ('Chapter 1\nContent starts here.', 'Chapter 1\n\nContent starts here.', 'Title followed by content'),
+    ('Para 1.\n\n\nPara 2.', 'Para 1.\n\nPara 2.', 'Empty lines'),
+    (
+        'Line 1 (no punc)\nLine 2 (no punc)\nLine 3 (punc).',
+        'Line 1 (no punc) Line 2 (no punc) Line 3 (punc).',
+        'Multi-line merge',
+    ),
+    ('Short\nNext line.', 'Short\n\nNext line.', 'Short line title heuristic'),
+    ('', '', 'Empty Input'),
+    (
+        'Title\n\nPara 1 part 1 is definitely longer than fifteen characters.\nPara 1 part 2 is also longer to ensure merging.\n\nPara 2.',
+        'Title\n\nPara 1 part 1 is definitely longer than fifteen characters. Para 1 part 2 is also longer to ensure merging.\n\nPara 2.',
+        'Complex mix',
+    ),
+    ('Para 1.\r\n\r\nPara 2.\r\nTail', 'Para 1.\n\nPara 2.\n\nTail', 'CRLF line breaks'),
+    (
+        '　　Indented line with no punctuation \t\nnext part.\r\n\nShort\r\nTail.',
+        'Indented line with no punctuation next part. Short Tail.',
+        'Mixed line breaks and surrounding spaces',
+    ),
+    (
+        'A long line that has no punctuation\nab\ncd\nef。\nNext',
+        'A long line that has no punctuation ab cd ef。\n\nNext',
+        'Short lines inside a paragraph',
+    ),
+]
 
-@pytest.mark.parametrize(
-    'content, expected, case_name',
-    [
-        (
-            '这是一个很长的段落(80字)，它没有结束标点符号\n接下一行。',
-            '这是一个很长的段落(80字)，它没有结束标点符号 接下一行。',
-            'Split Paragraph',
-        ),
-        ('Chapter 1\nContent starts here.', 'Chapter 1\n\nContent starts here.', 'Title followed by content'),
-        ('Para 1.\n\n\nPara 2.', 'Para 1.\n\nPara 2.', 'Empty lines'),
-        (
-            'Line 1 (no punc)\nLine 2 (no punc)\nLine 3 (punc).',
-            'Line 1 (no punc) Line 2 (no punc) Line 3 (punc).',
-            'Multi-line merge',
-        ),
-        ('Short\nNext line.', 'Short\n\nNext line.', 'Short line title heuristic'),
-        ('', '', 'Empty Input'),
-        (
-            'Title\n\nPara 1 part 1 is definitely longer than fifteen characters.\nPara 1 part 2 is also longer to ensure merging.\n\nPara 2.',
-            'Title\n\nPara 1 part 1 is definitely longer than fifteen characters. Para 1 part 2 is also longer to ensure merging.\n\nPara 2.',
-            'Complex mix',
-        ),
-    ],
-)
+
+@pytest.mark.parametrize('content, expected, case_name', LINE_BREAK_CASES)
 def test_clean_line_breaks(content: str, expected: str, case_name: str):
     """
     Test clean_line_breaks function with various scenarios.
@@ -43,3 +64,139 @@ def test_clean_line_breaks(content: str, expected: str, case_name: str):
     """
     result = clean_line_breaks(content)
     assert result == expected, f'Failed case: {case_name}'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5, 1024])
+@pytest.mark.parametrize('content, expected, case_name', LINE_BREAK_CASES)
+def test_line_break_cleaner_chunked(content: str, expected: str, case_name: str, chunk_size: int):
+    """增量版本在任意分块方式下都应与 clean_line_breaks 的段落一致"""
+    cleaner = LineBreakCleaner()
+    paragraphs: list[str] = []
+    for start in range(0, len(content), chunk_size):
+        paragraphs.extend(cleaner.feed(content[start : start + chunk_size]))
+    paragraphs.extend(cleaner.finish())
+    assert '\n\n'.join(paragraphs) == expected, f'Failed case: {case_name}'
+
+
+HTML_CASES = [
+    '第一章 开始\n正文没有任何标记。\n',
+    '正文<br>第二行<br/>第三行<BR />\n<p>段落</p><p class="content">段落</p>\n',
+    '<div id=\'c\' class="a b">正文&nbsp;&nbsp;&amp;&lt;书名&gt;&#65;&#x4e00;&copy 2024</div>\n',
+    '<font color=red>红字</font><!-- 广告 --><img src=a.png alt="图">AT&T R&D\n',
+    '正文<script>var a = 1 < 2;</script><style>p { color: red }</style>结束\n',
+    '单独的 < 号和 > 号，a<b，<未知标签>正文</未知标签>\n',
+    '<title>书名&amp;作者</title><textarea>&lt;br&gt;</textarea>\n',
+    '<a href="x>y">链接</a><!-- a -- b -->\n',
+    '<!DOCTYPE html><?xml version="1.0"?><![CDATA[x]]>正文\n',
+]
+
+
+def _parse_html(content: str) -> str:
+    result: list[str] = []
+    parser = HTMLParser()
+    parser.handle_data = result.append
+    parser.feed(content)
+    parser.close()
+    return ''.join(result)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1024])
+@pytest.mark.parametrize('content', HTML_CASES)
+def test_clean_html(content: str, chunk_size: int):
+    """各级处理（原样返回 / 正则 / HTMLParser）的结果与 HTMLParser 一致，分块处理时也一致"""
+    expected = _parse_html(content)
+    assert clean_html(content) == expected
+    stripper = HTMLStripper()
+    chunks = [
+        stripper.feed(content[start : start + chunk_size]) for start in range(0, len(content), chunk_size)
+    ]
+    assert ''.join(chunks) + stripper.finish() == expected
+
+
+def test_clean_html_trailing_charref():
+    """末尾不完整的字符引用按文本解码，不丢弃其所在的整段文本"""
+    assert clean_html('正文AT&T') == '正文AT&T'
+    assert clean_html('<p>正文</p>&nbsp') == '正文\xa0'
+
+
+TRAILING_HTML_CASES = [
+    '第一行。\n正文<br',
+    '第一行。\n正文&amp',
+    '第一行。\n<p>正文</p>&#6',
+    '第一行。\n正文<p class="a',
+    '第一行。\n<script>a<b',
+    '第一行。\n正文<!--注释',
+    '第一行。\n单独的 < 号' + '正文' * 600 + '<br',
+]
+
+
+@pytest.mark.parametrize('content', TRAILING_HTML_CASES, ids=range(len(TRAILING_HTML_CASES)))
+def test_clean_html_trailing_markup(content: str):
+    """末尾不完整的标签或字符引用：结果与 HTMLParser（调用 close）一致，与分块方式无关"""
+    expected = _parse_html(content)
+    assert clean_html(content) == expected
+    paragraphs = CleaningPipeline().clean(content)
+    for chunk_size in (1, 2, 3, 7, 1024):
+        stripper = HTMLStripper()
+        chunks = [
+            stripper.feed(content[start : start + chunk_size]) for start in range(0, len(content), chunk_size)
+        ]
+        assert ''.join(chunks) + stripper.finish() == expected
+        assert CleaningPipeline().clean(content, chunk_size) == paragraphs
+    assert clean_content(content) == '\n\n'.join(paragraphs)
+
+
+PIPELINE_CONTENT = (
+    '　　<p>第一章　開始</p>\n這是ＡＢＣ１２３，「引號」&amp;被拆分的\n句子沒有標點\n\n\n結束。\n'
+)
+
+
+@pytest.mark.parametrize(
+    'options, expected',
+    [
+        ({}, ['第一章　开始', '这是ABC123，"引号"&被拆分的 句子没有标点 结束。']),
+        (
+            {'clean_html': False},
+            ['<p>第一章　开始</p>', '这是ABC123，"引号"&amp;被拆分的 句子没有标点 结束。'],
+        ),
+        (
+            {'clean_full_width': False},
+            ['第一章　开始', '这是ＡＢＣ１２３，「引号」&被拆分的 句子没有标点 结束。'],
+        ),
+        ({'t2s_engine': 'none'}, ['第一章　開始', '這是ABC123，"引號"&被拆分的 句子沒有標點 結束。']),
+        (
+            {'clean_line_breaks': False},
+            ['第一章　开始', '这是ABC123，"引号"&被拆分的', '句子没有标点', '结束。'],
+        ),
+    ],
+)
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024])
+def test_cleaning_pipeline(
+    monkeypatch: pytest.MonkeyPatch, options: dict, expected: list[str], chunk_size: int
+):
+    """按配置启用各阶段，任意分块方式下结果一致，clean_content / clean_line 与其一致"""
+    for name, value in options.items():
+        monkeypatch.setattr(settings, name, value)
+    pipeline = CleaningPipeline()
+    # finish 之后可以再次使用
+    for _ in range(2):
+        assert pipeline.clean(PIPELINE_CONTENT, chunk_size) == expected
+    assert clean_content(PIPELINE_CONTENT) == '\n\n'.join(expected)
+    assert clean_line(PIPELINE_CONTENT.partition('\n')[0]) == expected[0]
+
+
+def test_cleaning_stage_requires_clean():
+    """未实现 clean 的阶段在创建时就报错，而不是在解析中途"""
+
+    class BrokenStage(CleaningStage):
+        name = 'broken'
+
+    class UpperStage(CleaningStage):
+        name = 'upper'
+
+        def clean(self, text: str) -> str:
+            return text.upper()
+
+    with pytest.raises(TypeError):
+        BrokenStage()  # pyright: ignore[reportAbstractUsage]
+    assert CleaningPipeline([UpperStage()], line_breaks=False).clean('a\nb') == ['A', 'B']
@@ -0,0 +1,53 @@
+# pyright: reportMissingImports=false
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from api.conditional import ContentRange, etag_matches, parse_range
+
+ETAG = '"abc-3"'
+
+RANGE_CASES = [
+    ('bytes=0-9', None, 100, ContentRange('bytes', 0, 10)),
+    ('bytes=90-', None, 100, ContentRange('bytes', 90, 100)),
+    ('bytes=90-200', None, 100, ContentRange('bytes', 90, 100)),
+    ('bytes=-10', None, 100, ContentRange('bytes', 90, 100)),
+    ('bytes=-200', None, 100, ContentRange('bytes', 0, 100)),
+    ('chars=5-', None, 100, ContentRange('chars', 5, 100)),
+    ('chars=5-', ETAG, 100, ContentRange('chars', 5, 100)),
+    # 以下按完整内容响应
+    (None, None, 100, None),
+    ('lines=0-1', None, 100, None),
+    ('bytes=0-1,5-6', None, 100, None),
+    ('bytes=5-1', None, 100, None),
+    ('bytes=a-b', None, 100, None),
+    ('bytes=-', None, 100, None),
+    ('bytes=0-9', '"old-3"', 100, None),
+]
+
+
+@pytest.mark.parametrize(('range_header', 'if_range', 'total', 'expected'), RANGE_CASES)
+def test_parse_range(
+    range_header: str | None, if_range: str | None, total: int, expected: ContentRange | None
+):
+    assert parse_range(range_header, if_range, ETAG, total) == expected
+
+
+@pytest.mark.parametrize('range_header', ['bytes=100-', 'bytes=-0', 'chars=0-'])
+def test_parse_range_not_satisfiable(range_header: str):
+    total = 0 if range_header.startswith('chars') else 100
+    with pytest.raises(HTTPException) as exc_info:
+        parse_range(range_header, None, ETAG, total)
+    assert exc_info.value.status_code == 416
+
+
+def test_etag_matches():
+    assert etag_matches(ETAG, ETAG)
+    assert etag_matches(f'"x", W/{ETAG}', ETAG)
+    assert etag_matches('*', ETAG)
+    assert not etag_matches('"abc-4"', ETAG)
+    assert not etag_matches(None, ETAG)
@@ -0,0 +1,61 @@
+# pyright: reportMissingImports=false
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from opencc_purepy.core import DELIMITERS
+
+from services.parser.converter import convert_t2s, get_fast_converter, get_opencc
+
+
+def _build_corpus(seed: int, count: int) -> list[str]:
+    """由词典中的词组（含截断）、单字、简体文本和分隔符随机拼接而成的语料"""
+    dictionary = get_opencc().dictionary
+    phrases = list(dictionary.ts_phrases[0])
+    characters = list(dictionary.ts_characters[0])
+    others = list('这是一个简体句子，我们在第二节课后下楼。') + list(DELIMITERS)
+
+    rng = random.Random(seed)
+    corpus: list[str] = []
+    for _ in range(count):
+        parts: list[str] = []
+        for _ in range(rng.randint(1, 60)):
+            r = rng.random()
+            if r < 0.3:
+                phrase = rng.choice(phrases)
+                parts.append(phrase[: rng.randint(1, len(phrase))] if rng.random() < 0.3 else phrase)
+            elif r < 0.6:
+                parts.append(rng.choice(characters))
+            else:
+                parts.append(rng.choice(others))
+        corpus.append(''.join(parts))
+    return corpus
+
+
+@pytest.mark.parametrize('engine', ['fast', 'opencc'])
+def test_convert_t2s_matches_opencc(engine: str):
+    """所有引擎（含预检跳过）的结果都应与 OpenCC('t2s') 一致"""
+    converter = get_opencc()
+    for text in _build_corpus(seed=0, count=500):
+        assert convert_t2s(text, engine) == converter.convert(text), text
+
+
+def test_fast_converter_matches_opencc_on_every_phrase():
+    converter = get_opencc()
+    fast = get_fast_converter()
+    for phrase in converter.dictionary.ts_phrases[0]:
+        for text in (phrase, f'我{phrase}了', phrase * 2):
+            assert fast.convert(text) == converter.convert(text), text
+
+
+def test_needs_conversion():
+    fast = get_fast_converter()
+    # 简体文本（包含“一”这类繁体词组首字，但不包含需要转换的词）
+    assert not fast.needs_conversion('一个简单的句子，没有繁体字。')
+    assert fast.needs_conversion('臺灣')
+    assert fast.needs_conversion('一目瞭然')
+    assert convert_t2s('臺灣', 'none') == '臺灣'
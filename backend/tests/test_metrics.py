@@ -0,0 +1,106 @@
+# pyright: reportMissingImports=false
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from core.metrics import (
+    Histogram,
+    MetricsMiddleware,
+    in_worker_process,
+    instrument_engine,
+    metrics,
+    stage_timer,
+)
+from services import scanner
+from services.parser import parse_chapters, read_chapters
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_histogram():
+    histogram = Histogram()
+    for seconds in (0.0002, 0.003, 0.003, 0.2, 60):
+        histogram.observe(seconds)
+    summary = histogram.summary()
+    assert (summary['count'], summary['max']) == (5, 60)
+    assert (summary['p50'], summary['p90']) == (0.005, 60)
+
+    # 子进程的阶段耗时传回主进程合并
+    with stage_timer('decode'):
+        pass
+    stages = metrics.pop_stages()
+    assert metrics.snapshot()['stages'] == {}
+    metrics.merge_stages(stages)
+    metrics.merge_stages(stages)
+    assert metrics.snapshot()['stages']['decode']['count'] == 2
+
+
+@pytest.mark.parametrize('parse', [parse_chapters, read_chapters])
+def test_parser_stages(tmp_path: Path, parse):
+    path = tmp_path / 'book.txt'
+    path.write_text('\n'.join(['第一章 开始', *['<p>正文ＡＢＣ。</p>'] * 5]), encoding='utf-8')
+    parse(path)
+    stages = metrics.snapshot()['stages']
+    assert {'decode', 'clean_html', 'translate', 't2s', 'line_breaks', 'classify_titles'} <= set(stages)
+
+
+def test_route_metrics():
+    db_engine = create_engine('sqlite://')
+    instrument_engine(db_engine)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get('/items/{item_id}')
+    def get_item(item_id: int) -> dict[str, int]:
+        with db_engine.connect() as connection:
+            connection.execute(text('SELECT 1')).all()
+            connection.execute(text('SELECT 2')).all()
+        return {'id': item_id}
+
+    with TestClient(app) as client:
+        for item_id in range(3):
+            client.get(f'/items/{item_id}').raise_for_status()
+        assert client.get('/missing').status_code == 404
+
+    snapshot = metrics.snapshot()
+    # 按路径模板统计
+    route = snapshot['routes']['GET /items/{item_id}']
+    assert (route['count'], route['db_queries'], route['errors']) == (3, 6, 0)
+    assert snapshot['routes']['GET unmatched']['count'] == 1
+    assert snapshot['db_queries']['SELECT']['count'] == 6
+
+    exposition = metrics.prometheus()
+    assert 'glean_http_request_seconds_count{method="GET",route="/items/{item_id}"} 3' in exposition
+    assert 'glean_http_request_db_queries_total{method="GET",route="/items/{item_id}"} 6' in exposition
+    assert 'glean_db_query_seconds_bucket{kind="SELECT",le="+Inf"} 6' in exposition
+
+
+def test_scan_throughput():
+    metrics.record_scan(files=10, parsed_files=4, parsed_bytes=4 * 1024 * 1024, seconds=2.0)
+    metrics.record_scan(files=10, parsed_files=0, parsed_bytes=0, seconds=0.5)
+    scan = metrics.snapshot()['scan']
+    assert (scan['scans'], scan['files'], scan['parsed_files']) == (2, 20, 4)
+    assert scan['files_per_second'] == 8
+    assert scan['last'] is not None and scan['last']['mb_per_second'] == 0
+
+
+def test_in_worker_process():
+    """只有解析进程池的子进程算作子进程（uvicorn --workers 等其他子进程不算）"""
+    assert not in_worker_process()
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        assert not executor.submit(in_worker_process).result()
+    with scanner._create_parse_executor() as executor:
+        assert executor.submit(in_worker_process).result()
@@ -1,4 +1,6 @@
 # pyright: reportMissingImports=false
+import hashlib
+import random
 import sys
 from pathlib import Path
 from typing import NamedTuple
@@ -7,7 +9,23 @@ from typing import NamedTuple
 # Add backend/src to path so we can import services
 sys.path.append(str(Path(__file__).parent.parent / 'src'))
 
-from services.parser import is_line_chapter_title
+import pytest
+
+from core.config import settings
+from services.parser import (
+    FileHash,
+    calculate_file_hash,
+    classify_chapter_titles,
+    detect_file_encoding,
+    hash_file,
+    index_chapters,
+    is_legacy_hash,
+    is_line_chapter_title,
+    iter_chapters,
+    parse_chapter_source,
+    parse_chapters,
+    read_chapters,
+)
 
 
 class Case(NamedTuple):
@@ -61,3 +79,145 @@ def test_chapter_regex_cases():
             f"Failed: {case.description} - Text: '{case.text}'. Expected {case.should_match}, Got {is_match}"
         )
         assert is_match == case.should_match, error_msg
+
+
+def test_iter_chapters_matches_parse_chapters(tmp_path: Path):
+    """流式解析在任意分块大小下都应与整体解析结果一致（包括短章节合并）"""
+    lines = ['<p>简介：這是一本測試用的書</p>', '第一章 开始']
+    lines += [f'第一章的第{i}段正文，内容足够长所以不会被当作标题。' for i in range(6)]
+    # 短章节：标题回退为上一章的正文
+    lines += ['第二章 误判', '只有一段。']
+    lines += ['第三章 继续', '被硬换行拆开的句子没有结束标点', '在下一行结束。']
+    lines += [f'第三章的第{i}段正文，内容足够长所以不会被当作标题。' for i in range(5)]
+    file_path = tmp_path / '测试.txt'
+    file_path.write_text('\r\n'.join(lines), encoding='gb18030')
+
+    expected = parse_chapters(file_path)
+    assert [c['title'] for c in expected] == ['测试', '第一章 开始', '第三章 继续']
+    for chunk_size in (1, 3, 16, 4096):
+        assert list(iter_chapters(file_path, chunk_size=chunk_size)) == expected
+
+
+def test_read_chapters_hashes_in_same_pass(tmp_path: Path):
+    """解析的同时计算的哈希与单独读取文件计算的一致，解码出错回退 gb18030 时重新计算"""
+    lines = ['第一章 开始', *[f'第{i}段正文。' for i in range(6)]]
+    utf8_path = tmp_path / 'utf8.txt'
+    utf8_path.write_text('\r\n'.join(lines), encoding='utf-8')
+    # 开头的 ASCII 内容足够长，编码检测只读取开头时判断为 ASCII，解码到后面出错
+    fallback_path = tmp_path / 'fallback.txt'
+    fallback_path.write_bytes(('a' * 2048 + '\n' + '\n'.join(lines)).encode('gb18030'))
+
+    for file_path in (utf8_path, fallback_path):
+        expected = [(c['title'], c['content']) for c in iter_chapters(file_path)]
+        for parse in (
+            lambda h: read_chapters(file_path, h, chunk_size=5),
+            lambda h: parse_chapters(file_path, h),
+            lambda h: index_chapters(file_path, file_hash=h)[0],
+        ):
+            file_hash = FileHash()
+            assert [(c['title'], c['content']) for c in parse(file_hash)] == expected
+            assert file_hash.hexdigest() == calculate_file_hash(file_path)
+
+
+def test_legacy_hash(tmp_path: Path):
+    file_path = tmp_path / 'a.txt'
+    file_path.write_bytes(b'content')
+    md5 = hashlib.md5(b'content').hexdigest()
+    assert is_legacy_hash(md5) and not is_legacy_hash(calculate_file_hash(file_path))
+    assert hash_file(file_path, legacy=True).matches(md5)
+    assert hash_file(file_path, legacy=True).matches(calculate_file_hash(file_path))
+    assert not hash_file(file_path).matches(md5)
+
+
+@pytest.mark.parametrize(
+    ('encoding', 'expected'),
+    [
+        ('utf-8', ('utf-8', 'utf-8')),
+        ('utf-8-sig', ('utf-8-sig', 'bom')),
+        ('utf-16', ('utf-16', 'bom')),
+        ('utf-32', ('utf-32', 'bom')),
+        ('gb18030', ('gb18030', 'detector')),
+        ('big5', ('big5', 'detector')),
+    ],
+)
+def test_detect_file_encoding(tmp_path: Path, encoding: str, expected: tuple[str, str]):
+    file_path = tmp_path / 'a.txt'
+    file_path.write_text('第一章 開始\n' + '這是一本測試用的書，內容足夠長。\n' * 50, encoding=encoding)
+    assert detect_file_encoding(file_path) == expected
+    # 书籍记录的编码只在文件不是 UTF-8 且可以解码时使用
+    cached = detect_file_encoding(file_path, 'gb18030')
+    assert cached == (('gb18030', 'cached') if expected[1] == 'detector' else expected)
+    assert detect_file_encoding(file_path, 'utf-8') == expected
+
+
+def test_detect_file_encoding_budget(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """开头全是 ASCII 时继续读取到出现非 ASCII 字符为止，最多读取 ENCODING_DETECT_BUDGET 字节"""
+    monkeypatch.setattr(settings, 'encoding_detect_budget', 64 * 1024)
+    file_path = tmp_path / 'a.txt'
+    file_path.write_bytes(b'a' * 40000 + '\n中文内容'.encode('utf-8'))
+    assert detect_file_encoding(file_path) == ('utf-8', 'utf-8')
+    file_path.write_bytes(b'a' * 40000 + '\n第一章 开始，中文内容。'.encode('gb18030') * 20)
+    assert detect_file_encoding(file_path) == ('gb18030', 'detector')
+    # 超出预算的部分不检测，解析时解码出错再回退
+    file_path.write_bytes(b'a' * 80000 + '\n中文内容'.encode('gb18030'))
+    assert detect_file_encoding(file_path) == ('utf-8', 'utf-8')
+    file_path.write_bytes(b'a' * 100)
+    assert detect_file_encoding(file_path) == ('utf-8', 'utf-8')
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'gb18030', 'big5'])
+def test_index_chapters_round_trip(tmp_path: Path, encoding: str):
+    """按定位到的字节范围单独解析每一章，结果与解析整个文件时一致"""
+    lines = ['目錄', '第一章 開始', '第二章 誤判', '第三章 繼續', '<b>第一章 開始</b>']
+    lines += [f'第一章的第{i}段正文，內容足夠長所以不會被當作標題。' for i in range(6)]
+    lines += ['第二章 誤判', '只有一段。']
+    lines += ['第三章　繼續', '被硬換行拆開的句子沒有結束標點', '在下一行結束。']
+    lines += [f'第三章的第{i}段正文&nbsp;內容足夠長。' for i in range(5)]
+    file_path = tmp_path / '测试.txt'
+    file_path.write_bytes('\r\n'.join(lines).encode(encoding))
+
+    chapters, source_index = index_chapters(file_path, chunk_size=7)
+    assert source_index is not None
+    assert len(source_index.spans) == len(chapters)
+    data = file_path.read_bytes()
+    for chapter, (offset, size) in zip(chapters, source_index.spans, strict=True):
+        parsed = parse_chapter_source(data[offset : offset + size], source_index.encoding, file_path.stem)
+        assert (parsed['title'], parsed['content']) == (chapter['title'], chapter['content'])
+
+
+def test_index_chapters_unsupported_encoding(tmp_path: Path):
+    file_path = tmp_path / '测试.txt'
+    file_path.write_text('\n'.join(['第一章 开始', *['正文内容。'] * 6]), encoding='utf-16')
+    chapters, source_index = index_chapters(file_path)
+    assert source_index is None
+    assert [(c['title'], c['content']) for c in chapters] == [
+        (c['title'], c['content']) for c in iter_chapters(file_path)
+    ]
+
+
+def _random_lines(seed: int, count: int) -> list[str]:
+    """由章节关键词、各类数字、标点和普通文字随机拼接的行"""
+    fragments = [
+        '第', '章', '节', '回', '卷', '一', '十', '百', '千', '万', '0', '1', '42', '2024', '82251',
+        '１２', '٣', '分卷阅读', '章节目录', 'Chapter ', 'chapter', 'CHAPTER\t', '序', '序言', '前言',
+        '自序', '楔子', '引子', '导言', '后记', '完本感言', '结语', '尾声', '终章', '番外', '外传', '附录',
+        '：', ':', ' ', '　', '\n', '。', '，', '、', ',', '.', '’', '”', '#', 'T', 'ab', '他说',
+        '正文内容', '开始', '结束',
+    ]  # fmt: skip
+    rng = random.Random(seed)
+    lines: list[str] = []
+    while len(lines) < count:
+        line = ''.join(rng.choice(fragments) for _ in range(rng.randint(1, 12)))
+        if line.strip():
+            lines.append(line)
+    return lines
+
+
+def test_classify_chapter_titles_matches_is_line_chapter_title():
+    """批量判断（带预筛选）与逐行判断的结果必须完全一致"""
+    lines = _random_lines(seed=0, count=20000)
+    lines += ['第一章 开启', '仙逆 1 开始', 'Chapter 1 Title', '番外：小明的日常', '82251', 'T2……']
+    expected = [is_line_chapter_title(line) for line in lines]
+    assert classify_chapter_titles(lines) == expected
+    # 语料需要同时覆盖标题与正文两种结果
+    assert any(expected) and not all(expected)
@@ -0,0 +1,110 @@
+# pyright: reportMissingImports=false
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from core.config import settings
+from core.database import create_fts_tables
+from core.security import create_access_token
+from services import scanner
+from services.profiler import (
+    ProfilingMiddleware,
+    collect_stats,
+    format_profile,
+    get_profile_path,
+    list_profiles,
+    save_profile,
+    start_profiler,
+)
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'data_dir', tmp_path)
+    monkeypatch.setattr(settings, 'profile_min_seconds', 0.0)
+    return tmp_path
+
+
+def _profile_work() -> dict:
+    profiler = start_profiler()
+    sorted(range(10000), key=str)
+    stats = collect_stats(profiler)
+    assert stats is not None
+    return stats
+
+
+def test_save_profile(monkeypatch: pytest.MonkeyPatch):
+    stats = _profile_work()
+    # 同一时间只能有一个剖析
+    profiler = start_profiler()
+    assert start_profiler() is None
+    collect_stats(profiler)
+
+    assert save_profile('scan', 'a/b.txt', None) is None
+    assert save_profile('scan', 'a/b.txt', stats, min_seconds=60) is None
+    path = save_profile('scan', 'a/b.txt', stats, _profile_work())
+    assert path is not None and path.name.endswith('-scan-a_b.txt.prof')
+    assert get_profile_path(path.name) == path
+    assert 'sorted' in format_profile(path)
+
+    # 只保留最新的 PROFILE_MAX_FILES 个文件
+    monkeypatch.setattr(settings, 'profile_max_files', 2)
+    names = [str(save_profile('request', f'GET /{i}', stats)).rsplit('/', 1)[-1] for i in range(3)]
+    assert [profile.name for profile in list_profiles()] == names[:0:-1]
+
+
+@pytest.mark.parametrize('name', ['../test.db', 'x/../../y.prof', 'test.db', ''])
+def test_get_profile_path_rejects_other_files(name: str):
+    settings.profiles_dir.mkdir()
+    (settings.profiles_dir.parent / 'y.prof').write_bytes(b'')
+    assert get_profile_path(name) is None
+
+
+def test_scan_profile(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(scanner, '_create_parse_executor', lambda: ThreadPoolExecutor(max_workers=1))
+    engine = create_engine(f'sqlite:///{settings.data_dir / "test.db"}')
+    SQLModel.metadata.create_all(engine)
+    create_fts_tables(engine)
+    (settings.books_dir / '作者').mkdir(parents=True)
+    (settings.books_dir / '作者' / '书.txt').write_text('第一章 开始\n正文。', encoding='utf-8')
+
+    scanner.scan_directory(db_engine=engine)
+    assert list_profiles() == []
+    # 解析和写入合并为一个文件，文件名包含书籍路径
+    scanner.scan_directory(full_scan=True, db_engine=engine, profile=True)
+    engine.dispose()
+    assert scanner.get_scan_status().error is None
+    profiles = list_profiles()
+    assert len(profiles) == 1 and profiles[0].name.endswith('-scan-作者_书.txt.prof')
+    summary = format_profile(settings.profiles_dir / profiles[0].name, limit=500)
+    assert 'parse_chapters' in summary and 'save_parsed_book' in summary
+
+
+def test_profiling_middleware(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'app_password', 'secret')
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get('/items/{item_id}')
+    def get_item(item_id: int) -> dict[str, int]:
+        return {'id': item_id}
+
+    with TestClient(app) as client:
+        client.get('/items/1').raise_for_status()
+        # 未登录时忽略请求头
+        client.get('/items/2', headers={'X-Profile': '1'}).raise_for_status()
+        assert list_profiles() == []
+        token = create_access_token(data={'sub': 'admin'})
+        client.get(
+            '/items/3', headers={'X-Profile': '1', 'Authorization': f'Bearer {token}'}
+        ).raise_for_status()
+
+    profiles = list_profiles()
+    assert len(profiles) == 1 and profiles[0].name.endswith('-request-GET_items_3.prof')
@@ -0,0 +1,213 @@
+# pyright: reportMissingImports=false
+import hashlib
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, func, select
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import write_book
+
+from core.config import settings
+from core.models import Book, Chapter, ChapterBody
+from services import book_service, scanner
+from services.body_store import read_chapter_body
+from services.parser import calculate_file_hash
+
+
+@pytest.fixture(autouse=True)
+def scan_settings(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'scan_commit_batch_size', 2)
+    # 测试中在线程池中解析，省去启动进程的时间
+    monkeypatch.setattr(scanner, '_create_parse_executor', lambda: ThreadPoolExecutor(max_workers=2))
+
+
+def _books(engine) -> dict[str, str]:
+    with Session(engine) as session:
+        return {
+            book.title: str(read_chapter_body(session, book.id, 1)).split('\n\n')[0]
+            for book in session.exec(select(Book))
+        }
+
+
+def test_scan_directory(engine):
+    for i in range(5):
+        write_book(f'{i}.txt', f'第{i}本书的正文。')
+    scanner.scan_directory(db_engine=engine)
+    status = scanner.get_scan_status()
+    assert (status.is_running, status.error) == (False, None)
+    assert (status.files_scanned, status.files_added, status.files_updated) == (5, 5, 0)
+    assert _books(engine) == {str(i): f'第{i}本书的正文。' for i in range(5)}
+
+    # 增量扫描：跳过未修改的文件，重新解析修改过的文件，删除已不存在的文件的记录
+    write_book('0.txt', '修改后的正文。')
+    (settings.books_dir / '1.txt').unlink()
+    scanner.scan_directory(db_engine=engine)
+    status = scanner.get_scan_status()
+    assert (status.files_scanned, status.files_added, status.files_updated) == (4, 0, 1)
+    assert _books(engine) == {'0': '修改后的正文。', **{str(i): f'第{i}本书的正文。' for i in range(2, 5)}}
+
+
+def test_incremental_scan_reads_only_changed_files(engine, monkeypatch: pytest.MonkeyPatch):
+    for i in range(3):
+        write_book(f'{i}.txt', f'第{i}本书的正文。')
+    (settings.books_dir / 'sub').mkdir()
+    write_book('sub/3.txt', '子目录中的书。')
+    (settings.books_dir / 'notes.md').write_text('不是 TXT 文件')
+    (settings.books_dir / 'dir.txt').mkdir()
+    scanner.scan_directory(db_engine=engine)
+    assert set(_books(engine)) == {'0', '1', '2', '3'}
+
+    parsed_files: list[str] = []
+    parse_book_file = book_service.parse_book_file
+
+    def recording_parse(file_path, *args):
+        parsed_files.append(file_path.name)
+        return parse_book_file(file_path, *args)
+
+    monkeypatch.setattr(scanner, 'parse_book_file', recording_parse)
+    # 没有变化时不读取任何文件
+    scanner.scan_directory(db_engine=engine)
+    assert parsed_files == []
+    assert scanner.get_scan_status().files_scanned == 4
+
+    # 只有修改时间变化的文件读取一次后记录新的修改时间，之后不再读取
+    os.utime(settings.books_dir / '1.txt', (0, 0))
+    scanner.scan_directory(db_engine=engine)
+    scanner.scan_directory(db_engine=engine)
+    assert parsed_files == ['1.txt']
+
+    # 已删除文件的书籍记录、章节、正文和索引批量删除
+    (settings.books_dir / '0.txt').unlink()
+    (settings.books_dir / 'sub' / '3.txt').unlink()
+    scanner.scan_directory(db_engine=engine)
+    assert set(_books(engine)) == {'1', '2'}
+    with Session(engine) as session:
+        for table in (Chapter, ChapterBody):
+            assert session.exec(select(func.count()).select_from(table)).one() == 4
+        for fts_table, count in (('book_fts', 2), ('chapter_fts', 4)):
+            assert session.exec(text(f'SELECT count(*) FROM {fts_table}')).one()[0] == count
+
+
+def test_scan_write_failure_skips_book(engine, monkeypatch: pytest.MonkeyPatch):
+    """写入失败时只回滚失败的书籍（SAVEPOINT），同一批次的其他书籍照常提交，失败的书籍计入 files_skipped"""
+    monkeypatch.setattr(settings, 'chapter_body_store', 'segment')
+    monkeypatch.setattr(settings, 'scan_commit_batch_size', 10)
+    for i in range(4):
+        write_book(f'{i}.txt', f'第{i}本书的正文。')
+    save_parsed_book = book_service.save_parsed_book
+    parsed_files = []
+
+    def failing_save(session, parsed, *args, **kwargs):
+        parsed_files.append(parsed['file_path'].stem)
+        result = save_parsed_book(session, parsed, *args, **kwargs)
+        # 批次中的第二本书在章节和段文件写入后失败
+        if len(parsed_files) == 2:
+            raise RuntimeError('boom')
+        return result
+
+    monkeypatch.setattr(scanner, 'save_parsed_book', failing_save)
+    scanner.scan_directory(db_engine=engine)
+    status = scanner.get_scan_status()
+    assert status.error is not None and f'{parsed_files[1]}.txt' in status.error
+    assert (status.files_scanned, status.files_added, status.files_skipped) == (4, 3, 1)
+    # 先写入的书籍的段文件不受回滚影响，失败的书籍不留下段文件
+    assert set(_books(engine)) == {'0', '1', '2', '3'} - {parsed_files[1]}
+    assert len(list(settings.chapter_bodies_dir.glob('*.seg'))) == 3
+    # 其他书籍不重新解析
+    assert sorted(parsed_files) == ['0', '1', '2', '3']
+
+
+def test_scan_duplicate_book(engine, monkeypatch: pytest.MonkeyPatch):
+    """同一本书的两个副本（hash_id 相同）：后写入的副本失败并跳过，不影响同一批次的其他书籍"""
+    monkeypatch.setattr(settings, 'scan_commit_batch_size', 10)
+    for i in range(3):
+        write_book(f'{i}.txt', f'第{i}本书的正文。')
+    write_book('副本.txt', '第1本书的正文。')
+    scanner.scan_directory(db_engine=engine)
+    status = scanner.get_scan_status()
+    assert (status.files_scanned, status.files_added, status.files_skipped) == (4, 3, 1)
+    books = _books(engine)
+    assert len(books) == 3 and sorted(books.values()) == [f'第{i}本书的正文。' for i in range(3)]
+
+
+def test_start_scan(engine, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(scanner, 'engine', engine)
+    parse_book_file = book_service.parse_book_file
+    release = threading.Event()
+
+    def blocking_parse(*args):
+        release.wait(10)
+        return parse_book_file(*args)
+
+    monkeypatch.setattr(scanner, 'parse_book_file', blocking_parse)
+    write_book('0.txt', '正文。')
+    assert scanner.start_scan()
+    # 扫描在工作线程中执行，运行期间不能再次启动
+    assert not scanner.start_scan()
+    release.set()
+    scanner.scan_worker.join(10)
+    assert not scanner.get_scan_status().is_running
+    assert set(_books(engine)) == {'0'}
+
+
+def test_scan_hash_migration(engine, monkeypatch: pytest.MonkeyPatch):
+    """旧版本的 MD5 hash_id：内容未变化时只更新为新的 hash_id，不重新解析"""
+    path = write_book('0.txt', '第0本书的正文。')
+    write_book('1.txt', '第1本书的正文。')
+    scanner.scan_directory(db_engine=engine)
+    with Session(engine) as session:
+        for book in session.exec(select(Book)):
+            assert book.hash_id == calculate_file_hash(settings.books_dir / book.path)
+            book.hash_id = hashlib.md5((settings.books_dir / book.path).read_bytes()).hexdigest()
+            session.add(book)
+        session.commit()
+
+    parsed_files: list[str] = []
+    parse_chapters = book_service._parse_chapters  # noqa: SLF001
+
+    def recording_parse(parsed, *args):
+        parsed_files.append(parsed['file_path'].name)
+        return parse_chapters(parsed, *args)
+
+    monkeypatch.setattr(book_service, '_parse_chapters', recording_parse)
+    os.utime(path, (0, 0))
+    write_book('1.txt', '修改后的正文。')
+    scanner.scan_directory(db_engine=engine)
+    assert parsed_files == ['1.txt']
+    with Session(engine) as session:
+        books = {book.title: book for book in session.exec(select(Book))}
+        assert books['0'].hash_id == calculate_file_hash(path)
+        assert books['0'].file_mtime == 0
+        assert books['1'].hash_id == calculate_file_hash(settings.books_dir / '1.txt')
+
+
+def test_scan_encoding_cache(engine, monkeypatch: pytest.MonkeyPatch):
+    """重新解析时优先使用书籍记录的编码；检测到的编码解码出错时回退到 gb18030 并记录"""
+    monkeypatch.setattr(book_service, 'encoding_stats', book_service.EncodingStats())
+    stats = book_service.encoding_stats
+    text = '\n'.join(['第一章 开始', *['这是一本测试用的书，内容足够长。'] * 200])
+    (settings.books_dir / 'gbk.txt').write_text(text, encoding='gb18030')
+    (settings.books_dir / 'utf8.txt').write_text(text, encoding='utf-8')
+    # 超出检测预算的部分才出现非 ASCII 字符：检测为 UTF-8，解析时回退
+    (settings.books_dir / 'late.txt').write_bytes(('a' * 40000 + '\n' + text).encode('gb18030'))
+    scanner.scan_directory(db_engine=engine)
+    assert (stats.hits, stats.misses, stats.fallbacks) == (0, 3, 1)
+    assert stats.methods == {'detector': 1, 'utf-8': 2}
+    with Session(engine) as session:
+        encodings = {book.title: book.encoding for book in session.exec(select(Book))}
+    assert encodings == {'gbk': 'gb18030', 'utf8': 'utf-8', 'late': 'gb18030'}
+
+    (settings.books_dir / 'gbk.txt').write_text(text + '\n新增的一段。', encoding='gb18030')
+    scanner.scan_directory(db_engine=engine)
+    assert (stats.hits, stats.misses, stats.methods['cached']) == (1, 3, 1)
+    # 全量扫描重新检测
+    scanner.scan_directory(full_scan=True, db_engine=engine)
+    assert (stats.hits, stats.misses) == (1, 6)
+    assert _books(engine)['gbk'] == '这是一本测试用的书，内容足够长。'
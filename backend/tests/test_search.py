@@ -0,0 +1,168 @@
+# pyright: reportMissingImports=false
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import parsed_book
+
+from core.config import settings
+from core.database import create_fts_tables
+from core.models import Book, Chapter
+from services.book_service import delete_book, save_parsed_book
+from services.parser import ChapterDict
+from services.search import ensure_chapter_index, reindex_chapter_title, search_books, search_chapters
+
+
+def test_search_index_follows_book_changes(session: Session, tmp_path: Path):
+    parsed = parsed_book(
+        tmp_path,
+        'h1',
+        ['南山经之首曰鹊山。\n\n其首曰招摇之山，临于西海之上。', '西山经华山之首。'],
+        titles=['第一章 南山', '第二章 西山'],
+        name='山海经',
+    )
+    book, _ = save_parsed_book(session, parsed, tmp_path)
+
+    assert [hit.title for hit in search_books(session, '山海经', 10)] == ['山海经']
+    assert [hit.title for hit in search_books(session, '海经', 10)] == ['山海经']
+
+    hits = search_chapters(session, '招摇之山', 10)
+    assert [(hit.book_id, hit.order_index) for hit in hits] == [(book.id, 0)]
+    content = '南山经之首曰鹊山。\n\n其首曰招摇之山，临于西海之上。'
+    assert hits[0].offset == content.index('招摇之山')
+    assert '招摇之山' in hits[0].snippet
+
+    # 短查询：书内搜索时逐章扫描正文，否则只搜索章节标题
+    hits = search_chapters(session, '华山', 10, book_id=book.id)
+    assert [(hit.order_index, hit.offset) for hit in hits] == [(1, 3)]
+    assert search_chapters(session, '华山', 10, book_id=book.id + 1) == []
+    assert search_chapters(session, '华山', 10) == []
+    hits = search_chapters(session, '西山', 10)
+    assert [(hit.order_index, hit.offset, hit.snippet) for hit in hits] == [(1, 0, '')]
+
+    # 重新解析后旧内容不再命中
+    parsed['chapters'] = [ChapterDict(title='第一章 东山', order_index=0, content=['东山经之首曰樕螽之山。'])]
+    save_parsed_book(session, parsed, tmp_path, force_reparse=True)
+    assert search_chapters(session, '招摇之山', 10) == []
+    assert [hit.chapter_title for hit in search_chapters(session, '樕螽之山', 10)] == ['第一章 东山']
+
+    delete_book(session, session.exec(select(Book)).one())
+    session.commit()
+    assert search_books(session, '山海经', 10) == []
+    assert search_chapters(session, '樕螽之山', 10) == []
+
+
+def test_search_query_is_literal(session: Session, tmp_path: Path):
+    parsed = parsed_book(tmp_path, 'h2', ['he said "AND OR" 100% done'], name='quotes')
+    book, _ = save_parsed_book(session, parsed, tmp_path)
+    assert len(search_chapters(session, '"AND OR"', 10)) == 1
+    assert len(search_chapters(session, 'and or', 10)) == 1
+    assert len(search_chapters(session, '0%', 10, book_id=book.id)) == 1
+    assert search_chapters(session, '1%0', 10) == []
+
+
+def test_search_without_fulltext_index(session: Session, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'fulltext_index', False)
+    parsed = parsed_book(tmp_path, 'h3', ['其首曰招摇之山。'], titles=['第一章 南山'], name='山海经')
+    save_parsed_book(session, parsed, tmp_path)
+    # 正文压缩存储，未建立正文索引时只搜索章节标题
+    hits = search_chapters(session, '南山', 10)
+    assert [(hit.order_index, hit.offset) for hit in hits] == [(0, 0)]
+    assert search_chapters(session, '招摇之山', 10) == []
+
+
+def _table_names(session: Session) -> set[str]:
+    return set(session.exec(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars())
+
+
+def _stored_text(session: Session) -> list[str | bytes]:
+    """chapter_fts 的全部影子表中保存的值"""
+    tables = [name for name in _table_names(session) if name.startswith('chapter_fts_')]
+    assert tables
+    return [
+        value
+        for table in tables
+        for row in session.exec(text(f'SELECT * FROM {table}')).all()
+        for value in row
+        if isinstance(value, (str, bytes))
+    ]
+
+
+def test_chapter_index_stores_no_content(session: Session, tmp_path: Path):
+    """chapter_fts 是无内容表：不保存正文副本，摘要和偏移从正文存储生成"""
+    content = '南山经之首曰鹊山。其首曰招摇之山，临于西海之上，多桂，多金玉。' * 3
+    parsed = parsed_book(tmp_path, 'h1', [content, '华山之首。'], titles=['南山', '西山经'], name='山海经')
+    book, _ = save_parsed_book(session, parsed, tmp_path)
+    session.commit()
+
+    assert 'chapter_fts_content' not in _table_names(session)
+    for value in _stored_text(session):
+        encoded = value.encode() if isinstance(value, str) else value
+        assert '临于西海之上'.encode() not in encoded
+
+    hits = search_chapters(session, '招摇之山', 10)
+    offset = content.index('招摇之山')
+    assert [(hit.order_index, hit.offset) for hit in hits] == [(0, offset)]
+    assert hits[0].snippet == content[: offset + 4 + 32] + '…'
+    # 标题命中而正文未命中时，偏移为 0，摘要为正文开头
+    hits = search_chapters(session, '西山经', 10)
+    assert [(hit.order_index, hit.offset, hit.snippet) for hit in hits] == [(1, 0, '华山之首。')]
+    # 书内短查询逐章读取正文
+    hits = search_chapters(session, '桂', 10, book_id=book.id)
+    assert [(hit.order_index, hit.offset) for hit in hits] == [(0, content.index('桂'))]
+    assert len(search_chapters(session, '山', 1, book_id=book.id)) == 1
+    assert search_chapters(session, '桂', 10) == []
+
+    # 重命名前言章节：整行重建索引，正文仍可搜索
+    chapter = session.exec(select(Chapter).where(Chapter.order_index == 0)).one()
+    reindex_chapter_title(session, book.id, 0, chapter.id, '东山经首')
+    assert [hit.order_index for hit in search_chapters(session, '东山经首', 10)] == [0]
+    assert [hit.order_index for hit in search_chapters(session, '招摇之山', 10)] == [0]
+
+
+def test_rebuild_chapter_index_with_content(engine, tmp_path: Path):
+    """旧版本保存正文的 chapter_fts 在启动时重建为无内容表，并从正文存储回填"""
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE chapter_fts'))
+        connection.execute(
+            text(
+                'CREATE VIRTUAL TABLE chapter_fts USING fts5('
+                "title, content, book_id UNINDEXED, order_index UNINDEXED, tokenize='trigram')"
+            )
+        )
+    with Session(engine) as session:
+        parsed = parsed_book(tmp_path, 'h1', ['其首曰招摇之山。'], titles=['南山'], name='山海经')
+        save_parsed_book(session, parsed, tmp_path)
+
+    create_fts_tables(engine)
+    ensure_chapter_index(engine)
+    with Session(engine) as session:
+        assert 'chapter_fts_content' not in _table_names(session)
+        assert [hit.offset for hit in search_chapters(session, '招摇之山', 10)] == [3]
+    # 定义未变化时不重建
+    create_fts_tables(engine)
+    with Session(engine) as session:
+        assert len(search_chapters(session, '招摇之山', 10)) == 1
+
+
+def test_backfill_books_imported_without_index(engine, monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    """关闭 fulltext_index 期间导入的书籍在重新开启后回填，已索引的书籍不重复索引"""
+    with Session(engine) as session:
+        save_parsed_book(
+            session, parsed_book(tmp_path, 'h1', ['南山经之首曰鹊山。'], name='南山经'), tmp_path
+        )
+        monkeypatch.setattr(settings, 'fulltext_index', False)
+        save_parsed_book(session, parsed_book(tmp_path, 'h2', ['西山经华山之首。'], name='西山经'), tmp_path)
+        ensure_chapter_index(engine)
+        assert search_chapters(session, '华山之首', 10) == []
+
+        monkeypatch.setattr(settings, 'fulltext_index', True)
+        ensure_chapter_index(engine)
+        assert [hit.book_title for hit in search_chapters(session, '华山之首', 10)] == ['西山经']
+        assert [hit.book_title for hit in search_chapters(session, '之首曰鹊', 10)] == ['南山经']
+        assert session.exec(text('SELECT count(*) FROM chapter_fts')).one()[0] == 2
@@ -0,0 +1,175 @@
+# pyright: reportMissingImports=false
+import hashlib
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import write_book
+
+from core.config import settings
+from core.models import Book, Chapter
+from services import scanner
+from services.parser import calculate_file_hash
+from services.watcher import BookWatcher
+
+
+@pytest.fixture(autouse=True)
+def watch_settings(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'watch_debounce', 2.0)
+    monkeypatch.setattr(
+        scanner, '_scan_status', scanner._scan_status.model_copy(update={'watcher': scanner.WatcherStatus()})
+    )  # noqa: SLF001
+
+
+def _books(engine) -> dict[str, tuple[int, str]]:
+    with Session(engine) as session:
+        return {book.path: (book.id, book.title) for book in session.exec(select(Book))}
+
+
+def test_apply_changes(engine):
+    watcher = BookWatcher(db_engine=engine)
+    a = write_book('a.txt', '第一本书。')
+    b = write_book('sub/b.txt', '第二本书。')
+    (settings.books_dir / 'notes.md').write_text('不是 TXT 文件')
+    watcher.apply_changes([str(a), str(b), str(settings.books_dir / 'notes.md')])
+    assert {path: title for path, (_, title) in _books(engine).items()} == {'a.txt': 'a', 'sub/b.txt': 'b'}
+
+    # 未变化的文件不重新导入，修改过的文件更新
+    write_book('a.txt', '修改后的正文。')
+    watcher.apply_changes([str(a), str(b)])
+    status = watcher.status
+    assert (status.files_added, status.files_updated, status.files_removed) == (2, 1, 0)
+
+    a.unlink()
+    watcher.apply_changes([str(a)])
+    assert set(_books(engine)) == {'sub/b.txt'}
+    assert watcher.status.files_removed == 1
+
+
+def test_move_keeps_book(engine):
+    watcher = BookWatcher(db_engine=engine)
+    old = write_book('old.txt', '正文。')
+    watcher.apply_changes([str(old)])
+    book_id, _ = _books(engine)['old.txt']
+    with Session(engine) as session:
+        book = session.get(Book, book_id)
+        assert book is not None
+        book.chapter_index = 1
+        book.chapter_offset = 10
+        session.add(book)
+        session.commit()
+
+    new = settings.books_dir / 'renamed' / 'new.txt'
+    new.parent.mkdir()
+    old.rename(new)
+    watcher.apply_changes([str(old), str(new)])
+    assert _books(engine) == {'renamed/new.txt': (book_id, 'new')}
+    assert (watcher.status.files_added, watcher.status.files_moved, watcher.status.files_removed) == (1, 1, 0)
+    with Session(engine) as session:
+        book = session.get(Book, book_id)
+        assert book is not None
+        assert (book.chapter_index, book.chapter_offset) == (1, 10)
+        # 前言章节的标题来自文件名
+        preface = session.exec(
+            select(Chapter).where(Chapter.book_id == book_id, Chapter.order_index == 0)
+        ).one()
+        assert preface.title == 'new'
+        titles = session.exec(text('SELECT title FROM book_fts')).all()
+        assert [row[0] for row in titles] == ['new']
+
+
+def test_directory_moved_out(engine, tmp_path: Path):
+    watcher = BookWatcher(db_engine=engine)
+    paths = [write_book(f'series/{i}.txt', f'第{i}本书。') for i in range(3)]
+    keep = write_book('series2/keep.txt', '保留。')
+    watcher.apply_changes([str(path) for path in [*paths, keep]])
+    assert len(_books(engine)) == 4
+
+    shutil.move(settings.books_dir / 'series', tmp_path / 'series')
+    watcher.apply_changes([str(settings.books_dir / 'series')])
+    assert set(_books(engine)) == {'series2/keep.txt'}
+
+    # 整个目录移回来时导入其中的所有文件
+    shutil.move(tmp_path / 'series', settings.books_dir / 'series')
+    watcher.apply_changes([str(settings.books_dir / 'series')])
+    assert len(_books(engine)) == 4
+
+
+def test_flush_debounce(engine):
+    watcher = BookWatcher(db_engine=engine)
+    path = write_book('a.txt', '正文。')
+    watcher._pending[str(path)] = 100.0  # noqa: SLF001
+    watcher.flush(101.0)
+    assert _books(engine) == {}
+    assert watcher.status.pending_files == 1
+
+    # 扫描运行期间暂停导入
+    scanner.get_scan_status().is_running = True
+    watcher.flush(103.0)
+    assert _books(engine) == {}
+    scanner.get_scan_status().is_running = False
+    watcher.flush(103.0)
+    assert set(_books(engine)) == {'a.txt'}
+    assert watcher.status.pending_files == 0
+
+
+def test_polling_watcher(engine, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, 'watch_force_polling', True)
+    monkeypatch.setattr(settings, 'watch_poll_interval', 0.1)
+    monkeypatch.setattr(settings, 'watch_debounce', 0.1)
+    # 遍历目录得到轮询的基准之前不阻塞启动，也不标记为运行中
+    baseline_started = threading.Event()
+    release_baseline = threading.Event()
+    stat_books_dir = BookWatcher._stat_books_dir
+
+    def slow_stat_books_dir() -> dict[str, tuple[int, float]]:
+        baseline_started.set()
+        release_baseline.wait(10)
+        return stat_books_dir()
+
+    monkeypatch.setattr(BookWatcher, '_stat_books_dir', staticmethod(slow_stat_books_dir))
+    watcher = BookWatcher(db_engine=engine)
+    watcher.start()
+    try:
+        assert baseline_started.wait(10)
+        assert not watcher.status.is_running
+        release_baseline.set()
+        deadline = time.monotonic() + 10
+        while not watcher.status.is_running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        write_book('a.txt', '正文。')
+        deadline = time.monotonic() + 10
+        while not _books(engine) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert set(_books(engine)) == {'a.txt'}
+        assert (watcher.status.is_running, watcher.status.backend) == (True, 'polling')
+    finally:
+        release_baseline.set()
+        watcher.stop()
+    assert not watcher.status.is_running
+
+
+def test_move_legacy_hash(engine):
+    """尚未迁移的旧版本 MD5 hash_id 也能识别移动，移动后更新为新的 hash_id"""
+    watcher = BookWatcher(db_engine=engine)
+    old = write_book('old.txt', '正文。')
+    watcher.apply_changes([str(old)])
+    with Session(engine) as session:
+        book = session.exec(select(Book)).one()
+        book_id, book.hash_id = book.id, hashlib.md5(old.read_bytes()).hexdigest()
+        session.add(book)
+        session.commit()
+
+    new = old.rename(settings.books_dir / 'new.txt')
+    watcher.apply_changes([str(old), str(new)])
+    assert _books(engine) == {'new.txt': (book_id, 'new')}
+    with Session(engine) as session:
+        assert session.exec(select(Book.hash_id)).one() == calculate_file_hash(new)
@@ -18,6 +18,10 @@ export interface Book {
   chapter_index: number | null
   chapter_offset: number | null
   is_finished: boolean
+  progress_percent: number | null // 阅读百分比（0-100）
+  chapter_count: number
+  total_chars: number
+  last_chapter_length: number
   chapters?: Chapter[] // 关联章节（可选，某些 API 可能不包含）
 }
 
@@ -50,9 +54,36 @@ export interface ScanStatusResponse {
   files_scanned: number
   files_added: number
   files_updated: number
+  files_skipped: number
   total_files: number
   current_file: string
   error: string | null
+  watcher: WatcherStatus
+  encoding: EncodingStats
+}
+
+/**
+ * 编码检测统计
+ */
+export interface EncodingStats {
+  hits: number
+  misses: number
+  fallbacks: number
+  methods: Record<string, number>
+}
+
+/**
+ * 目录监视状态
+ */
+export interface WatcherStatus {
+  is_running: boolean
+  backend: string
+  pending_files: number
+  files_added: number
+  files_updated: number
+  files_moved: number
+  files_removed: number
+  error: string | null
 }
 
 /**
@@ -78,6 +109,11 @@ export interface ListBooksParams {
   search?: string
   finished?: boolean
   started?: boolean
+  sort?: 'id' | 'title' | 'last_read_time'
+  order?: 'asc' | 'desc'
+  limit?: number
+  cursor?: string // 上一页响应头 X-Next-Cursor
+  fields?: 'full' | 'lite'
 }
 
 /**